@@ -70,8 +70,8 @@ class WebInterface:
             bugs = [bug for bug in bugs if bug.assigned == assignee]
 
         if tag != '' and tag != 'None':
-            bugs = [bug for bug in bugs
-                    if tag in libbe.command.tag.get_tags(bug)]
+            tagged = libbe.command.tag.tagged_uuids(self.bd, tag)
+            bugs = [bug for bug in bugs if bug.uuid in tagged]
 
         if target != '':
             target = None if target == 'None' else target
@@ -25,6 +25,7 @@
 """
 
 import copy
+import functools
 import os
 import os.path
 import errno
@@ -162,10 +163,20 @@ class Bug (settings_object.SavedSettingsObject):
             kwargs["required_saved_properties"]=required_saved_properties
         return settings_object.versioned_property(**kwargs)
 
+    def _bugdir_change_hook(name):
+        """Build a change hook that also notifies the bug's bugdir, so
+        it can keep its indexes current."""
+        def hook(self, old, new):
+            self._prop_save_settings(old, new)
+            if self.bugdir != None:
+                self.bugdir._bug_changed(self, name)
+        return hook
+
     @_versioned_property(name="severity",
                          doc="A measure of the bug's importance",
                          default="minor",
                          check_fn=lambda s: s in severity_values,
+                         change_hook=_bugdir_change_hook('severity'),
                          require_save=True)
     def severity(): return {}
 
@@ -221,6 +232,8 @@ class Bug (settings_object.SavedSettingsObject):
     def _extra_strings_change_hook(self, old, new):
         self.extra_strings.sort() # to make merging easier
         self._prop_save_settings(old, new)
+        if self.bugdir != None:
+            self.bugdir._bug_changed(self, 'extra_strings')
     @_versioned_property(name="extra_strings",
                          doc="Space for an array of extra strings.  Useful for storing state for functionality implemented purely in becommands/<some_function>.py.",
                          default=[],
@@ -230,7 +243,8 @@ class Bug (settings_object.SavedSettingsObject):
     def extra_strings(): return {}
 
     @_versioned_property(name="summary",
-                         doc="A one-line bug description")
+                         doc="A one-line bug description",
+                         change_hook=_bugdir_change_hook('summary'))
     def summary(): return {}
 
     def _get_comment_root(self, load_full=False):
@@ -409,6 +423,21 @@ class Bug (settings_object.SavedSettingsObject):
             </comment>
           </bug>
         """
+        return ''.join(self.xml_chunks(
+                indent=indent, show_comments=show_comments))
+
+    def xml_chunks(self, indent=0, show_comments=False):
+        """Generate :py:meth:`xml` output a comment at a time.
+
+        >>> bug = Bug(uuid='0123', summary='Stream me')
+        >>> commA = bug.comment_root.new_reply(body='comment A')
+        >>> commB = bug.comment_root.new_reply(body='comment B')
+        >>> chunks = list(bug.xml_chunks(show_comments=True))
+        >>> len(chunks)
+        4
+        >>> ''.join(chunks) == bug.xml(show_comments=True)
+        True
+        """
         if self.time == None:
             timestring = ""
         else:
@@ -429,15 +458,13 @@ class Bug (settings_object.SavedSettingsObject):
                 lines.append('  <%s>%s</%s>' % (k,xml.sax.saxutils.escape(v),k))
         for estr in self.extra_strings:
             lines.append('  <extra-string>%s</extra-string>' % estr)
-        if show_comments == True:
-            comout = self.comment_root.xml_thread(indent=indent+2)
-            if comout:
-                comout = comout[indent:]  # strip leading indent spaces
-                lines.append(comout)
-        lines.append('</bug>')
         istring = ' '*indent
         sep = '\n' + istring
-        return istring + sep.join(lines).rstrip('\n')
+        yield istring + sep.join(lines)
+        if show_comments == True:
+            for depth,comment in self.comment_root.thread(flatten=True):
+                yield '\n' + comment.xml(indent=2*depth+indent+2)
+        yield sep + '</bug>'
 
     def from_xml(self, xml_string, preserve_uuids=False):
         u"""
@@ -586,20 +613,26 @@ class Bug (settings_object.SavedSettingsObject):
         comment does not specify a parent with .in_reply_to, the
         parent defaults to .comment_root, but you can specify another
         default parent via default_parent.
+
+        Existing comments are found through the comment root's
+        :py:class:`~libbe.comment.CommentIndex`, so adding a few
+        comments to a large bug does not rescan the whole thread.
         """
+        index = self.comment_root.comment_index()
         uuid_map = {}
         if default_parent == None:
             default_parent = self.comment_root
-        for c in list(self.comments()) + comments:
+        for c in comments:
             assert c.uuid != None
-            assert c.uuid not in uuid_map
+            assert c.uuid not in uuid_map and c.uuid not in index, c.uuid
             uuid_map[c.uuid] = c
             if c.alt_id != None:
                 uuid_map[c.alt_id] = c
         uuid_map[None] = self.comment_root
         uuid_map[comment.INVALID_UUID] = self.comment_root
         if default_parent != self.comment_root:
-            assert default_parent.uuid in uuid_map, default_parent.uuid
+            assert default_parent.uuid in uuid_map \
+                or default_parent.uuid in index, default_parent.uuid
         for c in comments:
             if c.in_reply_to == None \
                     and default_parent.uuid != comment.INVALID_UUID:
@@ -607,7 +640,10 @@ class Bug (settings_object.SavedSettingsObject):
             elif c.in_reply_to == comment.INVALID_UUID:
                 c.in_reply_to = None
             try:
-                parent = uuid_map[c.in_reply_to]
+                if c.in_reply_to in uuid_map:
+                    parent = uuid_map[c.in_reply_to]
+                else:
+                    parent = index.lookup(c.in_reply_to)
             except KeyError:
                 if ignore_missing_references == True:
                     libbe.LOG.warning(
@@ -723,10 +759,10 @@ class Bug (settings_object.SavedSettingsObject):
                         % (estr, self.uuid)
         for o_comm in other.comments():
             try:
-                s_comm = self.comment_root.comment_from_uuid(o_comm.uuid)
+                s_comm = self.comment_from_uuid(o_comm.uuid)
             except KeyError, e:
                 try:
-                    s_comm = self.comment_root.comment_from_uuid(o_comm.alt_id)
+                    s_comm = self.comment_from_uuid(o_comm.alt_id)
                 except KeyError, e:
                     s_comm = None
             if s_comm == None:
@@ -758,7 +794,8 @@ class Bug (settings_object.SavedSettingsObject):
         self._setup_saved_settings(settings)
 
     def save_settings(self):
-        mf = mapfile.generate(self._get_saved_settings())
+        mf = mapfile.generate(self._get_saved_settings(),
+                              context=self.storage.mapfile_context)
         self.storage.set(self.id.storage('values'), mf)
 
     def save(self):
@@ -943,6 +980,24 @@ DEFAULT_CMP_FULL_CMP_LIST = \
      cmp_reporter, cmp_comments, cmp_summary, cmp_uuid, cmp_extra_strings)
 
 class BugCompoundComparator (object):
+    """Compare bugs by a list of cmp_* functions, in order.
+
+    Use the comparator itself as a ``cmp`` function, or (faster)
+    :py:meth:`key` as a ``key`` function.
+
+    >>> bugA = Bug(summary="A")
+    >>> bugB = Bug(summary="B")
+    >>> bugC = Bug(summary="C")
+    >>> bugA.uuid,bugB.uuid,bugC.uuid = ("a", "b", "c")
+    >>> bugA.time = bugB.time = bugC.time = 0
+    >>> bugA.status = "closed"
+    >>> bugB.severity = "serious"
+    >>> cmp_fn = BugCompoundComparator()
+    >>> [bug.uuid for bug in sorted([bugA, bugB, bugC], cmp_fn)]
+    ['b', 'c', 'a']
+    >>> [bug.uuid for bug in sorted([bugA, bugB, bugC], key=cmp_fn.key)]
+    ['b', 'c', 'a']
+    """
     def __init__(self, cmp_list=DEFAULT_CMP_FULL_CMP_LIST):
         self.cmp_list = cmp_list
     def __call__(self, bug_1, bug_2):
@@ -951,8 +1006,22 @@ class BugCompoundComparator (object):
             if val != 0 :
                 return val
         return 0
+    def key(self, bug):
+        """Return a sort key for `bug` consistent with this comparator.
+
+        Comparisons without an entry in :py:data:`CMP_KEYS` fall back
+        to :py:func:`functools.cmp_to_key`.
+        """
+        keys = []
+        for comparison in self.cmp_list:
+            key = CMP_KEYS.get(comparison, None)
+            if key == None:
+                key = functools.cmp_to_key(comparison)
+            keys.append(key(bug))
+        return tuple(keys)
 
 cmp_full = BugCompoundComparator()
+key_full = cmp_full.key
 
 
 # define some bonus cmp_* functions
@@ -961,16 +1030,122 @@ def cmp_last_modified(bug_1, bug_2):
     Like cmp_time(), but use most recent comment instead of bug
     creation for the timestamp.
     """
-    def last_modified(bug):
-        time = bug.time
-        for comment in bug.comment_root.traverse():
-            if comment.time > time:
-                time = comment.time
-        return time
-    val_1 = last_modified(bug_1)
-    val_2 = last_modified(bug_2)
+    val_1 = _last_modified(bug_1)
+    val_2 = _last_modified(bug_2)
     return -cmp(val_1, val_2)
 
+def _last_modified(bug):
+    time = bug.time
+    for comment in bug.comment_root.traverse():
+        if comment.time > time:
+            time = comment.time
+    return time
+
+
+# Sort keys matching the cmp_* functions above.  Comparing two bugs'
+# keys gives the same result as the matching cmp_* function, so bug
+# lists can be sorted with ``key=``, which computes each bug's key
+# once, instead of running the whole cmp_* chain for every pair.
+
+def key_severity(bug):
+    """
+    >>> bugA = Bug()
+    >>> bugB = Bug()
+    >>> bugA.severity = "critical"
+    >>> bugB.severity = "minor"
+    >>> key_severity(bugA) < key_severity(bugB)
+    True
+    """
+    return -severity_index[bug.severity]
+
+def key_status(bug):
+    return status_index[bug.status]
+
+def key_attr(bug, attr, invert=False):
+    """
+    Return a sort key for `bug` that orders like :py:func:`cmp_attr`.
+    Only numeric attributes (or `None`) may be inverted.
+
+    >>> bugA = Bug()
+    >>> bugB = Bug()
+    >>> bugA.time = 10
+    >>> bugB.time = 20
+    >>> key_attr(bugA, "time", invert=True) > key_attr(bugB, "time", invert=True)
+    True
+    >>> bugB.time = None
+    >>> key_attr(bugA, "time", invert=True) < key_attr(bugB, "time", invert=True)
+    True
+    """
+    val = getattr(bug, attr)
+    if val == None: val = None
+    if invert == True:
+        if val == None: # cmp(None, x) < 0, so inverted None sorts last
+            return (True, 0)
+        return (False, -val)
+    return val
+
+def key_mine(bug):
+    user_id = libbe.ui.util.user.get_user_id(bug.storage)
+    return bug.assigned != user_id
+
+class _LazyKey (object):
+    """Sort key that is only computed if a comparison reaches it.
+
+    Tuple comparison stops at the first unequal item, so wrapping
+    expensive key items (e.g. ones that load comment bodies) keeps
+    them from being computed for bugs that are already ordered by
+    earlier items.
+    """
+    __slots__ = ['_fn', '_bug', '_value']
+    def __init__(self, fn, bug):
+        self._fn = fn
+        self._bug = bug
+    def value(self):
+        if self._fn is not None:
+            self._value = self._fn(self._bug)
+            self._fn = self._bug = None
+        return self._value
+    def __eq__(self, other):
+        return self.value() == other.value()
+    def __ne__(self, other):
+        return self.value() != other.value()
+    def __lt__(self, other):
+        return self.value() < other.value()
+    def __le__(self, other):
+        return self.value() <= other.value()
+    def __gt__(self, other):
+        return self.value() > other.value()
+    def __ge__(self, other):
+        return self.value() >= other.value()
+
+def _comments_key(bug):
+    comms = sorted(bug.comments(), key = lambda comm : comm.uuid)
+    return (len(comms), tuple([comment.key_full(c) for c in comms]))
+
+def key_comments(bug):
+    return _LazyKey(_comments_key, bug)
+
+def key_last_modified(bug):
+    val = _last_modified(bug)
+    if val == None:
+        return (True, 0)
+    return (False, -val)
+
+CMP_KEYS = {
+    cmp_severity: key_severity,
+    cmp_status: key_status,
+    cmp_uuid: lambda bug : key_attr(bug, "uuid"),
+    cmp_creator: lambda bug : key_attr(bug, "creator"),
+    cmp_assigned: lambda bug : key_attr(bug, "assigned"),
+    cmp_reporter: lambda bug : key_attr(bug, "reporter"),
+    cmp_summary: lambda bug : key_attr(bug, "summary"),
+    cmp_extra_strings: lambda bug : key_attr(bug, "extra_strings"),
+    cmp_time: lambda bug : key_attr(bug, "time", invert=True),
+    cmp_mine: key_mine,
+    cmp_comments: key_comments,
+    cmp_last_modified: key_last_modified,
+    }
+
 
 if libbe.TESTING == True:
     suite = doctest.DocTestSuite()
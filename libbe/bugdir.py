@@ -23,6 +23,7 @@
 """Define :py:class:`BugDir` for storing a collection of bugs.
 """
 
+import bisect
 import copy
 import errno
 import os
@@ -44,6 +45,8 @@ from libbe.storage.util.properties import Property, doc_property, \
 import libbe.storage.util.settings_object as settings_object
 import libbe.storage.util.mapfile as mapfile
 import libbe.bug as bug
+import libbe.digest
+import libbe.index
 import libbe.util.utility as utility
 import libbe.util.id
 
@@ -64,6 +67,372 @@ class NoBugMatches(libbe.util.id.NoIDMatches):
         return self.msg
 
 
+class ExtraStringIndex (object):
+    """Index a bugdir's bug extra strings by their ``PREFIX:`` tag.
+
+    Extra strings conventionally look like ``PREFIX:value``
+    (e.g. ``BLOCKS:<uuid>`` or ``TAG:<tag>``).  For each prefix,
+    :py:attr:`values` maps bug uuids to their values (in extra-string
+    order) and :py:attr:`bugs` maps values back to sets of bug uuids.
+    :py:class:`BugDir` keeps its index current as bugs are added,
+    removed, or have their extra strings changed.
+
+    >>> bugdir = SimpleBugDir(memory=True)
+    >>> a = bugdir.bug_from_uuid('a')
+    >>> a.extra_strings = ['TAG:x', 'BLOCKS:b']
+    >>> index = bugdir.extra_string_index()
+    >>> index.get('TAG:', 'a')
+    ['x']
+    >>> index.find('BLOCKS:', 'b')
+    set(['a'])
+    >>> b = bugdir.bug_from_uuid('b')
+    >>> b.extra_strings = ['TAG:x']
+    >>> sorted(index.find('TAG:', 'x'))
+    ['a', 'b']
+    >>> bugdir.remove_bug(a)
+    >>> index.find('TAG:', 'x')
+    set(['b'])
+    >>> index.find('BLOCKS:', 'b')
+    set([])
+
+    Values can also be kept sorted by a key function, for range
+    queries with :py:mod:`bisect`.
+
+    >>> b.extra_strings = ['SIZE:3', 'SIZE:10', 'SIZE:big']
+    >>> index.sorted_values('SIZE:', int)
+    [(3, 'b'), (10, 'b')]
+    >>> b.extra_strings = ['SIZE:7']
+    >>> index.sorted_values('SIZE:', int)
+    [(7, 'b')]
+
+    Other modules can attach their own derived index (a "view") to a
+    prefix.  Views are notified whenever a bug's values for that prefix
+    may have changed.
+
+    >>> class Count (object):
+    ...     def __init__(self):
+    ...         self.counts = {}
+    ...     def update(self, uuid, values):
+    ...         self.counts[uuid] = len(values)
+    ...     def remove(self, uuid):
+    ...         self.counts.pop(uuid, None)
+    >>> count = index.view('SIZE:', Count)
+    >>> count.counts
+    {'b': 1}
+    >>> index.view('SIZE:') is count
+    True
+    >>> b.extra_strings = ['SIZE:1', 'SIZE:2']
+    >>> count.counts
+    {'b': 2}
+    >>> b.extra_strings = []
+    >>> count.counts
+    {}
+    >>> bugdir.cleanup()
+    """
+    def __init__(self):
+        self.values = {}
+        self.bugs = {}
+        self._strings = {} # bug uuid -> indexed extra strings
+        self._sorted = {} # prefix -> (key, sorted (key(value), uuid) list)
+        self._views = {} # prefix -> view
+
+    def _split(self, string):
+        i = string.find(':')
+        if i < 0:
+            return (None, string)
+        return (string[:i+1], string[i+1:])
+
+    def _sort_pair(self, key, value, uuid):
+        try:
+            return (key(value), uuid)
+        except ValueError:
+            return None
+
+    def update(self, uuid, extra_strings):
+        """(Re)index bug `uuid` with `extra_strings`."""
+        self.remove(uuid)
+        self._strings[uuid] = list(extra_strings)
+        for string in extra_strings:
+            prefix,value = self._split(string)
+            if prefix == None:
+                continue
+            self.values.setdefault(prefix, {}).setdefault(
+                uuid, []).append(value)
+            self.bugs.setdefault(prefix, {}).setdefault(
+                value, set()).add(uuid)
+            if prefix in self._sorted:
+                key,pairs = self._sorted[prefix]
+                pair = self._sort_pair(key, value, uuid)
+                if pair != None:
+                    bisect.insort(pairs, pair)
+        for prefix,view in self._views.items():
+            values = self.get(prefix, uuid)
+            if len(values) > 0:
+                view.update(uuid, values)
+
+    def remove(self, uuid):
+        """Drop bug `uuid` from the index."""
+        for view in self._views.values():
+            view.remove(uuid)
+        for string in self._strings.pop(uuid, []):
+            prefix,value = self._split(string)
+            if prefix == None:
+                continue
+            self.values[prefix].pop(uuid, None)
+            uuids = self.bugs[prefix].get(value, None)
+            if uuids != None:
+                uuids.discard(uuid)
+                if len(uuids) == 0:
+                    del self.bugs[prefix][value]
+            if prefix in self._sorted:
+                key,pairs = self._sorted[prefix]
+                pair = self._sort_pair(key, value, uuid)
+                if pair != None:
+                    i = bisect.bisect_left(pairs, pair)
+                    if i < len(pairs) and pairs[i] == pair:
+                        del pairs[i]
+
+    def sorted_values(self, prefix, key):
+        """Return a sorted list of ``(key(value), uuid)`` pairs for the
+        `prefix` values.
+
+        The list is built on the first call and then updated
+        incrementally as bugs change, so `key` should always be the
+        same function for a given `prefix`.  Values for which `key`
+        raises :py:class:`ValueError` are skipped.  Do not modify the
+        returned list.
+        """
+        if prefix not in self._sorted:
+            pairs = []
+            for uuid,values in self.values.get(prefix, {}).items():
+                for value in values:
+                    pair = self._sort_pair(key, value, uuid)
+                    if pair != None:
+                        pairs.append(pair)
+            pairs.sort()
+            self._sorted[prefix] = (key, pairs)
+        return self._sorted[prefix][1]
+
+    def view(self, prefix, factory=None):
+        """Return the view attached to `prefix`.
+
+        If there is no view yet and `factory` is given, create one with
+        ``factory()``, fill it with the current `prefix` values, and
+        attach it.  Views must provide ``update(uuid, values)`` and
+        ``remove(uuid)`` methods.
+        """
+        if prefix not in self._views:
+            if factory == None:
+                return None
+            view = factory()
+            for uuid,values in self.values.get(prefix, {}).items():
+                if len(values) > 0:
+                    view.update(uuid, values)
+            self._views[prefix] = view
+        return self._views[prefix]
+
+    def get(self, prefix, uuid):
+        """Return the `prefix` values of bug `uuid`."""
+        return self.values.get(prefix, {}).get(uuid, [])
+
+    def find(self, prefix, value):
+        """Return the uuids of bugs with a ``<prefix><value>`` string."""
+        return self.bugs.get(prefix, {}).get(value, set())
+
+
+class StoredSettings (libbe.index.BugIndex):
+    """Base class for indexes of a value derived from each bug's
+    stored settings.
+
+    The index is read straight from each bug's ``values`` file, so
+    neither building nor updating it loads any bugs.  Subclasses set
+    :py:attr:`name` and implement :py:meth:`_value`.
+    """
+    def __init__(self, *args, **kwargs):
+        libbe.index.BugIndex.__init__(self, *args, **kwargs)
+        self._values = None # bug key -> value
+
+    def _value(self, settings):
+        """Return the value to store for a bug with `settings`."""
+        raise NotImplementedError
+
+    def _save_files(self):
+        self._save_file('values', self._get_values())
+
+    def _get_values(self):
+        if self._values == None:
+            self._values = self._load_file('values', {})
+        return self._values
+
+    def _clear(self):
+        self._values = {}
+        self._dirty.add('values')
+
+    def _index_bug(self, bugdir, bug):
+        self._index_uuid(bugdir.uuid, bug.uuid)
+
+    def _index_uuid(self, bugdir_uuid, uuid):
+        try:
+            settings = mapfile.parse(
+                self.storage.get('%s/values' % uuid, default='{}\n'))
+        except mapfile.InvalidMapfileContents:
+            settings = {}
+        self._get_values()['%s/%s' % (bugdir_uuid, uuid)] = \
+            self._value(settings)
+        self._dirty.add('values')
+
+    def _remove_bug(self, key):
+        values = self._get_values()
+        if key in values:
+            del values[key]
+            self._dirty.add('values')
+
+    def _indexed_bugs(self):
+        return self._get_values().keys()
+
+    def _reindex_bug(self, key):
+        self._remove_bug(key)
+        bugdir_uuid,uuid = key.split('/', 1)
+        if self.bugdirs[bugdir_uuid].has_bug(uuid):
+            self._index_uuid(bugdir_uuid, uuid)
+        self.reindexed.add(key)
+
+    def rebuild(self):
+        """Index every bug from scratch, without loading any."""
+        self._meta = self._new_meta()
+        self._clear()
+        for bugdir in self.bugdirs.values():
+            for uuid in sorted(bugdir.uuids()):
+                self._index_uuid(bugdir.uuid, uuid)
+                self.reindexed.add('%s/%s' % (bugdir.uuid, uuid))
+
+    def values(self, bugdir_uuid):
+        """Return a ``{bug uuid: value}`` dict for the bugs in bugdir
+        `bugdir_uuid`."""
+        prefix = '%s/' % bugdir_uuid
+        return dict([(key[len(prefix):], value)
+                     for key,value in self._get_values().items()
+                     if key.startswith(prefix)])
+
+
+class StoredExtraStrings (StoredSettings):
+    """The stored extra strings of every bug in `bugdirs`.
+
+    This is the on-disk half of :py:class:`ExtraStringIndex`, kept
+    under ``.be/index/extra-strings/``.
+
+    >>> import libbe.util.utility
+    >>> bd = SimpleBugDir(memory=False, versioned=True)
+    >>> dir = libbe.util.utility.Dir()
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.extra_strings = ['TAG:x']
+    >>> revision = bd.storage.commit('Tag a')
+    >>> index = StoredExtraStrings({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/a', 'abc123/b']
+    >>> index.values('abc123')
+    {'a': [u'TAG:x'], 'b': []}
+    >>> a.extra_strings = ['TAG:y']
+    >>> index = StoredExtraStrings({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/a']
+    >>> index.values('abc123')['a']
+    [u'TAG:y']
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'extra-strings'
+
+    def _value(self, settings):
+        extra_strings = settings.get('extra_strings', None)
+        if extra_strings == None:
+            extra_strings = []
+        return extra_strings
+
+
+class StoredTargets (StoredSettings):
+    """The summaries of the target bugs in `bugdirs` (`False` for
+    other bugs).
+
+    This is the on-disk half of :py:class:`TargetRegistry`, kept
+    under ``.be/index/targets/``.
+
+    >>> import libbe.util.utility
+    >>> bd = SimpleBugDir(memory=False)
+    >>> dir = libbe.util.utility.Dir()
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.severity = 'target'
+    >>> index = StoredTargets({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> index.values('abc123')
+    {'a': u'Bug A', 'b': False}
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'targets'
+
+    def _value(self, settings):
+        if settings.get('severity', None) != 'target':
+            return False
+        return settings.get('summary', None)
+
+
+class TargetRegistry (object):
+    """Track a bugdir's target bugs (bugs with ``target`` severity).
+
+    :py:attr:`summaries` maps target uuids to summaries and
+    :py:attr:`uuids` maps summaries back to sets of target uuids.
+    :py:class:`BugDir` keeps its registry current as bugs are added,
+    removed, or have their severity or summary changed.
+
+    >>> bugdir = SimpleBugDir(memory=True)
+    >>> registry = bugdir.target_registry()
+    >>> registry.summaries
+    {}
+    >>> a = bugdir.bug_from_uuid('a')
+    >>> a.severity = 'target'
+    >>> registry.summaries
+    {'a': 'Bug A'}
+    >>> a.summary = 'v1.0'
+    >>> registry.find('v1.0')
+    set(['a'])
+    >>> a.severity = 'minor'
+    >>> registry.find('v1.0')
+    set([])
+    >>> bugdir.cleanup()
+    """
+    def __init__(self):
+        self.summaries = {}
+        self.uuids = {}
+
+    def update(self, bug):
+        """(Re)register `bug` if it is a target."""
+        if bug.severity == 'target':
+            self.add(bug.uuid, bug.summary)
+        else:
+            self.remove(bug.uuid)
+
+    def add(self, uuid, summary):
+        """(Re)register bug `uuid` as a target with `summary`."""
+        self.remove(uuid)
+        self.summaries[uuid] = summary
+        self.uuids.setdefault(summary, set()).add(uuid)
+
+    def remove(self, uuid):
+        """Drop bug `uuid` from the registry."""
+        if uuid in self.summaries:
+            summary = self.summaries.pop(uuid)
+            self.uuids[summary].discard(uuid)
+            if len(self.uuids[summary]) == 0:
+                del self.uuids[summary]
+
+    def find(self, summary):
+        """Return the uuids of targets with summary `summary`."""
+        return self.uuids.get(summary, set())
+
+
 class BugDir (list, settings_object.SavedSettingsObject):
     """A BugDir is a container for :py:class:`~libbe.bug.Bug`\s, with some
     additional attributes.
@@ -164,6 +533,9 @@ class BugDir (list, settings_object.SavedSettingsObject):
     def __init__(self, storage, uuid=None, from_storage=False):
         list.__init__(self)
         settings_object.SavedSettingsObject.__init__(self)
+        self._extra_string_index = None
+        self._target_registry = None
+        self._id_index = None # see libbe.util.id.id_index()
         self.storage = storage
         self.id = libbe.util.id.ID(self, 'bugdir')
         self.uuid = uuid
@@ -194,15 +566,17 @@ class BugDir (list, settings_object.SavedSettingsObject):
         self._setup_status(self.active_status, self.inactive_status)
 
     def save_settings(self):
-        mf = mapfile.generate(self._get_saved_settings())
+        mf = mapfile.generate(self._get_saved_settings(),
+                              context=self.storage.mapfile_context)
         self.storage.set(self.id.storage('settings'), mf)
 
     def load_all_bugs(self):
         """
-        Warning: this could take a while.
+        Warning: this could take a while.  Bugs are loaded in sorted
+        UUID order.
         """
         self._clear_bugs()
-        for uuid in self.uuids():
+        for uuid in sorted(self.uuids()):
             self._load_bug(uuid)
 
     def save(self):
@@ -229,7 +603,7 @@ class BugDir (list, settings_object.SavedSettingsObject):
     def uuids(self, use_cached_disk_uuids=True):
         if use_cached_disk_uuids==False or not hasattr(self, '_uuids_cache'):
             self._refresh_uuid_cache()
-        self._uuids_cache = self._uuids_cache.union([bug.uuid for bug in self])
+        self._uuids_cache.update([bug.uuid for bug in self])
         return self._uuids_cache
 
     def _refresh_uuid_cache(self):
@@ -240,18 +614,24 @@ class BugDir (list, settings_object.SavedSettingsObject):
                 self.storage.children(self.id.storage()))
             for id in child_uuids:
                 self._uuids_cache.add(id)
+        if self._id_index != None:
+            self._id_index.invalidate(self)
 
     def _clear_bugs(self):
         while len(self) > 0:
             self.pop()
         if hasattr(self, '_uuids_cache'):
             del(self._uuids_cache)
+        self._extra_string_index = None
+        self._target_registry = None
+        if self._id_index != None:
+            self._id_index.invalidate(self)
         self._bug_map_gen()
 
     def _load_bug(self, uuid):
         bg = bug.Bug(bugdir=self, uuid=uuid, from_storage=True)
         self.append(bg)
-        self._bug_map_gen()
+        self._bug_map[uuid] = bg
         return bg
 
     def new_bug(self, summary=None, _uuid=None):
@@ -265,18 +645,125 @@ class BugDir (list, settings_object.SavedSettingsObject):
         if update:
             bug.bugdir = self
             bug.storage = self.storage
-            self._bug_map_gen()
+            self._bug_map[bug.uuid] = bug
             if (hasattr(self, '_uuids_cache') and
                 not bug.uuid in self._uuids_cache):
                 self._uuids_cache.add(bug.uuid)
+        if self._extra_string_index != None:
+            self._extra_string_index.update(bug.uuid, bug.extra_strings)
+        if self._target_registry != None:
+            self._target_registry.update(bug)
+        if self._id_index != None:
+            self._id_index.add_bug(self, bug.uuid)
 
     def remove_bug(self, bug):
         if hasattr(self, '_uuids_cache') and bug.uuid in self._uuids_cache:
             self._uuids_cache.remove(bug.uuid)
+        if self._extra_string_index != None:
+            self._extra_string_index.remove(bug.uuid)
+        if self._target_registry != None:
+            self._target_registry.remove(bug.uuid)
+        if self._id_index != None:
+            self._id_index.remove_bug(self, bug.uuid)
         self.remove(bug)
+        self._bug_map.pop(bug.uuid, None)
         if self.storage != None and self.storage.is_writeable():
             bug.remove()
 
+    def unload_bug(self, bug):
+        """Drop a saved `bug` from memory.
+
+        Unlike :py:meth:`remove_bug`, the bug stays in storage, and
+        :py:meth:`bug_from_uuid` will load it again if it is needed.
+        """
+        for i,b in enumerate(self):
+            if b is bug:
+                del self[i]
+                break
+        if self._bug_map.get(bug.uuid, None) is bug:
+            self._bug_map[bug.uuid] = None
+
+    def extra_string_index(self):
+        """Return an :py:class:`ExtraStringIndex` for this bugdir's bugs.
+
+        The first call fills the index from the bugdir's
+        :py:class:`StoredExtraStrings`, which only re-reads bugs whose
+        files have changed.  Bugs that are already loaded are indexed
+        from memory, in case they have unsaved changes.  Without
+        storage, every bug is loaded instead.
+        """
+        if self._extra_string_index == None:
+            index = ExtraStringIndex()
+            stored = self._stored_settings(StoredExtraStrings)
+            if stored == None:
+                for uuid in self.uuids():
+                    bg = self.bug_from_uuid(uuid)
+                    index.update(bg.uuid, bg.extra_strings)
+            else:
+                for uuid,extra_strings in stored.items():
+                    index.update(uuid, extra_strings)
+                for bg in self:
+                    index.update(bg.uuid, bg.extra_strings)
+            self._extra_string_index = index
+        return self._extra_string_index
+
+    def _stored_settings(self, index_class):
+        """Return an up-to-date ``{bug uuid: value}`` dict from the
+        :py:class:`StoredSettings` subclass `index_class`, or `None`
+        if there is no storage to read it from.
+        """
+        if self.storage == None or not self.storage.is_readable():
+            return None
+        stored = index_class({self.uuid: self}, self.storage,
+                             path=self._index_path(index_class.name))
+        try:
+            stored.update()
+        except (IOError, OSError), e:
+            libbe.LOG.warning('could not save %s index: %s'
+                              % (index_class.name, e))
+        return stored.values(self.uuid)
+
+    def _index_path(self, name):
+        """Return the directory for this bugdir's share of the
+        :py:mod:`libbe.index` index `name` (or `None`)."""
+        path = libbe.index.index_path(self.storage, name)
+        if path != None:
+            path = os.path.join(path, self.uuid)
+        return path
+
+    def target_registry(self):
+        """Return a :py:class:`TargetRegistry` for this bugdir's bugs.
+
+        Like :py:meth:`extra_string_index`, the first call fills the
+        registry from an on-disk index (:py:class:`StoredTargets`)
+        and from the bugs already in memory.
+        """
+        if self._target_registry == None:
+            registry = TargetRegistry()
+            stored = self._stored_settings(StoredTargets)
+            if stored == None:
+                for uuid in self.uuids():
+                    registry.update(self.bug_from_uuid(uuid))
+            else:
+                for uuid,summary in stored.items():
+                    if summary is not False:
+                        registry.add(uuid, summary)
+                for bg in self:
+                    registry.update(bg)
+            self._target_registry = registry
+        return self._target_registry
+
+    def _bug_changed(self, bug, name):
+        """Called by :py:class:`~libbe.bug.Bug` when its `name`
+        property changes."""
+        if self._bug_map.get(bug.uuid, None) is not bug:
+            return # not one of our bugs
+        if name == 'extra_strings' and self._extra_string_index != None:
+            self._extra_string_index.update(bug.uuid, bug.extra_strings)
+        if (name in ['severity', 'summary']
+            and self._target_registry != None):
+            self._target_registry.update(bug)
+
     def bug_from_uuid(self, uuid):
         if not self.has_bug(uuid):
             raise NoBugMatches(
@@ -643,7 +1130,12 @@ class BugDir (list, settings_object.SavedSettingsObject):
                     raise ValueError(
                         ('Merge would add extra string "{}" for bugdir {}'
                          ).format(estr, self.uuid))
+        identical = set()
+        if len(other) > 0:
+            identical = libbe.digest.identical_bugs(self, other)
         for o_bug in other:
+            if o_bug.uuid in identical:
+                continue # nothing to merge
             try:
                 s_bug = self.bug_from_uuid(o_bug.uuid)
             except KeyError as e:
@@ -678,7 +1170,7 @@ class RevisionedBugDir (BugDir):
     """
     def __init__(self, bugdir, revision):
         storage_version = bugdir.storage.storage_version(revision)
-        if storage_version != libbe.storage.STORAGE_VERSION:
+        if storage_version not in libbe.storage.READABLE_STORAGE_VERSIONS:
             raise libbe.storage.InvalidStorageVersion(storage_version)
         s = copy.deepcopy(bugdir.storage)
         s.writeable = False
@@ -695,12 +1187,9 @@ class RevisionedBugDir (BugDir):
                     kwargs['revision'] = self.r
                 return self.sget(*args, **kwargs)
             def ancestors(self, *args, **kwargs):
-                print 'getting ancestors', args, kwargs
                 if not 'revision' in kwargs or kwargs['revision'] == None:
                     kwargs['revision'] = self.r
-                ret = self.sancestors(*args, **kwargs)
-                print 'got ancestors', ret
-                return ret
+                return self.sancestors(*args, **kwargs)
             def children(self, *args, **kwargs):
                 if not 'revision' in kwargs or kwargs['revision'] == None:
                     kwargs['revision'] = self.r
@@ -716,8 +1205,13 @@ class RevisionedBugDir (BugDir):
         s.changed = rs.changed
         BugDir.__init__(self, s, from_storage=True)
         self.revision = revision
-    def changed(self):
-        return self.storage.changed()
+    def _index_path(self, name):
+        return None # on-disk indexes describe the working tree
+    def changed(self, to_revision=None):
+        """Return the `(new, modified, removed)` ids from this bugdir's
+        revision to `to_revision` (or to the current situation).
+        """
+        return self.storage.changed(to_revision=to_revision)
     
 
 if libbe.TESTING == True:
@@ -31,6 +31,7 @@ import libbe.storage.util.mapfile
 import libbe.ui.util.user
 import libbe.util.encoding
 import libbe.util.http
+import libbe.util.id
 import libbe.util.plugin
 
 
@@ -565,6 +566,7 @@ class StorageCallbacks (object):
                         uuid=uuid,
                         from_storage=True))
                 for uuid in storage.children())
+            libbe.util.id.id_index(self._bugdirs)
         return self._bugdirs
 
     def set_bugdirs(self, bugdirs):
@@ -147,6 +147,18 @@ class Depend (libbe.command.Command):
     abc/a blocks:
     abc/b       Bug B
     >>> ret = ui.run(cmd, {'repair':True})
+    >>> ret = ui.run(cmd, {'cycles':True})
+    Dependency cycle:
+    abc/a
+    abc/b
+    >>> ret = ui.run(cmd, {'transitive':True}, ['/a'])
+    abc/a blocked by:
+    abc/b
+    abc/a blocks:
+    abc/b
+    >>> ret = ui.run(cmd, {'critical-path':True}, ['/a'])
+    Critical path to abc/a:
+    abc/b
     >>> ret = ui.run(cmd, {'remove':True}, ['/b', '/a'])
     abc/b blocks:
     abc/a
@@ -182,6 +194,13 @@ class Depend (libbe.command.Command):
                         completion_callback=libbe.command.util.complete_severity)),
                 libbe.command.Option(name='repair',
                     help='Check for and repair one-way links'),
+                libbe.command.Option(name='transitive',
+                    help='List every bug that BUG-ID (transitively) blocks '
+                         'or is blocked by'),
+                libbe.command.Option(name='cycles',
+                    help='List dependency cycles'),
+                libbe.command.Option(name='critical-path',
+                    help='Print the longest chain of bugs blocking BUG-ID'),
                 ])
         self.args.extend([
                 libbe.command.Argument(
@@ -195,16 +214,19 @@ class Depend (libbe.command.Command):
                 ])
 
     def _run(self, **params):
-        if params['repair'] == True and params['bug-id'] != None:
-            raise libbe.command.UserError(
-                'No arguments with --repair calls.')
-        if params['repair'] == False and params['bug-id'] == None:
-            raise libbe.command.UserError(
-                'Must specify either --repair or a BUG-ID')
-        if params['tree-depth'] != None \
-                and params['blocking-bug-id'] != None:
+        for mode in ['repair', 'cycles']:
+            if params[mode] == True and params['bug-id'] != None:
+                raise libbe.command.UserError(
+                    'No arguments with --%s calls.' % mode)
+        if params['repair'] == False and params['cycles'] == False \
+                and params['bug-id'] == None:
             raise libbe.command.UserError(
-                'Only one bug id used in tree mode.')
+                'Must specify either --repair, --cycles, or a BUG-ID')
+        for mode in ['tree-depth', 'transitive', 'critical-path']:
+            if params[mode] not in [None, False] \
+                    and params['blocking-bug-id'] != None:
+                raise libbe.command.UserError(
+                    'Only one bug id used in %s mode.' % mode)
         bugdirs = self._get_bugdirs()
         if params['repair'] == True:
             good,fixed,broken = check_dependencies(
@@ -220,10 +242,44 @@ class Depend (libbe.command.Command):
         severity = parse_severity(params['severity'])
         filter = Filter(status, severity)
 
+        if params['cycles'] == True:
+            graph = DependencyGraph(bugdirs)
+            for cycle in graph.cycles(filter=filter):
+                print >> self.stdout, 'Dependency cycle:'
+                print >> self.stdout, \
+                    '\n'.join([self.bug_string(graph.bug(uuid), params)
+                               for uuid in cycle])
+            return 0
+
         bugdir,bugA,dummy_comment = (
             libbe.command.util.bugdir_bug_comment_from_user_id(
                 bugdirs, params['bug-id']))
 
+        if params['transitive'] == True:
+            graph = DependencyGraph(bugdirs)
+            for title,uuids in [
+                ('blocked by', graph.transitive_blocked_by(
+                        bugA.uuid, filter=filter)),
+                ('blocks', graph.transitive_blocks(
+                        bugA.uuid, filter=filter)),
+                ]:
+                if len(uuids) > 0:
+                    print >> self.stdout, '%s %s:' % (bugA.id.user(), title)
+                    print >> self.stdout, \
+                        '\n'.join([self.bug_string(graph.bug(uuid), params)
+                                   for uuid in uuids])
+            return 0
+
+        if params['critical-path'] == True:
+            graph = DependencyGraph(bugdirs)
+            path = graph.critical_path(bugA.uuid, filter=filter)
+            if len(path) > 1:
+                print >> self.stdout, 'Critical path to %s:' % bugA.id.user()
+                print >> self.stdout, \
+                    '\n'.join([self.bug_string(graph.bug(uuid), params)
+                               for uuid in path[:-1]])
+            return 0
+
         if params['tree-depth'] != None:
             dtree = DependencyTree(bugdirs, bugA, params['tree-depth'], filter)
             if len(dtree.blocked_by_tree()) > 0:
@@ -294,6 +350,15 @@ which will only follow and print dependencies with non-target severity.
 If neither bug A nor B is specified, check for and repair the missing
 side of any one-way links.
 
+The --transitive, --cycles, and --critical-path options query the
+whole dependency graph.  --transitive lists every bug that (A) blocks
+or is blocked by, following chains of links.  --cycles lists groups
+of bugs that (directly or indirectly) block each other.
+--critical-path prints the longest chain of bugs blocking (A), which
+is usually a target, starting with the bug that has to be fixed
+first.  Links within dependency cycles are ignored when finding the
+critical path.
+
 The "|--" symbol in the repair-mode output is inspired by the
 "negative feedback" arrow common in biochemistry.  See, for example
   http://www.nature.com/nature/journal/v456/n7223/images/nature07513-f5.0.jpg
@@ -410,75 +475,329 @@ def check_dependencies(bugdirs, repair_broken_links=False):
     []
     >>> bugdir.cleanup()
     """
-    for bugdir in bugdirs.values():
-        if bugdir.storage is not None:
-            bugdir.load_all_bugs()
+    graph = DependencyGraph(bugdirs)
+    checked = set()
     good_links = []
     fixed_links = []
     broken_links = []
+    def check(blockee, blocker, blocks):
+        # blocks=True: check for the BLOCKS link matching a BLOCKED-BY
+        # link (and vice versa).
+        link = (blockee.uuid, blocker.uuid)
+        if link in checked:
+            return # already checked that link
+        checked.add(link)
+        if blocks == True:
+            ok = graph.has_link(blocker.uuid, blockee.uuid, BLOCKS_TAG)
+        else:
+            ok = graph.has_link(blockee.uuid, blocker.uuid, BLOCKED_BY_TAG)
+        if ok == True:
+            good_links.append((blockee, blocker))
+        elif repair_broken_links == True:
+            _repair_one_way_link(blockee, blocker, blocks=blocks)
+            fixed_links.append((blockee, blocker))
+        else:
+            broken_links.append((blockee, blocker))
     for bugdir in bugdirs.values():
-        for bug in bugdir:
-            for blocker in get_blocked_by(bugdirs, bug):
-                blocks = get_blocks(bugdirs, blocker)
-                if (bug, blocks) in good_links+fixed_links+broken_links:
-                    continue # already checked that link
-                if bug not in blocks:
-                    if repair_broken_links == True:
-                        _repair_one_way_link(bug, blocker, blocks=True)
-                        fixed_links.append((bug, blocker))
-                    else:
-                        broken_links.append((bug, blocker))
-                else:
-                    good_links.append((bug, blocker))
-            for blockee in get_blocks(bugdirs, bug):
-                blocked_by = get_blocked_by(bugdirs, blockee)
-                if (blockee, bug) in good_links+fixed_links+broken_links:
-                    continue # already checked that link
-                if bug not in blocked_by:
-                    if repair_broken_links == True:
-                        _repair_one_way_link(blockee, bug, blocks=False)
-                        fixed_links.append((blockee, bug))
-                    else:
-                        broken_links.append((blockee, bug))
-                else:
-                    good_links.append((blockee, bug))
+        for uuid in bugdir.uuids():
+            bug = bugdir.bug_from_uuid(uuid)
+            for blocker in graph.blocked_by(bug.uuid):
+                check(bug, graph.bug(blocker), blocks=True)
+            for blockee in graph.blocks(bug.uuid):
+                check(graph.bug(blockee), bug, blocks=False)
     return (good_links, fixed_links, broken_links)
 
+class DependencyGraph (object):
+    """Bidirectional dependency graph between the bugs in `bugdirs`.
+
+    :py:meth:`blocks` and :py:meth:`blocked_by` return the uuids
+    listed in a bug's ``BLOCKS:`` and ``BLOCKED-BY:`` extra strings.
+    The graph reads from each bugdir's
+    :py:class:`~libbe.bugdir.ExtraStringIndex`, so it follows
+    :py:func:`add_block` and :py:func:`remove_block` without being
+    rebuilt.  That index is filled from the on-disk
+    :py:class:`~libbe.bugdir.StoredExtraStrings`, so building the
+    graph only re-reads bugs that changed since the last run.
+
+    >>> bugdir = libbe.bugdir.SimpleBugDir()
+    >>> bugdirs = {bugdir.uuid: bugdir}
+    >>> a = bugdir.bug_from_uuid('a')
+    >>> b = bugdir.bug_from_uuid('b')
+    >>> graph = DependencyGraph(bugdirs)
+    >>> add_block(a, b)
+    >>> graph.blocked_by('a')
+    ['b']
+    >>> graph.blocks('b')
+    ['a']
+    >>> graph.has_link('b', 'a', BLOCKS_TAG)
+    True
+    >>> remove_block(a, b)
+    >>> graph.blocks('b')
+    []
+    >>> graph.has_link('b', 'a', BLOCKS_TAG)
+    False
+    >>> bugdir.cleanup()
+    """
+    def __init__(self, bugdirs):
+        self.bugdirs = bugdirs
+        self.indexes = [bugdir.extra_string_index()
+                        for bugdir in bugdirs.values()]
+
+    def _get(self, tag, uuid):
+        for index in self.indexes:
+            values = index.get(tag, uuid)
+            if len(values) > 0:
+                return values
+        return []
+
+    def blocks(self, uuid):
+        """Return the uuids of bugs that bug `uuid` blocks."""
+        return self._get(BLOCKS_TAG, uuid)
+
+    def blocked_by(self, uuid):
+        """Return the uuids of bugs blocking bug `uuid`."""
+        return self._get(BLOCKED_BY_TAG, uuid)
+
+    def has_link(self, uuid, target_uuid, tag):
+        """Return `True` if bug `uuid` has a ``<tag><target_uuid>``
+        extra string."""
+        for index in self.indexes:
+            if uuid in index.find(tag, target_uuid):
+                return True
+        return False
+
+    def bug(self, uuid):
+        return libbe.command.util.bug_from_uuid(self.bugdirs, uuid)
+
+    def uuids(self):
+        """Generate the uuids of all bugs in the graph."""
+        for bugdir in self.bugdirs.values():
+            for uuid in bugdir.uuids():
+                yield uuid
+
+    def _neighbors(self, uuid, neighbor_fn, filter=None):
+        uuids = neighbor_fn(uuid)
+        if filter == None:
+            return uuids
+        return [u for u in uuids if filter(self.bugdirs, self.bug(u))]
+
+    def _reachable(self, uuid, neighbor_fn, filter=None):
+        found = []
+        seen = set([uuid])
+        stack = [uuid]
+        while len(stack) > 0:
+            for u in self._neighbors(stack.pop(), neighbor_fn, filter):
+                if u not in seen:
+                    seen.add(u)
+                    found.append(u)
+                    stack.append(u)
+        return found
+
+    def transitive_blocks(self, uuid, filter=None):
+        """Return the uuids of all bugs that bug `uuid` blocks, directly
+        or through other bugs.
+
+        Bugs rejected by `filter` (see :py:class:`Filter`) are neither
+        returned nor followed.
+        """
+        return self._reachable(uuid, self.blocks, filter)
+
+    def transitive_blocked_by(self, uuid, filter=None):
+        """Return the uuids of all bugs blocking bug `uuid`, directly
+        or through other bugs.
+        """
+        return self._reachable(uuid, self.blocked_by, filter)
+
+    def strongly_connected_components(self, filter=None):
+        """Return the graph's strongly connected components.
+
+        Uses an iterative version of Tarjan's algorithm, so each bug
+        and link is visited once.
+        """
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.uuids():
+            if root in index:
+                continue
+            if filter != None and not filter(self.bugdirs, self.bug(root)):
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._neighbors(
+                            root, self.blocked_by, filter)))]
+            while len(work) > 0:
+                node,children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self._neighbors(
+                                        child, self.blocked_by, filter))))
+                        break
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                else:
+                    work.pop()
+                    if len(work) > 0:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            u = stack.pop()
+                            on_stack.discard(u)
+                            component.append(u)
+                            if u == node:
+                                break
+                        components.append(sorted(component))
+        return components
+
+    def cycles(self, filter=None):
+        """Return lists of bug uuids that block each other.
+
+        >>> bugdir = libbe.bugdir.SimpleBugDir()
+        >>> bugdirs = {bugdir.uuid: bugdir}
+        >>> a = bugdir.bug_from_uuid('a')
+        >>> b = bugdir.bug_from_uuid('b')
+        >>> c = bugdir.new_bug(summary='Bug C', _uuid='c')
+        >>> graph = DependencyGraph(bugdirs)
+        >>> add_block(a, b)
+        >>> add_block(b, c)
+        >>> graph.cycles()
+        []
+        >>> add_block(c, a)
+        >>> graph.cycles()
+        [['a', 'b', 'c']]
+        >>> bugdir.cleanup()
+        """
+        return [component for component
+                in self.strongly_connected_components(filter=filter)
+                if len(component) > 1
+                or component[0] in self.blocked_by(component[0])]
+
+    def critical_path(self, uuid, filter=None):
+        """Return the longest chain of bugs blocking bug `uuid`.
+
+        The chain starts with the bug that has to be fixed first and
+        ends with `uuid`.  Each bug's longest chain is computed once
+        (depth-first, in topological order), so shared blockers are
+        not re-expanded.  Links that close a dependency cycle are
+        ignored.
+
+        >>> bugdir = libbe.bugdir.SimpleBugDir()
+        >>> bugdirs = {bugdir.uuid: bugdir}
+        >>> a = bugdir.bug_from_uuid('a')
+        >>> b = bugdir.bug_from_uuid('b')
+        >>> c = bugdir.new_bug(summary='Bug C', _uuid='c')
+        >>> d = bugdir.new_bug(summary='Bug D', _uuid='d')
+        >>> add_block(a, b)
+        >>> add_block(a, c)
+        >>> add_block(c, d)
+        >>> add_block(d, a)
+        >>> graph = DependencyGraph(bugdirs)
+        >>> graph.critical_path('a')
+        ['d', 'c', 'a']
+        >>> graph.transitive_blocked_by('a')
+        ['b', 'c', 'd']
+        >>> graph.transitive_blocks('d')
+        ['c', 'a']
+        >>> bugdir.cleanup()
+        """
+        longest = {} # uuid -> (chain length, next blocker)
+        on_path = set([uuid])
+        neighbors = self._neighbors(uuid, self.blocked_by, filter)
+        work = [(uuid, neighbors, iter(neighbors))]
+        while len(work) > 0:
+            node,neighbors,children = work[-1]
+            for child in children:
+                if child not in longest and child not in on_path:
+                    on_path.add(child)
+                    child_neighbors = self._neighbors(
+                        child, self.blocked_by, filter)
+                    work.append(
+                        (child, child_neighbors, iter(child_neighbors)))
+                    break
+            else:
+                work.pop()
+                on_path.discard(node)
+                best = (1, None)
+                for child in neighbors:
+                    if child in longest and longest[child][0] + 1 > best[0]:
+                        best = (longest[child][0] + 1, child)
+                longest[node] = best
+        path = [uuid]
+        while longest[path[-1]][1] != None:
+            path.append(longest[path[-1]][1])
+        path.reverse()
+        return path
+
 class DependencyTree (object):
     """
     Note: should probably be DependencyDiGraph.
+
+    Pass a :py:class:`DependencyGraph` as `graph` to follow links
+    through its index instead of parsing each bug's extra strings.
     """
-    def __init__(self, bugdirs, root_bug, depth_limit=0, filter=None):
+    def __init__(self, bugdirs, root_bug, depth_limit=0, filter=None,
+                 graph=None):
         self.bugdirs = bugdirs
         self.root_bug = root_bug
         self.depth_limit = depth_limit
         self.filter = filter
+        self.graph = graph
 
     def _build_tree(self, child_fn):
+        children = {} # memoized, filtered child_fn results
         root = libbe.util.tree.Tree()
         root.bug = self.root_bug
         root.depth = 0
+        root.ancestors = frozenset()
         stack = [root]
         while len(stack) > 0:
             node = stack.pop()
             if self.depth_limit > 0 and node.depth == self.depth_limit:
                 continue
-            for bug in child_fn(self.bugdirs, node.bug):
-                if not self.filter(self.bugdirs, bug):
-                    continue
+            uuid = node.bug.uuid
+            if uuid not in children:
+                children[uuid] = [
+                    bug for bug in child_fn(self.bugdirs, node.bug)
+                    if self.filter(self.bugdirs, bug)]
+            ancestors = node.ancestors | set([uuid])
+            for bug in children[uuid]:
+                if bug.uuid in ancestors:
+                    continue # don't loop around dependency cycles
                 child = libbe.util.tree.Tree()
                 child.bug = bug
                 child.depth = node.depth+1
+                child.ancestors = ancestors
                 node.append(child)
                 stack.append(child)
         return root
 
+    def _graph_child_fn(self, uuids_fn):
+        def child_fn(bugdirs, bug):
+            return [self.graph.bug(uuid) for uuid in uuids_fn(bug.uuid)]
+        return child_fn
+
     def blocks_tree(self):
         if not hasattr(self, "_blocks_tree"):
-            self._blocks_tree = self._build_tree(get_blocks)
+            if self.graph == None:
+                child_fn = get_blocks
+            else:
+                child_fn = self._graph_child_fn(self.graph.blocks)
+            self._blocks_tree = self._build_tree(child_fn)
         return self._blocks_tree
 
     def blocked_by_tree(self):
         if not hasattr(self, "_blocked_by_tree"):
-            self._blocked_by_tree = self._build_tree(get_blocked_by)
+            if self.graph == None:
+                child_fn = get_blocked_by
+            else:
+                child_fn = self._graph_child_fn(self.graph.blocked_by)
+            self._blocked_by_tree = self._build_tree(child_fn)
         return self._blocked_by_tree
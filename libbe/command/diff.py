@@ -50,6 +50,17 @@ class Diff (libbe.command.Command):
           status: open -> closed
     >>> ret = ui.run(cmd, {'subscribe':'%(bugdir_id)s:mod', 'uuids':True}, [original])
     a
+    >>> bug.status = 'fixed'
+    >>> ret = ui.run(cmd, {'from':original, 'to':changed})
+    Modified bugs:
+      abc/a:cm: Bug A
+        Changed bug settings:
+          status: open -> closed
+    >>> ret = ui.run(cmd, {'from':changed, 'to':changed})
+    >>> ret = ui.run(cmd, {'to':changed, 'repo':'.'})
+    Traceback (most recent call last):
+      ...
+    UserError: --to cannot be used with --repo.
     >>> bd.storage.versioned = False
     >>> ret = ui.run(cmd, args=[original])
     Traceback (most recent call last):
@@ -78,6 +89,15 @@ class Diff (libbe.command.Command):
                         name='subscribe', metavar='SUBSCRIPTION')),
                 libbe.command.Option(name='uuids', short_name='u',
                     help='Only print the changed bug UUIDS.'),
+                libbe.command.Option(name='from',
+                    help='Compare from revision FROM (same as REVISION).',
+                    arg=libbe.command.Argument(
+                        name='from', metavar='FROM')),
+                libbe.command.Option(name='to',
+                    help='Compare with revision TO instead of the '
+                    'current tree.',
+                    arg=libbe.command.Argument(
+                        name='to', metavar='TO')),
                 ])
         self.args.extend([
                 libbe.command.Argument(
@@ -86,6 +106,15 @@ class Diff (libbe.command.Command):
                 ])
 
     def _run(self, **params):
+        if params['from'] != None:
+            if params['revision'] not in [None, params['from']]:
+                raise libbe.command.UserError(
+                    'Conflicting revisions: %s and --from %s'
+                    % (params['revision'], params['from']))
+            params['revision'] = params['from']
+        if params['to'] != None and params['repo'] != None:
+            raise libbe.command.UserError(
+                '--to cannot be used with --repo.')
         try:
             subscriptions = libbe.diff.subscriptions_from_string(
                 params['subscribe'])
@@ -104,10 +133,21 @@ class Diff (libbe.command.Command):
             if params['revision'] == None: # get the most recent revision
                 params['revision'] = bugdir.storage.revision_id(-1)
             old_bd = libbe.bugdir.RevisionedBugDir(bugdir, params['revision'])
+            if params['to'] != None:
+                bugdir = libbe.bugdir.RevisionedBugDir(bugdir, params['to'])
         else:
             old_storage = libbe.storage.get_storage(params['repo'])
             old_storage.connect()
-            old_bd_current = libbe.bugdir.BugDir(old_storage, from_disk=True)
+            old_uuids = old_storage.children()
+            if bugdir.uuid in old_uuids:
+                old_uuid = bugdir.uuid
+            elif len(old_uuids) == 1:
+                old_uuid = old_uuids[0]
+            else:
+                raise libbe.command.UserError(
+                    'No bugdir {} in {}'.format(bugdir.uuid, params['repo']))
+            old_bd_current = libbe.bugdir.BugDir(
+                old_storage, uuid=old_uuid, from_storage=True)
             if params['revision'] == None: # use the current working state
                 old_bd = old_bd_current
             else:
@@ -115,20 +155,24 @@ class Diff (libbe.command.Command):
                     raise libbe.command.UserError(
                         '{} is not revision-controlled.'.format(
                             bugdir.storage.repo))
-                old_bd = libbe.bugdir.RevisionedBugDir(old_bd_current,revision)
+                old_bd = libbe.bugdir.RevisionedBugDir(
+                    old_bd_current, params['revision'])
         d = libbe.diff.Diff(old_bd, bugdir)
-        tree = d.report_tree(subscriptions)
+        try:
+            tree = d.report_tree(subscriptions)
+        except NotImplementedError:
+            raise libbe.command.UserError(
+                'Comparing two revisions is not supported by %s storage.'
+                % bugdir.storage.name)
 
         if params['uuids'] == True:
-            uuids = []
             bugs = tree.child_by_path('/bugs')
             for bug_type in bugs:
-                uuids.extend([bug.name for bug in bug_type])
-            print >> self.stdout, '\n'.join(uuids)
-        else :
-            rep = tree.report_string()
-            if rep != None:
-                print >> self.stdout, rep
+                for bug in bug_type:
+                    print >> self.stdout, bug.name
+        else:
+            for line in tree.report_lines():
+                print >> self.stdout, line
         return 0
 
     def _long_help(self):
@@ -140,6 +184,13 @@ specific to their storage backend.
 
 For Arch your specifier must be a fully-qualified revision name.
 
+Use --from and --to to compare two past revisions without touching
+the working tree, e.g. to review the changes between two releases.
+The storage backend lists the files that changed between the two
+revisions, and only the bugs owning those files are loaded.  --from
+is the same as REVISION, and both default to the most recent
+revision.
+
 Besides the standard summary output, you can use the options to output
 UUIDS for the different categories.  This output can be used as the
 input to 'be show' to get an understanding of the current status.
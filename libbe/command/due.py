@@ -16,6 +16,10 @@
 # You should have received a copy of the GNU General Public License along with
 # Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
+import heapq
+import time
+
 import libbe
 import libbe.command
 import libbe.command.util
@@ -42,9 +46,16 @@ class Due (libbe.command.Command):
     >>> ret = ui.run(cmd, args=['/a', 'Thu, 01 Jan 1970 00:00:00 +0000'])
     >>> ret = ui.run(cmd, args=['/a'])
     Thu, 01 Jan 1970 00:00:00 +0000
+    >>> ret = ui.run(cmd, {'overdue':True}) # doctest: +NORMALIZE_WHITESPACE
+    Thu, 01 Jan 1970 00:00:00 +0000  abc/a:om: Bug A
+    >>> ret = ui.run(cmd, {'before':'Fri, 02 Jan 1970 00:00:00 +0000'})
+    ... # doctest: +NORMALIZE_WHITESPACE
+    Thu, 01 Jan 1970 00:00:00 +0000  abc/a:om: Bug A
+    >>> ret = ui.run(cmd, {'within':'7d'})
     >>> ret = ui.run(cmd, args=['/a', 'none'])
     >>> ret = ui.run(cmd, args=['/a'])
     No due date assigned.
+    >>> ret = ui.run(cmd, {'overdue':True})
     >>> ui.cleanup()
     >>> bd.cleanup()
     """
@@ -52,9 +63,23 @@ class Due (libbe.command.Command):
 
     def __init__(self, *args, **kwargs):
         libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='overdue',
+                    help='List bugs that are past their due date'),
+                libbe.command.Option(name='within',
+                    help='List bugs due within DURATION from now, '
+                         'e.g. 7d (units: %s)' % ', '.join(
+                        sorted(DURATION_UNITS.keys())),
+                    arg=libbe.command.Argument(
+                        name='within', metavar='DURATION')),
+                libbe.command.Option(name='before',
+                    help='List bugs due before DATE',
+                    arg=libbe.command.Argument(
+                        name='before', metavar='DATE')),
+                ])
         self.args.extend([
                 libbe.command.Argument(
-                    name='bug-id', metavar='BUG-ID',
+                    name='bug-id', metavar='BUG-ID', optional=True,
                     completion_callback=libbe.command.util.complete_bug_id),
                 libbe.command.Argument(
                     name='due', metavar='DUE', optional=True),
@@ -62,6 +87,17 @@ class Due (libbe.command.Command):
 
     def _run(self, **params):
         bugdirs = self._get_bugdirs()
+        listing = (params['overdue'] == True or params['within'] != None
+                   or params['before'] != None)
+        if listing == True:
+            if params['bug-id'] != None:
+                raise libbe.command.UserError(
+                    'Do not specify a bug id with --overdue, --within, '
+                    'or --before.')
+            self._list_due(bugdirs, params)
+            return 0
+        if params['bug-id'] == None:
+            raise libbe.command.UserError('Please specify a bug id.')
         bugdir,bug,comment = (
             libbe.command.util.bugdir_bug_comment_from_user_id(
                 bugdirs, params['bug-id']))
@@ -78,14 +114,59 @@ class Due (libbe.command.Command):
                 due_time = libbe.util.utility.fuzzy_str_to_time(params['due'])
                 set_due(bug, due_time)
 
+    def _list_due(self, bugdirs, params):
+        now = time.time()
+        start = stop = None
+        if params['overdue'] == True:
+            stop = now
+        if params['within'] != None:
+            start = now
+            stop = _min(stop, now + parse_duration(params['within']))
+        if params['before'] != None:
+            try:
+                before = libbe.util.utility.fuzzy_str_to_time(
+                    params['before'])
+            except ValueError, e:
+                raise libbe.command.UserError(
+                    'Invalid date %r: %s' % (params['before'], e))
+            stop = _min(stop, before)
+        for due_time,bug in bugs_due(bugdirs, start=start, stop=stop):
+            print >> self.stdout, '%s  %s' % (
+                libbe.util.utility.time_to_str(due_time),
+                bug.string(shortlist=True))
+
     def _long_help(self):
         return """
 If no DATE is specified, the bug's current due date is printed.  If
 DATE is specified, it will be assigned to the bug.
+
+With --overdue, --within, or --before (and no BUG-ID), list the bugs
+due in that range, earliest first.  The options may be combined, e.g.
+  $ be due --within 2w --before 'Fri, 01 Jan 2010 00:00:00 +0000'
 """
 
+DURATION_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 60*60,
+    'd': 24*60*60,
+    'w': 7*24*60*60,
+    }
+
 # internal helper functions
 
+def _min(a, b):
+    if a == None:
+        return b
+    return min(a, b)
+
+def _due_time(string):
+    """Parse the date from a ``DUE:`` extra string value."""
+    try:
+        return libbe.util.utility.fuzzy_str_to_time(string)
+    except (ImportError, TypeError), e: # no dateutil, or odd time zone
+        raise ValueError(str(e))
+
 def _generate_due_string(time):
     return "%s%s" % (DUE_TAG, libbe.util.utility.time_to_str(time))
 
@@ -118,3 +199,68 @@ def set_due(bug, time):
     estrs = bug.extra_strings
     estrs.append(_generate_due_string(time))
     bug.extra_strings = estrs # reassign to notice change
+
+def parse_duration(string):
+    """Convert a duration like ``7d`` or ``12h`` to seconds.
+
+    >>> parse_duration('7d')
+    604800
+    >>> parse_duration('90m')
+    5400
+    >>> parse_duration('soon')
+    Traceback (most recent call last):
+      ...
+    UserError: Invalid duration 'soon' (expected e.g. 7d; units: d, h, m, s, w)
+    """
+    string = string.strip()
+    try:
+        return int(string[:-1]) * DURATION_UNITS[string[-1:]]
+    except (ValueError, KeyError):
+        raise libbe.command.UserError(
+            'Invalid duration %r (expected e.g. 7d; units: %s)'
+            % (string, ', '.join(sorted(DURATION_UNITS.keys()))))
+
+def due_index(bugdir):
+    """Return sorted ``(due time, bug uuid)`` pairs for `bugdir`.
+
+    The pairs come from the bugdir's
+    :py:class:`~libbe.bugdir.ExtraStringIndex`, which keeps them
+    sorted as :py:func:`set_due` and :py:func:`remove_due` (or any
+    other extra-string change) add and remove ``DUE:`` strings.  That
+    index is filled from the on-disk
+    :py:class:`~libbe.bugdir.StoredExtraStrings`, so building it does
+    not load any bugs.
+    """
+    return bugdir.extra_string_index().sorted_values(DUE_TAG, _due_time)
+
+def bugs_due(bugdirs, start=None, stop=None):
+    """Generate ``(due time, bug)`` pairs for bugs due in
+    ``[start, stop)``, earliest first.
+
+    Only bugs in the requested range are loaded.
+
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> set_due(bd.bug_from_uuid('a'), 10)
+    >>> set_due(bd.bug_from_uuid('b'), 20)
+    >>> bd.flush_reload()
+    >>> [(t, bug.uuid) for t,bug in bugs_due({bd.uuid: bd}, stop=15)]
+    [(10, 'a')]
+    >>> [bug.uuid for bug in bd]
+    ['a']
+    >>> bd.cleanup()
+    """
+    ranges = []
+    for bugdir in bugdirs.values():
+        pairs = due_index(bugdir)
+        if start == None:
+            i = 0
+        else:
+            i = bisect.bisect_left(pairs, (start,))
+        if stop == None:
+            j = len(pairs)
+        else:
+            j = bisect.bisect_left(pairs, (stop,))
+        ranges.append([(t, uuid, bugdir) for t,uuid in pairs[i:j]])
+    for due_time,uuid,bugdir in heapq.merge(*ranges):
+        yield (due_time, bugdir.bug_from_uuid(uuid))
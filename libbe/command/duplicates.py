@@ -0,0 +1,127 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+import libbe
+import libbe.command
+import libbe.command.util
+import libbe.duplicates
+
+
+class Duplicates (libbe.command.Command):
+    """List bugs that are probably duplicates
+
+    >>> import sys
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.summary = u'XML export crashes on large bugdirs'
+    >>> b = bd.bug_from_uuid('b')
+    >>> b.summary = u'The XML export crashes on large bugdirs'
+    >>> io = libbe.command.StringInputOutput()
+    >>> io.stdout = sys.stdout
+    >>> ui = libbe.command.UserInterface(io=io)
+    >>> ui.storage_callbacks.set_storage(bd.storage)
+    >>> cmd = Duplicates(ui=ui)
+
+    >>> ret = ui.run(cmd)
+    0.78 abc/a:om: XML export crashes on large bugdirs
+         abc/b:cm: The XML export crashes on large bugdirs
+    >>> ret = ui.run(cmd, args=['/a'])
+    0.78 abc/b:cm: The XML export crashes on large bugdirs
+    >>> ret = ui.run(cmd, {'threshold':0.9}, ['/a'])
+    >>> ret = ui.run(cmd, {'threshold':2})
+    Traceback (most recent call last):
+      ...
+    UserError: Invalid threshold 2.0 (must be between 0 and 1)
+    >>> ui.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'duplicates'
+
+    def __init__(self, *args, **kwargs):
+        libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='threshold', short_name='t',
+                    help='Only list bugs at least this similar (0 to 1, '
+                    'defaults to %s)' % libbe.duplicates.DEFAULT_THRESHOLD,
+                    arg=libbe.command.Argument(
+                        name='threshold', metavar='SIMILARITY',
+                        type='float',
+                        default=libbe.duplicates.DEFAULT_THRESHOLD)),
+                libbe.command.Option(name='rebuild',
+                    help='Rebuild the duplicates index from scratch'),
+                ])
+        self.args.extend([
+                libbe.command.Argument(
+                    name='bug-id', metavar='BUG-ID', optional=True,
+                    completion_callback=libbe.command.util.complete_bug_id),
+                ])
+
+    def _run(self, **params):
+        threshold = params['threshold']
+        if threshold < 0 or threshold > 1:
+            raise libbe.command.UserError(
+                'Invalid threshold %s (must be between 0 and 1)'
+                % float(threshold))
+        bugdirs = self._get_bugdirs()
+        if params['bug-id'] != None:
+            bugdir,bug,comment = (
+                libbe.command.util.bugdir_bug_comment_from_user_id(
+                    bugdirs, params['bug-id']))
+        index = update_index(bugdirs, self._get_storage(), params['rebuild'])
+        if params['bug-id'] != None:
+            key = '%s/%s' % (bugdir.uuid, bug.uuid)
+            for s,key in index.duplicates(key, threshold):
+                print >> self.stdout, '%.2f %s' % (
+                    s, _bug_from_key(bugdirs, key).string(shortlist=True))
+            return 0
+        for s,key_1,key_2 in index.pairs(threshold):
+            print >> self.stdout, '%.2f %s' % (
+                s, _bug_from_key(bugdirs, key_1).string(shortlist=True))
+            print >> self.stdout, '     %s' % (
+                _bug_from_key(bugdirs, key_2).string(shortlist=True))
+        return 0
+
+    def _long_help(self):
+        return """
+List pairs of bugs that are probably duplicates, most similar first,
+along with their estimated similarity.  With a BUG-ID, list the
+probable duplicates of that bug instead.
+
+Bugs are compared on the words and word pairs in their summaries and
+bodies (their first comments), so the similarity is the fraction of
+those they share.  Only bugs that are already likely to be similar are
+compared, so some pairs near the threshold may be missed.
+
+On version-controlled repositories the comparison data is stored in
+.be/index/duplicates and updated from the changes since the last run.
+Use --rebuild if it ever gets out of sync.
+"""
+
+def update_index(bugdirs, storage, rebuild=False):
+    """Return an up-to-date :py:class:`~libbe.duplicates.DuplicateIndex`.
+    """
+    index = libbe.duplicates.DuplicateIndex(bugdirs, storage)
+    try:
+        index.update(rebuild=rebuild)
+    except (IOError, OSError), e:
+        libbe.LOG.warning('could not save duplicates index: %s' % e)
+    return index
+
+def _bug_from_key(bugdirs, key):
+    bugdir_uuid,bug_uuid = key.split('/', 1)
+    return bugdirs[bugdir_uuid].bug_from_uuid(bug_uuid)
@@ -0,0 +1,92 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+import libbe
+import libbe.command
+import libbe.command.util
+import libbe.jsonl
+
+
+FORMATS = ['jsonl']
+
+
+class Export (libbe.command.Command):
+    """Export every bug in the repository
+
+    >>> import sys
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> a = bd.bug_from_uuid('a')
+    >>> comment = a.comment_root.new_reply(u'Hello\\n')
+    >>> io = libbe.command.StringInputOutput()
+    >>> io.stdout = sys.stdout
+    >>> ui = libbe.command.UserInterface(io=io)
+    >>> ui.storage_callbacks.set_storage(bd.storage)
+    >>> cmd = Export(ui=ui)
+
+    >>> ret = ui.run(cmd) # doctest: +ELLIPSIS, +NORMALIZE_WHITESPACE
+    {"bugdir": "abc123", "settings": {}}
+    {"bug": "a", "bugdir": "abc123",
+     "comments": [{"body": "Hello\\n",
+                   "settings": {"Content-type": "text/plain", "Date": "..."},
+                   "uuid": "..."}],
+     "settings": {"creator": "John Doe <jdoe@example.com>", "severity": "minor",
+                  "status": "open", "summary": "Bug A",
+                  "time": "Thu, 01 Jan 1970 00:00:00 +0000"}}
+    {"bug": "b", "bugdir": "abc123", "comments": [],
+     "settings": {"creator": "Jane Doe <jdoe@example.com>", "severity": "minor",
+                  "status": "closed", "summary": "Bug B",
+                  "time": "Thu, 01 Jan 1970 00:00:00 +0000"}}
+    >>> ret = ui.run(cmd, {'format':'csv'})
+    Traceback (most recent call last):
+      ...
+    UserError: Invalid format csv (valid formats: jsonl)
+    >>> ui.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'export'
+
+    def __init__(self, *args, **kwargs):
+        libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='format', short_name='f',
+                    help='Output format (%s)' % ', '.join(FORMATS),
+                    arg=libbe.command.Argument(
+                        name='format', metavar='FORMAT', default='jsonl',
+                        completion_callback=libbe.command.util.Completer(
+                            FORMATS))),
+                ])
+
+    def _run(self, **params):
+        if params['format'] not in FORMATS:
+            raise libbe.command.UserError(
+                'Invalid format %s (valid formats: %s)'
+                % (params['format'], ', '.join(FORMATS)))
+        bugdirs = self._get_bugdirs()
+        for line in libbe.jsonl.export(self._get_storage(), sorted(bugdirs)):
+            self.stdout.write(line + '\n')
+        return 0
+
+    def _long_help(self):
+        return """
+Write every bugdir, bug, and comment in the repository to stdout as
+JSON Lines: one line for each bugdir, holding its settings, followed
+by one line for each of its bugs, holding the bug's settings and its
+whole comment tree.  The settings are copied straight from storage,
+so exporting never has to build bug or comment objects.  See "be help
+import" for loading the output into another repository.
+"""
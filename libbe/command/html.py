@@ -120,9 +120,13 @@ class ServerApp (libbe.util.wsgi.WSGI_AppObject,
         template_info['{}_class'.format(bug_type)] = 'tab sel'
         if bug_type == 'target':
             template = self.template.get_template('target_index.html')
+            graph = libbe.command.depend.DependencyGraph(self.bugdirs)
             template_info['targets'] = [
-                (target, sorted(libbe.command.depend.get_blocked_by(
-                            self.bugdirs, target)))
+                (target,
+                 sorted([graph.bug(uuid) for uuid
+                         in graph.transitive_blocked_by(target.uuid)]),
+                 [graph.bug(uuid) for uuid
+                  in graph.critical_path(target.uuid)[:-1]])
                 for target in bugs]
         else:
             template = self.template.get_template('standard_index.html')           
@@ -149,7 +153,9 @@ class ServerApp (libbe.util.wsgi.WSGI_AppObject,
             index_type = 'active'
         else:
             index_type = 'inactive'
-        target = libbe.command.target.bug_target(self.bugdirs, bug)
+        target = libbe.command.target.bug_target(
+            self.bugdirs, bug,
+            graph=libbe.command.depend.DependencyGraph(self.bugdirs))
         if target == bug:  # e.g. when bug.severity == 'target'
             target = None
         up_link = '../../{}?type={}'.format(self._index_file, index_type)
@@ -391,6 +397,13 @@ th.target_name {
     padding-right: 5px;
 }
 
+th.target_path {
+    text-align:left;
+    font-weight:normal;
+    padding-left: 5px;
+    padding-right: 5px;
+}
+
 table {
   border-style: solid;
   border: 1px #c3d9ff;
@@ -624,7 +637,7 @@ div.root.comment {
 """{% extends "index.html" %}
 
 {% block bug_table %}
-{% for target,bugs in targets %}
+{% for target,bugs,path in targets %}
 <table class="target_list">
   <thead>
     <tr>
@@ -632,6 +645,14 @@ div.root.comment {
         Target: {{ target.summary|e }} ({{ target.status|e }})
       </th>
     </tr>
+{% if path %}
+    <tr>
+      <th class="target_path" colspan="5">
+        Critical path:
+        {% for bug in path %}<a href="{{ bug_dir(bug) }}/{{ index_file }}">{{ bug.id.user()|e }}</a>{% if not loop.last %} &rarr; {% endif %}{% endfor %}
+      </th>
+    </tr>
+{% endif %}
     <tr>
       <th>UUID</th>
       <th>Status</th>
@@ -761,6 +782,11 @@ class HTML (libbe.util.wsgi.ServerCommand):
     >>> ui = libbe.command.UserInterface(io=io)
     >>> ui.storage_callbacks.set_storage(bugdir.storage)
     >>> cmd = HTML(ui=ui)
+    >>> target = bugdir.new_bug(summary='v1.0', _uuid='t')
+    >>> target.severity = 'target'
+    >>> libbe.command.depend.add_block(target, bugdir.bug_from_uuid('a'))
+    >>> libbe.command.depend.add_block(
+    ...     bugdir.bug_from_uuid('a'), bugdir.bug_from_uuid('b'))
 
     >>> export_path = os.path.join(bugdir.storage.repo, 'html_export')
     >>> ret = ui.run(cmd, {'output': export_path, 'export-html': True})
@@ -779,8 +805,19 @@ class HTML (libbe.util.wsgi.ServerCommand):
     ...     else:
     ...         print('missing {}'.format(bug.uuid))
     got a
+    got t
     got b
 
+    Target pages list every bug a target is waiting on, along with
+    the longest chain of blockers.
+
+    >>> with open(os.path.join(export_path, 'index_by_target.html')) as f:
+    ...     content = f.read()
+    >>> 'Critical path:' in content
+    True
+    >>> content.count('<td class="summary">')
+    2
+
     >>> ui.cleanup()
     >>> bugdir.cleanup()
     """
@@ -0,0 +1,251 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import multiprocessing
+
+import libbe
+import libbe.command
+import libbe.command.util
+import libbe.jsonl
+import libbe.util.id
+
+
+FORMATS = ['jsonl']
+
+IMPORT_BATCH = 1000 # lines parsed (and written) together
+
+
+class Import (libbe.command.Command):
+    """Import bugs exported with "be export"
+
+    >>> import sys
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> io = libbe.command.StringInputOutput()
+    >>> io.stdout = sys.stdout
+    >>> ui = libbe.command.UserInterface(io=io)
+    >>> ui.storage_callbacks.set_storage(bd.storage)
+    >>> cmd = Import(ui=ui)
+
+    >>> ui.io.set_stdin('\\n'.join([
+    ...     '{"bugdir": "xyz", "settings": {"target": "v1"}}',
+    ...     '{"bugdir": "xyz", "bug": "a", "settings": {}, "comments": []}',
+    ...     '{"bugdir": "xyz", "bug": "c", "settings": {"summary": "Bug C",'
+    ...     ' "status": "open"}, "comments": [{"uuid": "d", "settings": {'
+    ...     '"Content-type": "text/plain", "Date": '
+    ...     '"Thu, 01 Jan 1970 00:00:00 +0000"}, "body": "Hello\\\\n"}]}',
+    ...     '']))
+    >>> ret = ui.run(cmd, {'root':'abc', 'jobs':1}, ['-'])
+    Imported 1 bug
+    Skipped 1 existing bug
+    >>> bd.flush_reload()
+    >>> bug = bd.bug_from_uuid('c')
+    >>> print bug.summary
+    Bug C
+    >>> bug.load_comments(load_full=False)
+    >>> print bug.comment_root[0].body
+    Hello
+    <BLANKLINE>
+
+    Without --root, bugdir lines create any missing bugdirs.
+
+    >>> ui.io.set_stdin('{"bugdir": "xyz", "settings": {}}\\n'
+    ...     '{"bugdir": "xyz", "bug": "e", "settings": {}, "comments": []}\\n')
+    >>> ret = ui.run(cmd, {'jobs':2}, ['-'])
+    Imported 1 bugdir and 1 bug
+    >>> sorted(libbe.util.id.child_uuids(bd.storage.children('xyz')))
+    [u'e']
+
+    >>> ui.io.set_stdin('{"bugdir": "xyz", "bug": "f"}\\n{"bug": "g"}\\n')
+    >>> ret = ui.run(cmd, {'jobs':2}, ['-'])
+    Traceback (most recent call last):
+      ...
+    UserError: line 2: missing 'bugdir'
+    >>> ui.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'import'
+
+    def __init__(self, *args, **kwargs):
+        libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='format', short_name='f',
+                    help='Input format (%s)' % ', '.join(FORMATS),
+                    arg=libbe.command.Argument(
+                        name='format', metavar='FORMAT', default='jsonl',
+                        completion_callback=libbe.command.util.Completer(
+                            FORMATS))),
+                libbe.command.Option(name='root', short_name='r',
+                    help='Import bugs from bugdirs that do not exist in '
+                    'this repository into this bugdir',
+                    arg=libbe.command.Argument(
+                        name='root', metavar='ID',
+                        completion_callback=libbe.command.util.complete_bugdir_id)),
+                libbe.command.Option(name='jobs', short_name='j',
+                    help='Number of processes parsing the input (defaults '
+                    'to the number of CPUs)',
+                    arg=libbe.command.Argument(
+                        name='jobs', metavar='JOBS', type='int')),
+                ])
+        self.args.extend([
+                libbe.command.Argument(
+                    name='file', metavar='FILE',
+                    completion_callback=libbe.command.util.complete_path),
+                ])
+
+    def _run(self, **params):
+        if params['format'] not in FORMATS:
+            raise libbe.command.UserError(
+                'Invalid format %s (valid formats: %s)'
+                % (params['format'], ', '.join(FORMATS)))
+        storage = self._get_storage()
+        bugdirs = self._get_bugdirs()
+        root = None
+        if params['root'] != None:
+            root,bug,comment = (
+                libbe.command.util.bugdir_bug_comment_from_user_id(
+                    bugdirs, params['root']))
+            if bug != None:
+                raise libbe.command.UserError(
+                    '%s is a bug id, not a bugdir id' % params['root'])
+            root = root.uuid
+        jobs = params['jobs']
+        if jobs == None:
+            jobs = multiprocessing.cpu_count()
+        state = {
+            'bugdirs':set(bugdirs.keys()), 'root':root,
+            'bugs':set(), # UUIDs of all bugs in the repository
+            'counts':{'bugdir':0, 'bug':0, 'skipped':0}}
+        for uuid in bugdirs:
+            state['bugs'].update(libbe.util.id.child_uuids(
+                    storage.children(uuid)))
+        if params['file'] == '-':
+            stream = self.stdin
+        else:
+            self._check_restricted_access(storage, params['file'])
+            stream = open(params['file'], 'rb')
+        pool = None
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs)
+        storage.begin_batch()
+        try:
+            # parse each batch while the previous one is being written
+            pending = None
+            for lines in self._batches(stream):
+                if pool == None:
+                    parsed = _Parsed(lines)
+                else:
+                    parsed = pool.map_async(
+                        libbe.jsonl.parse_line, lines,
+                        chunksize=max(1, len(lines) // (4*jobs)))
+                if pending != None:
+                    self._write(storage, pending, state)
+                pending = parsed
+            if pending != None:
+                self._write(storage, pending, state)
+        finally:
+            if pool != None:
+                pool.terminate()
+                pool.join()
+            if stream != self.stdin:
+                stream.close()
+            storage.end_batch()
+        if state['counts']['skipped'] > 0:
+            print >> self.stdout, 'Skipped %s' % _plural(
+                state['counts']['skipped'], 'existing bug')
+        return 0
+
+    def _batches(self, stream):
+        lines = enumerate(stream, 1)
+        while True:
+            batch = list(itertools.islice(lines, IMPORT_BATCH))
+            if len(batch) == 0:
+                return
+            yield batch
+
+    def _write(self, storage, parsed, state):
+        try:
+            records = parsed.get()
+        except ValueError, e:
+            raise libbe.command.UserError(unicode(e))
+        counts = state['counts']
+        before = (counts['bugdir'], counts['bug'])
+        for record in records:
+            if record == None:
+                continue
+            if record['bug'] == None:
+                if record['bugdir'] not in state['bugdirs'] \
+                        and state['root'] == None:
+                    libbe.jsonl.write_bugdir_record(storage, record)
+                    state['bugdirs'].add(record['bugdir'])
+                    counts['bugdir'] += 1
+                continue
+            if record['bug'] in state['bugs']:
+                counts['skipped'] += 1
+                continue
+            libbe.jsonl.write_record(
+                storage, record, self._target(record, state))
+            state['bugs'].add(record['bug'])
+            counts['bug'] += 1
+        if (counts['bugdir'], counts['bug']) != before:
+            parts = [_plural(counts[tag], tag) for tag in ['bugdir', 'bug']
+                     if counts[tag] > 0]
+            print >> self.stdout, 'Imported %s' % ' and '.join(parts)
+
+    def _target(self, record, state):
+        if record['bugdir'] in state['bugdirs']:
+            return record['bugdir']
+        if state['root'] != None:
+            return state['root']
+        if len(state['bugdirs']) == 1:
+            return list(state['bugdirs'])[0]
+        raise libbe.command.UserError(
+            'line %d: unknown bugdir %s (use --root to choose one)'
+            % (record['line'], record['bugdir']))
+
+    def _long_help(self):
+        return """
+Import bugs (with their comments) from a JSON Lines file written by
+"be export".  Use "-" as FILE to read from stdin.
+
+Bugs are imported into the bugdir they were exported from.  Bugdirs
+that do not exist in this repository are created, unless you use
+--root, in which case their bugs are imported into the --root bugdir
+instead.  Bugs that already exist in the repository are skipped.
+
+The input is parsed in batches of %d lines by JOBS worker processes,
+while the previous batch is written to the repository.  On
+version-controlled repositories, the new files are handed to the VCS
+together rather than one at a time.
+""" % IMPORT_BATCH
+
+
+class _Parsed (object):
+    """Parse lines in this process, with the same ``get()`` as the
+    :py:class:`multiprocessing.pool.AsyncResult` of a worker pool.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+
+    def get(self):
+        return map(libbe.jsonl.parse_line, self.lines)
+
+def _plural(count, noun):
+    if count == 1:
+        return '1 %s' % noun
+    return '%d %ss' % (count, noun)
@@ -43,6 +43,9 @@ if libbe.TESTING == True:
     import libbe.bugdir
 
 
+STREAM_BATCH = 100 # top-level elements merged between --stream saves
+
+
 class Import_XML (libbe.command.Command):
     """Import comments and bugs from XML
 
@@ -69,6 +72,21 @@ class Import_XML (libbe.command.Command):
     True
     >>> comment.in_reply_to is None
     True
+
+    With --stream, each top-level element is merged (and saved) as
+    soon as it has been read.
+
+    >>> ui.io.set_stdin('<be-xml><comment><uuid>d</uuid><body>Another comment about a</body></comment><bug><uuid>c</uuid><summary>Bug C</summary></bug></be-xml>')
+    >>> ret = ui.run(cmd, {'root':'/a', 'stream':True}, ['-'])
+    Imported 1 bug and 1 comment
+    >>> bd.flush_reload()
+    >>> bug = bd.bug_from_uuid('a')
+    >>> bug.load_comments(load_full=False)
+    >>> sorted(c.body.rstrip() for c in bug.comments())
+    [u'Another comment about a', u'This is a comment about a']
+    >>> sorted(bug.summary for bug in [bd.bug_from_uuid(uuid)
+    ...                                for uuid in bd.uuids()])
+    [u'Bug A', u'Bug B', u'Bug C']
     >>> ui.cleanup()
     >>> bd.cleanup()
     """
@@ -83,6 +101,9 @@ class Import_XML (libbe.command.Command):
                     help='If any bug or comment listed in the XML file already exists in the bug repository, do not alter the repository version.'),
                 libbe.command.Option(name='preserve-uuids', short_name='p',
                     help='Preserve UUIDs for trusted input (potential name collisions).'),
+                libbe.command.Option(name='stream', short_name='s',
+                    help='Merge and save each top-level element as it is '
+                    'read, instead of reading the whole file first.'),
                 libbe.command.Option(name='root', short_name='r',
                     help='Supply a bugdir, bug, or comment ID as the root of '
                     'any non-bugdir elements that are direct children of the '
@@ -109,10 +130,6 @@ class Import_XML (libbe.command.Command):
         else:
             root_bugdir,root_bug,root_comment = (None, None, None)
 
-        xml = self._read_xml(storage, params)
-        version,root_bugdirs,root_bugs,root_comments = self._parse_xml(
-            xml, params)
-
         if params['add-only']:
             accept_changes = False
             accept_extra_strings = False
@@ -120,6 +137,20 @@ class Import_XML (libbe.command.Command):
             accept_changes = True
             accept_extra_strings = True
 
+        if params['stream'] == True:
+            try:
+                self._stream_xml(
+                    storage, writeable, bugdirs,
+                    root_bugdir, root_bug, root_comment,
+                    params, accept_changes, accept_extra_strings)
+            finally:
+                storage.writeable = writeable
+            return 0
+
+        xml = self._read_xml(storage, params)
+        version,root_bugdirs,root_bugs,root_comments = self._parse_xml(
+            xml, params)
+
         dirty_items = list(self._merge_comments(
                 bugdirs, root_bug, root_comment, root_comments,
                 params, accept_changes, accept_extra_strings))
@@ -131,23 +162,32 @@ class Import_XML (libbe.command.Command):
                 params, accept_changes, accept_extra_strings))
 
         # protect against programmer error causing data loss:
-        if root_bug is not None:
-            # check for each of the new comments
-            comms = []
-            for c in root_bug.comments():
-                comms.append(c.uuid)
-                if c.alt_id != None:
-                    comms.append(c.alt_id)
-            if root_comment.uuid == libbe.comment.INVALID_UUID:
-                root_text = root_bug.id.user()
-            else:
-                root_text = root_comment.id.user()
-            for new in root_comments:
-                assert new.uuid in comms or new.alt_id in comms, \
-                    "comment %s (alt: %s) wasn't added to %s" \
-                    % (new.uuid, new.alt_id, root_text)
-        for new in root_bugs:
-            # check for each of the new bugs
+        self._check_comments(root_bug, root_comment, root_comments)
+        self._check_bugs(bugdirs, root_bugdir, root_bugs)
+        self._check_bugdirs(bugdirs, root_bugdirs)
+
+        # save new information
+        storage.writeable = writeable
+        for item in dirty_items:
+            item.save()
+
+    def _check_comments(self, root_bug, root_comment, comments):
+        # check for each of the new comments
+        if root_bug is None:
+            return
+        comms = root_bug.comment_root.comment_index()
+        if root_comment.uuid == libbe.comment.INVALID_UUID:
+            root_text = root_bug.id.user()
+        else:
+            root_text = root_comment.id.user()
+        for new in comments:
+            assert new.uuid in comms or new.alt_id in comms, \
+                "comment %s (alt: %s) wasn't added to %s" \
+                % (new.uuid, new.alt_id, root_text)
+
+    def _check_bugs(self, bugdirs, root_bugdir, bugs):
+        # check for each of the new bugs
+        for new in bugs:
             try:
                 libbe.command.util.bug_from_uuid(bugdirs, new.uuid)
             except libbe.bugdir.NoBugMatches:
@@ -157,16 +197,13 @@ class Import_XML (libbe.command.Command):
                     raise AssertionError(
                         "bug {} (alt: {}) wasn't added to {}".format(
                             new.uuid, new.alt_id, root_bugdir.id.user()))
-        for new in root_bugdirs:
+
+    def _check_bugdirs(self, bugdirs, new_bugdirs):
+        for new in new_bugdirs:
             assert new.uuid in bugdirs or new.alt_id in bugdirs, (
                 "bugdir {} wasn't added to {}".format(
                     new.uuid, sorted(bugdirs.keys())))
 
-        # save new information
-        storage.writeable = writeable
-        for item in dirty_items:
-            item.save()
-
     def _read_xml(self, storage, params):
         if params['xml-file'] == '-':
             return self.stdin.read().encode(self.stdin.encoding)
@@ -174,42 +211,175 @@ class Import_XML (libbe.command.Command):
             self._check_restricted_access(storage, params['xml-file'])
             return libbe.util.encoding.get_file_contents(params['xml-file'])
 
+    def _open_xml(self, storage, params):
+        """Like :py:meth:`_read_xml`, but return a file-like object
+        for reading the encoded XML a chunk at a time.
+        """
+        if params['xml-file'] == '-':
+            return _EncodedReader(self.stdin, self.stdin.encoding)
+        else:
+            self._check_restricted_access(storage, params['xml-file'])
+            return open(params['xml-file'], 'rb')
+
     def _parse_xml(self, xml, params):
         version = {}
-        root_bugdirs = []
-        root_bugs = []
-        root_comments = []
+        roots = {'bugdir':[], 'bug':[], 'comment':[]}
         be_xml = ElementTree.XML(xml)
         if be_xml.tag != 'be-xml':
             raise libbe.util.utility.InvalidXML(
                 'import-xml', be_xml, 'root element must be <be-xml>')
         for child in be_xml.getchildren():
-            if child.tag == 'bugdir':
-                new = libbe.bugdir.BugDir(storage=None)
-                new.from_xml(child, preserve_uuids=params['preserve-uuids'])
-                root_bugdirs.append(new)
-            elif child.tag == 'bug':
-                new = libbe.bug.Bug()
-                new.from_xml(child, preserve_uuids=params['preserve-uuids'])
-                root_bugs.append(new)
-            elif child.tag == 'comment':
-                new = libbe.comment.Comment()
-                new.from_xml(child, preserve_uuids=params['preserve-uuids'])
-                root_comments.append(new)
-            elif child.tag == 'version':
-                for gchild in child.getchildren():
-                    if child.tag in ['tag', 'nick', 'revision', 'revision-id']:
-                        text = xml.sax.saxutils.unescape(child.text)
-                        text = text.decode('unicode_escape').strip()
-                        version[child.tag] = text
-                    else:
-                        libbe.LOG.warning(
-                            'ignoring unknown tag {0} in {1}\n'.format(
-                                gchild.tag, child.tag))
+            new = self._parse_child(be_xml, child, version, params)
+            if new is not None:
+                roots[child.tag].append(new)
+        return (version, roots['bugdir'], roots['bug'], roots['comment'])
+
+    def _iter_xml(self, stream):
+        """Iterate through the children of a streamed <be-xml> element.
+
+        Each child is yielded as soon as its end tag has been parsed,
+        and cleared once the caller is done with it, so only one
+        top-level element is held in memory at a time.
+        """
+        depth = 0
+        be_xml = None
+        for event,element in ElementTree.iterparse(
+                stream, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    be_xml = element
+                    if be_xml.tag != 'be-xml':
+                        raise libbe.util.utility.InvalidXML(
+                            'import-xml', be_xml,
+                            'root element must be <be-xml>')
             else:
-                libbe.LOG.warning('ignoring unknown tag {0} in {1}\n'.format(
-                        child.tag, be_xml.tag))
-        return (version, root_bugdirs, root_bugs, root_comments)
+                depth -= 1
+                if depth == 1:
+                    yield (be_xml, element)
+                    be_xml.clear()
+
+    def _parse_child(self, be_xml, child, version, params):
+        """Return a new bugdir, bug, or comment for a <be-xml> child.
+
+        <version> contents are stored in `version`, and ``None`` is
+        returned for them (and for unknown tags).
+        """
+        if child.tag == 'bugdir':
+            new = libbe.bugdir.BugDir(storage=None)
+            new.from_xml(child, preserve_uuids=params['preserve-uuids'])
+            return new
+        elif child.tag == 'bug':
+            new = libbe.bug.Bug()
+            new.from_xml(child, preserve_uuids=params['preserve-uuids'])
+            return new
+        elif child.tag == 'comment':
+            new = libbe.comment.Comment()
+            new.from_xml(child, preserve_uuids=params['preserve-uuids'])
+            return new
+        elif child.tag == 'version':
+            for gchild in child.getchildren():
+                if child.tag in ['tag', 'nick', 'revision', 'revision-id']:
+                    text = xml.sax.saxutils.unescape(child.text)
+                    text = text.decode('unicode_escape').strip()
+                    version[child.tag] = text
+                else:
+                    libbe.LOG.warning(
+                        'ignoring unknown tag {0} in {1}\n'.format(
+                            gchild.tag, child.tag))
+        else:
+            libbe.LOG.warning('ignoring unknown tag {0} in {1}\n'.format(
+                    child.tag, be_xml.tag))
+        return None
+
+    def _stream_xml(self, storage, writeable, bugdirs,
+                    root_bugdir, root_bug, root_comment,
+                    params, accept_changes, accept_extra_strings):
+        """Merge each top-level element as soon as it has been read.
+
+        Merged items are saved every :py:data:`STREAM_BATCH` elements,
+        and saved bugs are then unloaded again, so memory use is
+        bounded by the largest element (and the root bug's comments,
+        if comments are being imported).
+        """
+        version = {}
+        counts = {'bugdir':0, 'bug':0, 'comment':0}
+        batch = {'comments':[], 'dirty':[], 'size':0}
+        stream = self._open_xml(storage, params)
+        try:
+            for be_xml,child in self._iter_xml(stream):
+                new = self._parse_child(be_xml, child, version, params)
+                if new is None:
+                    continue
+                if child.tag == 'comment':
+                    batch['comments'].append(new)
+                elif child.tag == 'bug':
+                    batch['dirty'].extend(self._merge_bugs(
+                            bugdirs, root_bugdir, [new],
+                            params, accept_changes, accept_extra_strings))
+                    self._check_bugs(bugdirs, root_bugdir, [new])
+                else:
+                    batch['dirty'].extend(self._merge_bugdirs(
+                            bugdirs, [new],
+                            params, accept_changes, accept_extra_strings))
+                    self._check_bugdirs(bugdirs, [new])
+                counts[child.tag] += 1
+                batch['size'] += 1
+                if batch['size'] >= STREAM_BATCH:
+                    self._save_batch(
+                        storage, writeable, bugdirs, root_bug, root_comment,
+                        batch, params, accept_changes, accept_extra_strings)
+                    self._print_progress(counts)
+        finally:
+            stream.close()
+        if batch['size'] > 0:
+            self._save_batch(
+                storage, writeable, bugdirs, root_bug, root_comment,
+                batch, params, accept_changes, accept_extra_strings)
+            self._print_progress(counts)
+
+    def _save_batch(self, storage, writeable, bugdirs, root_bug, root_comment,
+                    batch, params, accept_changes, accept_extra_strings):
+        comments = batch['comments']
+        dirty_items = batch['dirty']
+        if len(comments) > 0:
+            list(self._merge_comments(
+                    bugdirs, root_bug, root_comment, comments,
+                    params, accept_changes, accept_extra_strings))
+            self._check_comments(root_bug, root_comment, comments)
+            # only save the new (or changed) comments, not the whole bug
+            comms = root_bug.comment_root.comment_index()
+            for new in comments:
+                if new.uuid in comms:
+                    comment = comms.lookup(new.uuid)
+                else:
+                    comment = comms.lookup(new.alt_id)
+                comment.bug = root_bug
+                comment.storage = root_bug.storage
+                dirty_items.append(comment)
+        storage.writeable = writeable
+        storage.begin_batch()
+        try:
+            for item in dirty_items:
+                item.save()
+        finally:
+            storage.end_batch()
+            storage.writeable = False
+        for item in dirty_items:
+            if isinstance(item, libbe.bug.Bug) and item is not root_bug:
+                item.bugdir.unload_bug(item)
+        batch['comments'] = []
+        batch['dirty'] = []
+        batch['size'] = 0
+
+    def _print_progress(self, counts):
+        parts = []
+        for tag in ['bugdir', 'bug', 'comment']:
+            if counts[tag] == 1:
+                parts.append('1 %s' % tag)
+            elif counts[tag] > 1:
+                parts.append('%d %ss' % (counts[tag], tag))
+        print >> self.stdout, 'Imported %s' % ' and '.join(parts)
 
     def _merge_comments(self, bugdirs, bug, root_comment, comments,
                         params, accept_changes, accept_extra_strings,
@@ -250,13 +420,17 @@ class Import_XML (libbe.command.Command):
     def _merge_bugs(self, bugdirs, bugdir, bugs,
                     params, accept_changes, accept_extra_strings,
                     accept_comments=True):
+        if len(bugs) > 0 and bugdir is None:
+            raise libbe.command.UserError(
+                'No root bugdir for merging bugs:\n{}'.format(
+                    '\n\n'.join([b.string() for b in bugs])))
+        index = libbe.util.id.id_index(bugdirs)
         for new in bugs:
-            try:
-                old = bugdir.bug_from_uuid(new.alt_id)
-            except KeyError:
+            if new.alt_id == None or not index.has_bug(bugdir, new.alt_id):
                 bugdir.append(new, update=True)
                 yield new
             else:
+                old = bugdir.bug_from_uuid(new.alt_id)
                 old.load_comments(load_full=True)
                 old.merge(new, accept_changes=accept_changes,
                           accept_extra_strings=accept_extra_strings,
@@ -320,6 +494,14 @@ Bug.xml(), and Comment.xml().  Take a look at the output of `be show
 Missing tags are left at the default value.  The version tag is not
 required, but is strongly recommended.
 
+With --stream, the XML file is parsed incrementally, and each
+top-level <bug> or <comment> is merged as soon as it has been read.
+Merged bugs and comments are saved in batches, with a progress report
+after each batch, so very large files can be imported without holding
+them in memory.  An error part way through the file leaves the
+earlier batches imported.  A top-level <bugdir> is still read in full
+before it is merged.
+
 The bugdir, bug, and comment UUIDs are always auto-generated, so if
 you set a <uuid> field, but no <alt-id> field, your <uuid> will be
 used as the object's <alt-id>.  An exception is raised if <alt-id>
@@ -400,11 +582,25 @@ Devs recieve email, and save it's contents as demux-bug.xml:
 
 Import_xml = Import_XML # alias for libbe.command.base.get_command_class()
 
+
+class _EncodedReader (object):
+    """Read encoded bytes from a decoding `stream` (e.g. stdin)."""
+    def __init__(self, stream, encoding):
+        self.stream = stream
+        self.encoding = encoding
+
+    def read(self, size=-1):
+        return self.stream.read(size).encode(self.encoding)
+
+    def close(self):
+        pass
+
 if libbe.TESTING == True:
     class LonghelpTestCase (unittest.TestCase):
         """
         Test import scenarios given in longhelp.
         """
+        stream = False
         def setUp(self):
             self.bugdir = libbe.bugdir.SimpleBugDir(memory=False)
             io = libbe.command.StringInputOutput()
@@ -469,6 +665,9 @@ if libbe.TESTING == True:
             self.bugdir.cleanup()
             self.ui.cleanup()
         def _execute(self, xml, params={}, args=[]):
+            if self.stream == True:
+                params = dict(params)
+                params['stream'] = True
             self.ui.io.set_stdin(xml)
             self.ui.run(self.cmd, params, args)
             self.bugdir.flush_reload()
@@ -616,5 +815,11 @@ if libbe.TESTING == True:
             self.failUnless(c4.author == 'Jed', c4.author)
             self.failUnless(c4.body == 'And thanks\n', c4.body)
 
+    class StreamLonghelpTestCase (LonghelpTestCase):
+        """
+        Test import scenarios given in longhelp with --stream.
+        """
+        stream = True
+
     unitsuite =unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
     suite = unittest.TestSuite([unitsuite, doctest.DocTestSuite()])
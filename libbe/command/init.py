@@ -24,6 +24,7 @@ import libbe
 import libbe.bugdir
 import libbe.command
 import libbe.storage
+import libbe.storage.util.mapfile
 
 class Init (libbe.command.Command):
     """Create an on-disk bug repository
@@ -53,6 +54,22 @@ class Init (libbe.command.Command):
     >>> vcs.disconnect()
     >>> vcs.connect()
     >>> bugdir = libbe.bugdir.BugDir(vcs, from_storage=True)
+    >>> vcs.mapfile_context
+    >>> vcs.disconnect()
+    >>> vcs.destroy()
+    >>> dir.cleanup()
+
+    >>> dir = libbe.util.utility.Dir()
+    >>> vcs = libbe.storage.vcs.vcs_by_name('None')
+    >>> vcs.repo = dir.path
+    >>> ui.storage_callbacks.set_unconnected_storage(vcs)
+    >>> ui.run(cmd, {'merge-friendly':True})
+    No revision control detected.
+    BE repository initialized.
+    >>> vcs.disconnect()
+    >>> vcs.connect()
+    >>> vcs.mapfile_context
+    6
     >>> vcs.disconnect()
     >>> vcs.destroy()
     >>> dir.cleanup()
@@ -81,6 +98,11 @@ class Init (libbe.command.Command):
 
     def __init__(self, *args, **kwargs):
         libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='merge-friendly',
+                    help='Pad settings files with blank lines, so '
+                    'concurrent changes merge cleanly'),
+                ])
 
     def _run(self, **params):
         storage = self._get_unconnected_storage()
@@ -95,6 +117,9 @@ class Init (libbe.command.Command):
             pass
         storage.init()
         storage.connect()
+        if params['merge-friendly'] == True:
+            storage.set_mapfile_context(
+                libbe.storage.util.mapfile.MERGE_CONTEXT)
         self.ui.storage_callbacks.set_storage(storage)
         bd = libbe.bugdir.BugDir(storage, from_storage=False)
         self.ui.storage_callbacks.set_bugdirs({bd.uuid: bd})
@@ -111,6 +136,11 @@ This command initializes Bugs Everywhere support for the specified directory
 and all its subdirectories.  It will auto-detect any supported revision control
 system.  You can use "be set vcs_name" to change the vcs being used.
 
+Settings files are compact, one line each, unless you use
+--merge-friendly.  That pads each setting with blank lines, which
+takes more space but lets your VCS merge concurrent changes to
+different settings of the same bug or comment.
+
 The directory defaults to your current working directory, but you can
 change that by passing the --repo option to be
   $ be --repo path/to/new/bug/root init
@@ -20,6 +20,7 @@
 # You should have received a copy of the GNU General Public License along with
 # Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
 
+import heapq
 import itertools
 import os
 import re
@@ -56,6 +57,21 @@ class List (libbe.command.Command):
     >>> ret = ui.run(cmd, {'status':'all', 'sort':'time'})
     abc/a:om: Bug A
     abc/b:cm: Bug B
+    >>> ret = ui.run(cmd, {'status':'all', 'limit':1})
+    abc/a:om: Bug A
+    >>> [bug.uuid for bug in cmd.result]
+    ['a']
+    >>> ret = ui.run(cmd, {'status':'all', 'offset':1})
+    abc/b:cm: Bug B
+    >>> ret = ui.run(cmd, {'status':'all', 'stream':True, 'limit':1})
+    abc/a:om: Bug A
+    >>> [bug.uuid for bug in cmd.result]
+    ['a']
+    >>> ret = ui.run(libbe.command.tag.Tag(ui=ui), args=['/b', 'later'])
+    Tags for abc/b:
+    later
+    >>> ret = ui.run(cmd, {'status':'all', 'tagged':'!later'})
+    abc/a:om: Bug A
     >>> bd.storage.writeable
     True
     >>> ui.cleanup()
@@ -92,6 +108,11 @@ class List (libbe.command.Command):
                     arg=libbe.command.Argument(
                         name='extra-strings', metavar='STRINGS', default=None,
                         completion_callback=libbe.command.util.complete_extra_strings)),
+                libbe.command.Option(name='tagged',
+                    help='Only show bugs whose tags match QUERY, e.g. '
+                         '--tagged "GUI & !later"',
+                    arg=libbe.command.Argument(
+                        name='tagged', metavar='QUERY', default=None)),
                 libbe.command.Option(name='sort', short_name='S',
                     help='Adjust bug-sort criteria with comma-separated list '
                          'SORT.  e.g. "--sort creator,time".  '
@@ -99,6 +120,17 @@ class List (libbe.command.Command):
                     arg=libbe.command.Argument(
                         name='sort', metavar='SORT', default=None,
                         completion_callback=libbe.command.util.Completer(AVAILABLE_CMPS))),
+                libbe.command.Option(name='limit', short_name='l',
+                    help='Only show the first LIMIT matching bugs',
+                    arg=libbe.command.Argument(
+                        name='limit', metavar='LIMIT', type='int')),
+                libbe.command.Option(name='offset',
+                    help='Skip the first OFFSET matching bugs',
+                    arg=libbe.command.Argument(
+                        name='offset', metavar='OFFSET', default=0,
+                        type='int')),
+                libbe.command.Option(name='stream',
+                    help='Print bugs as they are loaded, without sorting'),
                 libbe.command.Option(name='tags', short_name='t',
                     help='Add TAGS: field to standard listing format.'),
                 libbe.command.Option(name='ids', short_name='i',
@@ -134,26 +166,50 @@ class List (libbe.command.Command):
             self._parse_params(bugdirs, params)
         filter = Filter(status, severity, assigned,
                         extra_strings_regexps=extra_strings_regexps)
-        bugs = list(itertools.chain(*list(
-                    [bugdir.bug_from_uuid(uuid) for uuid in bugdir.uuids()]
-                    for bugdir in bugdirs.values())))
-        bugs = [b for b in bugs if filter(bugdirs, b) == True]
-        self.result = bugs
-        if len(bugs) == 0 and params['xml'] == False:
-            print >> self.stdout, 'No matching bugs found'
-
-        # sort bugs
-        bugs = self._sort_bugs(bugs, cmp_list)
-
-        # print list of bugs
-        if params['ids'] == True:
-            for bug in bugs:
-                print >> self.stdout, bug.id.user()
+        if params['tagged'] == None:
+            tag_query = None
         else:
-            self._list_bugs(bugs, show_tags=params['tags'], xml=params['xml'])
+            tag_query = libbe.command.tag.TagQuery(params['tagged'])
+        bugs = (b for b in self._iter_bugs(bugdirs, tag_query)
+                if filter(bugdirs, b) == True)
+        if params['stream'] == True:
+            # print bugs as they are loaded
+            bugs = itertools.islice(bugs, params['offset'], self._stop(params))
+            self.result = self._list_bugs(
+                bugs, ids=params['ids'], show_tags=params['tags'],
+                xml=params['xml'])
+            if len(self.result) == 0 and params['xml'] == False:
+                print >> self.stdout, 'No matching bugs found'
+        else:
+            bugs = list(bugs)
+            if len(bugs) == 0 and params['xml'] == False:
+                print >> self.stdout, 'No matching bugs found'
+
+            # sort bugs
+            bugs = self._sort_bugs(bugs, cmp_list, offset=params['offset'],
+                                   limit=params['limit'])
+
+            # print list of bugs
+            self.result = self._list_bugs(
+                bugs, ids=params['ids'], show_tags=params['tags'],
+                xml=params['xml'])
         storage.writeable = writeable
         return 0
 
+    def _iter_bugs(self, bugdirs, tag_query=None):
+        for bugdir in bugdirs.values():
+            if tag_query == None:
+                uuids = bugdir.uuids()
+            else:
+                uuids = sorted(tag_query.uuids(bugdir))
+            for uuid in uuids:
+                yield bugdir.bug_from_uuid(uuid)
+
+    def _stop(self, params):
+        if params['limit'] == None:
+            return None
+        return params['offset'] + params['limit']
+
     def _parse_params(self, bugdirs, params):
         cmp_list = []
         if params['sort'] != None:
@@ -178,6 +234,13 @@ class List (libbe.command.Command):
         for i in range(len(assigned)):
             if assigned[i] == '-':
                 assigned[i] = params['user-id']
+        if params['stream'] == True and params['sort'] != None:
+            raise libbe.command.UserError(
+                'Cannot sort (--sort) a streamed (--stream) listing')
+        for name in ['limit', 'offset']:
+            if params[name] != None and params[name] < 0:
+                raise libbe.command.UserError(
+                    'Invalid --%s %d, must be >= 0' % (name, params[name]))
         if params['extra-strings'] == None:
             extra_strings_regexps = []
         else:
@@ -185,35 +248,57 @@ class List (libbe.command.Command):
                                      for x in params['extra-strings'].split(',')]
         return (cmp_list, status, severity, assigned, extra_strings_regexps)
 
-    def _sort_bugs(self, bugs, cmp_list=None):
+    def _sort_bugs(self, bugs, cmp_list=None, offset=0, limit=None):
+        """Sort `bugs`, returning the `limit` bugs after `offset`.
+
+        When `limit` is set, only the top ``offset + limit`` bugs are
+        selected (with a heap) instead of sorting the whole list.
+        """
         if cmp_list is None:
             cmp_list = []
         cmp_list.extend(libbe.bug.DEFAULT_CMP_FULL_CMP_LIST)
         cmp_fn = libbe.bug.BugCompoundComparator(cmp_list=cmp_list)
-        bugs.sort(cmp_fn)
-        return bugs
+        if limit == None:
+            bugs.sort(key=cmp_fn.key)
+        else:
+            bugs = heapq.nsmallest(offset + limit, bugs, key=cmp_fn.key)
+        return bugs[offset:]
 
-    def _list_bugs(self, bugs, show_tags=False, xml=False):
+    def _list_bugs(self, bugs, ids=False, show_tags=False, xml=False):
+        """Print `bugs`, returning a list of the printed bugs.
+
+        `bugs` may be any iterable, and each bug is printed as soon as
+        it is generated.
+        """
+        listed = []
+        if ids == True:
+            for bug in bugs:
+                print >> self.stdout, bug.id.user()
+                listed.append(bug)
+            return listed
         if xml == True:
             print >> self.stdout, \
                 '<?xml version="1.0" encoding="%s" ?>' % self.stdout.encoding
             print >> self.stdout, '<be-xml>'
-        if len(bugs) > 0:
-            for bug in bugs:
-                if xml == True:
-                    print >> self.stdout, bug.xml(show_comments=True)
-                else:
-                    bug_string = bug.string(shortlist=True)
-                    if show_tags == True:
-                        attrs,summary = bug_string.split(' ', 1)
-                        bug_string = (
-                            '%s%s: %s'
-                            % (attrs,
-                               ','.join(libbe.command.tag.get_tags(bug)),
-                               summary))
-                    print >> self.stdout, bug_string
+        for bug in bugs:
+            if xml == True:
+                for chunk in bug.xml_chunks(show_comments=True):
+                    self.stdout.write(chunk)
+                self.stdout.write('\n')
+            else:
+                bug_string = bug.string(shortlist=True)
+                if show_tags == True:
+                    attrs,summary = bug_string.split(' ', 1)
+                    bug_string = (
+                        '%s%s: %s'
+                        % (attrs,
+                           ','.join(libbe.command.tag.get_tags(bug)),
+                           summary))
+                print >> self.stdout, bug_string
+            listed.append(bug)
         if xml == True:
             print >> self.stdout, '</be-xml>'
+        return listed
 
     def _long_help(self):
         return """
@@ -232,6 +317,7 @@ There are several criteria that you can filter by:
   * status
   * severity
   * assigned (who the bug is assigned to)
+  * tags (with --tagged, which takes a boolean QUERY like 'a & !b')
 Allowed values for each criterion may be given in a comma seperated
 list.  The special string "all" may be used with any of these options
 to match all values of the criterion.  As with the --status and
@@ -0,0 +1,100 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+import libbe
+import libbe.command
+import libbe.command.util
+import libbe.history
+
+
+class Log (libbe.command.Command):
+    """Show how a bug changed over time
+
+    >>> import sys
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False, versioned=True)
+    >>> io = libbe.command.StringInputOutput()
+    >>> io.stdout = sys.stdout
+    >>> ui = libbe.command.UserInterface(io=io)
+    >>> ui.storage_callbacks.set_storage(bd.storage)
+    >>> cmd = Log(ui=ui)
+
+    >>> revision = bd.storage.commit('Initial state')
+    >>> bug = bd.bug_from_uuid('b')
+    >>> bug.status = 'open'
+    >>> revision = bd.storage.commit('Reopen bug b')
+    >>> ret = ui.run(cmd, args=['/b'])
+    1 Initial state
+      created bug
+      creator: None -> Jane Doe <jdoe@example.com>
+      severity: None -> minor
+      status: None -> closed
+      summary: None -> Bug B
+      time: None -> Thu, 01 Jan 1970 00:00:00 +0000
+    2 Reopen bug b
+      status: closed -> open
+    >>> bd.storage.versioned = False
+    >>> ret = ui.run(cmd, args=['/b'])
+    Traceback (most recent call last):
+      ...
+    UserError: This repository is not revision-controlled.
+    >>> ui.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'log'
+
+    def __init__(self, *args, **kwargs):
+        libbe.command.Command.__init__(self, *args, **kwargs)
+        self.args.extend([
+                libbe.command.Argument(
+                    name='bug-id', metavar='BUG-ID',
+                    completion_callback=libbe.command.util.complete_bug_id),
+                ])
+
+    def _run(self, **params):
+        storage = self._get_storage()
+        if storage.versioned == False:
+            raise libbe.command.UserError(
+                'This repository is not revision-controlled.')
+        bugdirs = self._get_bugdirs()
+        bugdir,bug,comment = (
+            libbe.command.util.bugdir_bug_comment_from_user_id(
+                bugdirs, params['bug-id']))
+        history = libbe.history.BugHistory(storage, bug.uuid)
+        try:
+            history.update()
+        except NotImplementedError:
+            raise libbe.command.UserError(
+                'Bug histories are not supported by %s storage.'
+                % storage.name)
+        for revision,summary,changes in history.timeline():
+            print >> self.stdout, u'%s %s' % (revision, summary)
+            for change in changes:
+                print >> self.stdout, u'  %s' % change
+        return 0
+
+    def _long_help(self):
+        return """
+Print the committed history of a bug, oldest first: each revision that
+changed the bug, followed by the settings it changed (e.g. "status:
+open -> closed") and the comments it added, changed, or removed.
+Uncommitted changes are not shown; see "be diff" for those.
+
+The history is read in a single pass over the revisions that touched
+the bug's files, and cached, so later runs only read the revisions
+committed since.
+"""
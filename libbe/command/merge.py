@@ -17,10 +17,8 @@
 # You should have received a copy of the GNU General Public License along with
 # Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
 
-import copy
-import os
-
 import libbe
+import libbe.comment
 import libbe.command
 import libbe.command.util
 
@@ -160,28 +158,24 @@ class Merge (libbe.command.Command):
         bugdirs = self._get_bugdirs()
         bugdirA,bugA,comment = (
             libbe.command.util.bugdir_bug_comment_from_user_id(
-                bugdirs, params['bug-id']))
-        bugA.load_comments()
+                bugdirs, params['bug-id'], comment_root=False))
         bugdirB,bugB,dummy_comment = (
             libbe.command.util.bugdir_bug_comment_from_user_id(
-                bugdirs, params['bug-id-to-merge']))
-        bugB.load_comments()
-        mergeA = bugA.new_comment('Merged from bug #%s#' % bugB.id.long_user())
-        newCommTree = copy.deepcopy(bugB.comment_root)
-        for comment in newCommTree.traverse(): # all descendant comments
-            comment.bug = bugA
-            # uuids must be unique in storage
-            if comment.alt_id == None:
-                comment.storage = None
-                comment.alt_id = comment.uuid
-                comment.storage = storage
-            comment.uuid = libbe.util.id.uuid_gen()
-            comment.save() # force onto disk under bugA
-
-        for comment in newCommTree: # just the child comments
-            mergeA.add_reply(comment, allow_time_inversion=True)
-        bugB.new_comment('Merged into bug #%s#' % bugA.id.long_user())
-        bugB.status = 'closed'
+                bugdirs, params['bug-id-to-merge'], comment_root=False))
+        # Work on the stored comments directly, so neither comment
+        # tree has to be loaded.  New comments save themselves.
+        storage.begin_batch()
+        try:
+            mergeA = libbe.comment.Comment(
+                bugA, body='Merged from bug #%s#' % bugB.id.long_user())
+            libbe.comment.copy_comments(
+                storage, bugB.id.storage(), bugA.id.storage(),
+                in_reply_to=mergeA.uuid)
+            libbe.comment.Comment(
+                bugB, body='Merged into bug #%s#' % bugA.id.long_user())
+            bugB.status = 'closed'
+        finally:
+            storage.end_batch()
         print >> self.stdout, 'Merged bugs #%s# and #%s#' \
             % (bugA.id.user(), bugB.id.user())
         return 0
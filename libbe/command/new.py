@@ -23,8 +23,10 @@
 import libbe
 import libbe.command
 import libbe.command.util
+import libbe.duplicates
 
 from .assign import parse_assigned as _parse_assigned
+from .duplicates import update_index as _update_duplicates_index
 
 
 class New (libbe.command.Command):
@@ -48,6 +50,12 @@ class New (libbe.command.Command):
     >>> options = {'assigned': 'none'}
     >>> ret = ui.run(cmd, options=options, args=['this is a test',])
     Created bug with ID abc/X
+    >>> libbe.util.id.uuid_gen = lambda: 'Y'
+    >>> options = {'assigned': 'none', 'check-duplicates': True}
+    >>> ret = ui.run(cmd, options=options, args=['Bug A'])
+    Created bug with ID abc/Y
+    Possible duplicates:
+      1.00 abc/a:om: Bug A
     >>> libbe.util.id.uuid_gen = uuid_gen
     >>> bd.flush_reload()
     >>> bug = bd.bug_from_uuid('X')
@@ -104,7 +112,9 @@ class New (libbe.command.Command):
                         name='bugdir', metavar='ID', default=None,
                         completion_callback=libbe.command.util.complete_bugdir_id)),
                 libbe.command.Option(name='full-uuid', short_name='f',
-                    help='Print the full UUID for the new bug')
+                    help='Print the full UUID for the new bug'),
+                libbe.command.Option(name='check-duplicates',
+                    help='List existing bugs that the new bug may duplicate'),
                 ])
         self.args.extend([
                 libbe.command.Argument(name='summary', metavar='SUMMARY')
@@ -147,11 +157,29 @@ class New (libbe.command.Command):
         else:
             bug_id = bug.id.user()
         self.stdout.write('Created bug with ID %s\n' % (bug_id))
+        if params['check-duplicates']:
+            self._check_duplicates(bugdirs, storage, bugdir, bug)
         return 0
 
+    def _check_duplicates(self, bugdirs, storage, bugdir, bug):
+        index = _update_duplicates_index(bugdirs, storage)
+        similar = index.similar(
+            libbe.duplicates.bug_signatures(bug),
+            exclude=['%s/%s' % (bugdir.uuid, bug.uuid)])
+        if len(similar) > 0:
+            self.stdout.write('Possible duplicates:\n')
+        for s,key in similar:
+            bugdir_uuid,bug_uuid = key.split('/', 1)
+            other = bugdirs[bugdir_uuid].bug_from_uuid(bug_uuid)
+            self.stdout.write(
+                '  %.2f %s\n' % (s, other.string(shortlist=True)))
+
     def _long_help(self):
         return """
 Create a new bug, with a new ID.  The summary specified on the
 commandline is a string (only one line) that describes the bug briefly
 or "-", in which case the string will be read from stdin.
+
+With --check-duplicates, existing bugs with similar summaries are
+listed after the new bug is created (see "be help duplicates").
 """
@@ -0,0 +1,118 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+import libbe
+import libbe.command
+import libbe.search
+
+
+class Search (libbe.command.Command):
+    """Search bug summaries and comments
+
+    >>> import sys
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> io = libbe.command.StringInputOutput()
+    >>> io.stdout = sys.stdout
+    >>> ui = libbe.command.UserInterface(io=io)
+    >>> ui.storage_callbacks.set_storage(bd.storage)
+    >>> cmd = Search(ui=ui)
+
+    >>> ret = ui.run(cmd, args=['bug'])
+    abc/a:om: Bug A
+    abc/b:cm: Bug B
+    >>> ret = ui.run(cmd, args=['"bug', 'b"'])
+    abc/b:cm: Bug B
+    >>> ret = ui.run(cmd, {'ids':True, 'limit':1}, ['bug'])
+    abc/a
+    >>> ret = ui.run(cmd, args=['missing'])
+    >>> ret = ui.run(cmd, args=['""'])
+    Traceback (most recent call last):
+      ...
+    UserError: Empty search query.
+    >>> ui.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'search'
+
+    def __init__(self, *args, **kwargs):
+        libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='ids', short_name='i',
+                    help='Only print the ids of matching bugs and comments'),
+                libbe.command.Option(name='limit', short_name='l',
+                    help='Only print the first LIMIT results',
+                    arg=libbe.command.Argument(
+                        name='limit', metavar='LIMIT', type='int')),
+                libbe.command.Option(name='rebuild',
+                    help='Rebuild the search index from scratch'),
+                ])
+        self.args.extend([
+                libbe.command.Argument(
+                    name='query', metavar='QUERY', repeatable=True),
+                ])
+
+    def _run(self, **params):
+        bugdirs = self._get_bugdirs()
+        query = ' '.join(params['query'])
+        if len(libbe.search.parse_query(query)) == 0:
+            raise libbe.command.UserError('Empty search query.')
+        if params['limit'] != None and params['limit'] < 0:
+            raise libbe.command.UserError(
+                'Invalid limit %d' % params['limit'])
+        index = libbe.search.SearchIndex(bugdirs, self._get_storage())
+        try:
+            index.update(rebuild=params['rebuild'])
+        except (IOError, OSError), e:
+            libbe.LOG.warning('could not save search index: %s' % e)
+        count = 0
+        seen = set()
+        for score,id in index.search(query):
+            if params['limit'] != None and count >= params['limit']:
+                break
+            fields = id.split('/')
+            bugdir = bugdirs[fields[0]]
+            bug = bugdir.bug_from_uuid(fields[1])
+            if params['ids'] == True:
+                if len(fields) > 2:
+                    entity = bug.comment_from_uuid(fields[2])
+                else:
+                    entity = bug
+                print >> self.stdout, entity.id.user()
+            elif bug.uuid in seen:
+                continue
+            else:
+                seen.add(bug.uuid)
+                print >> self.stdout, bug.string(shortlist=True)
+            count += 1
+        return 0
+
+    def _long_help(self):
+        return """
+Search bug summaries, comment authors and comment bodies.  Matching
+bugs are listed best match first.  With --ids, the ids of the
+matching bugs and comments are listed instead.
+
+QUERY is a list of words, all of which must match.  Matching ignores
+case.  A word ending in "*" matches any word with that prefix (e.g.
+"crash*"), and quoted words must appear together as a phrase (e.g.
+'"xml export"').
+
+On version-controlled repositories the index is stored in
+.be/index/search and updated from the changes since the last search.
+Use --rebuild if it ever gets out of sync.
+"""
@@ -76,6 +76,9 @@ class ServerApp (libbe.util.wsgi.WSGI_AppObject,
             **kwargs)
         self.storage = storage
         self.ui = libbe.command.base.UserInterface()
+        if storage != None:
+            # run commands against our storage, not the current directory
+            self.ui.storage_callbacks.set_storage(storage)
         self.notify = notify
 
     # handlers
@@ -226,7 +226,9 @@ class ServerApp (libbe.util.wsgi.WSGI_AppObject,
         source = 'query'
         revision = self.data_get_string(
             data, 'revision', default=None, source=source)
-        add,mod,rem = self.storage.changed(revision)
+        to_revision = self.data_get_string(
+            data, 'to_revision', default=None, source=source)
+        add,mod,rem = self.storage.changed(revision, to_revision)
         content = '\n\n'.join(['\n'.join(p) for p in (add,mod,rem)])
         return self.ok_response(environ, start_response, content)
 
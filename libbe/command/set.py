@@ -27,6 +27,7 @@ import libbe
 import libbe.bugdir
 import libbe.command
 import libbe.command.util
+import libbe.storage.util.mapfile as mapfile
 from libbe.storage.util.settings_object import EMPTY
 
 
@@ -50,6 +51,19 @@ class Set (libbe.command.Command):
     >>> ret = ui.run(cmd, args=['target', 'none'])
     >>> ret = ui.run(cmd, args=['target'])
     None
+
+    Existing repositories can switch between compact and
+    merge-friendly settings files.
+
+    >>> ret = ui.run(cmd, {'merge-friendly':True})
+    >>> bd.storage.mapfile_context
+    6
+    >>> print bd.storage.get('a/values').count('\\n')
+    43
+    >>> ret = ui.run(cmd, {'compact':True})
+    >>> bd.storage.mapfile_context
+    >>> print bd.storage.get('a/values'),
+    {"creator":"John Doe <jdoe@example.com>","severity":"minor","status":"open","summary":"Bug A","time":"Thu, 01 Jan 1970 00:00:00 +0000"}
     >>> ui.cleanup()
     >>> bd.cleanup()
     """
@@ -65,6 +79,11 @@ class Set (libbe.command.Command):
                     arg=libbe.command.Argument(
                         name='bugdir', metavar='ID', default=None,
                         completion_callback=libbe.command.util.complete_bugdir_id)),
+                libbe.command.Option(name='merge-friendly',
+                    help='Pad settings files with blank lines, so '
+                    'concurrent changes merge cleanly'),
+                libbe.command.Option(name='compact',
+                    help='Save settings files on a single line each'),
                 ])
         self.args.extend([
                 libbe.command.Argument(
@@ -75,6 +94,16 @@ class Set (libbe.command.Command):
                 ])
 
     def _run(self, **params):
+        if params['merge-friendly'] == True and params['compact'] == True:
+            raise libbe.command.UserError(
+                'Cannot use both --merge-friendly and --compact')
+        if params['merge-friendly'] == True:
+            set_mapfile_context(self._get_storage(), mapfile.MERGE_CONTEXT)
+        elif params['compact'] == True:
+            set_mapfile_context(self._get_storage(), None)
+        if params['setting'] == None and (
+            params['merge-friendly'] == True or params['compact'] == True):
+            return 0
         bugdirs = self._get_bugdirs()
         if params['bugdir']:
             bugdir = bugdirs[params['bugdir']]
@@ -115,6 +144,12 @@ If no arguments are provided, all names and values are listed.
 
 To unset a setting, set it to "none".
 
+Settings files are compact, one line each, unless the repository was
+created with "be init --merge-friendly".  You can switch an existing
+repository with --merge-friendly or --compact, which rewrites every
+settings file in the new format.
+
+
 Allowed settings are:
 
 %s
@@ -192,6 +227,26 @@ def get_bugdir_settings():
         documented_settings.append('%s\n%s' % (s, '\n'.join(doc)))
     return documented_settings
 
+def set_mapfile_context(storage, context):
+    """Save the mapfile `context` for `storage` and rewrite every
+    settings file (bugdir ``settings`` and bug or comment ``values``)
+    to match.
+    """
+    storage.set_mapfile_context(context)
+    storage.begin_batch()
+    try:
+        _rewrite_mapfiles(storage, None, context)
+    finally:
+        storage.end_batch()
+
+def _rewrite_mapfiles(storage, parent, context):
+    for id in storage.children(parent):
+        if id.rsplit('/', 1)[-1] in ['settings', 'values']:
+            data = mapfile.parse(storage.get(id))
+            storage.set(id, mapfile.generate(data, context=context))
+        else:
+            _rewrite_mapfiles(storage, id, context)
+
 def _value_string(bugdir, setting):
     val = bugdir.settings.get(setting, EMPTY)
     if val == EMPTY:
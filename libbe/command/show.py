@@ -112,10 +112,12 @@ class Show (libbe.command.Command):
                     % params['id'][0])
             sys.__stdout__.write(comment.body)
             return 0
-        print >> self.stdout, \
-            output(bugdirs, params['id'], encoding=self.stdout.encoding,
-                   as_xml=params['xml'],
-                   with_comments=not params['no-comments'])
+        for chunk in iter_output(
+                bugdirs, params['id'], encoding=self.stdout.encoding,
+                as_xml=params['xml'],
+                with_comments=not params['no-comments']):
+            self.stdout.write(chunk)
+        self.stdout.write('\n')
         return 0
 
     def _long_help(self):
@@ -167,44 +169,112 @@ def _xml_footer():
     return ['</be-xml>']
 
 def output(bugdirs, ids, encoding, as_xml=True, with_comments=True):
+    return ''.join(iter_output(bugdirs, ids, encoding, as_xml=as_xml,
+                               with_comments=with_comments))
+
+def iter_output(bugdirs, ids, encoding, as_xml=True, with_comments=True):
+    """Generate :py:func:`output` a bug (or comment) at a time.
+
+    The chunks can be written out as they come (or returned as a WSGI
+    response body), so the whole output is never held in memory.
+    When `ids` is empty, each bug is dropped from its bugdir again
+    once it has been written (unless it was already loaded).
+
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> bugdirs = {bd.uuid: bd}
+    >>> chunks = list(iter_output(bugdirs, [], 'utf-8'))
+    >>> ''.join(chunks) == output(bugdirs, [], 'utf-8')
+    True
+    >>> [chunk.strip() for chunk in chunks if 'bug>' in chunk]
+    ... # doctest: +ELLIPSIS
+    ['<bug>...<summary>Bug A</summary>', '</bug>', '<bug>...', '</bug>']
+
+    Showing the whole repository matches listing every loaded bug.
+
+    >>> for i in range(5):
+    ...     bug = bd.new_bug(summary='Bug %d' % i)
+    >>> bugdir = libbe.bugdir.BugDir(bd.storage, from_storage=True)
+    >>> bugdirs = {bugdir.uuid: bugdir}
+    >>> streamed = [output(bugdirs, [], 'utf-8', as_xml=as_xml)
+    ...             for as_xml in [True, False]]
+    >>> len(bugdir)
+    0
+    >>> bugdir.load_all_bugs()
+    >>> ids = [bug.id.user() for bug in bugdir]
+    >>> streamed == [output(bugdirs, ids, 'utf-8', as_xml=as_xml)
+    ...              for as_xml in [True, False]]
+    True
+    >>> bd.cleanup()
+    """
+    for i,lines in enumerate(_output_lines(
+            bugdirs, ids, encoding, as_xml, with_comments)):
+        if i > 0:
+            yield '\n'
+        if isinstance(lines, basestring):
+            yield lines
+        else:
+            for chunk in lines:
+                yield chunk
+
+def _output_lines(bugdirs, ids, encoding, as_xml, with_comments):
+    """Generate the lines of :py:func:`output`.
+
+    Each line is a string or an iterable of chunks (for long,
+    multi-line entries like bug XML).
+    """
     if ids == None or len(ids) == 0:
-        ids = []
+        uuids = []
         for bugdir in bugdirs.values():
-            bugdir.load_all_bugs()
-            ids.extend([bug.id.user() for bug in bugdir])
-    uuids,root_comments = _sort_ids(bugdirs, ids, with_comments)
-    lines = []
+            # same order as bugdir.load_all_bugs(), without loading
+            bug_uuids = sorted(bugdir.uuids(use_cached_disk_uuids=False))
+            loaded = set([bug.uuid for bug in bugdir])
+            uuids.extend([(bugdir, uuid, uuid not in loaded)
+                          for uuid in bug_uuids])
+        root_comments = {}
+        count = len(uuids)
+    else:
+        bugs,root_comments = _sort_ids(bugdirs, ids, with_comments)
+        uuids = [(None, uuid, False) for uuid in bugs]
+        count = len(ids)
     if as_xml:
-        lines.extend(_xml_header(encoding))
+        for line in _xml_header(encoding):
+            yield line
     else:
-        spaces_left = len(ids) - 1
-    for bugname in uuids:
-        bug = libbe.command.util.bug_from_uuid(bugdirs, bugname)
+        spaces_left = count - 1
+    for bugdir,bugname,unload in uuids:
+        if bugdir == None:
+            bug = libbe.command.util.bug_from_uuid(bugdirs, bugname)
+        else:
+            bug = bugdir.bug_from_uuid(bugname)
         if as_xml:
-            lines.append(bug.xml(indent=2, show_comments=with_comments))
+            yield bug.xml_chunks(indent=2, show_comments=with_comments)
         else:
-            lines.append(bug.string(show_comments=with_comments))
+            yield bug.string(show_comments=with_comments)
             if spaces_left > 0:
                 spaces_left -= 1
-                lines.append('') # add a blank line between bugs/comments
+                yield '' # add a blank line between bugs/comments
+        if unload == True:
+            bugdir.unload_bug(bug)
     for bugname,comments in root_comments.items():
         bug = libbe.command.util.bug_from_uuid(bugdirs, bugname)
         if as_xml:
-            lines.extend(['  <bug>', '    <uuid>%s</uuid>' % bug.uuid])
+            yield '  <bug>'
+            yield '    <uuid>%s</uuid>' % bug.uuid
         for commname in comments:
             try:
                 comment = bug.comment_root.comment_from_uuid(commname)
             except KeyError, e:
                 raise libbe.command.UserError(e.message)
             if as_xml:
-                lines.append(comment.xml(indent=4))
+                yield comment.xml(indent=4)
             else:
-                lines.append(comment.string())
+                yield comment.string()
                 if spaces_left > 0:
                     spaces_left -= 1
-                    lines.append('') # add a blank line between bugs/comments
+                    yield '' # add a blank line between bugs/comments
         if as_xml:
-            lines.append('</bug>')
+            yield '</bug>'
     if as_xml:
-        lines.extend(_xml_footer())
-    return '\n'.join(lines)
+        for line in _xml_footer():
+            yield line
@@ -0,0 +1,208 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+import libbe
+import libbe.command
+import libbe.command.util
+import libbe.stats
+from libbe.command.depend import parse_status, parse_severity
+
+
+FORMATS = ['text', 'json']
+
+
+class Stats (libbe.command.Command):
+    """Count bugs by status, severity, assignee, target, ...
+
+    >>> import sys
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> io = libbe.command.StringInputOutput()
+    >>> io.stdout = sys.stdout
+    >>> ui = libbe.command.UserInterface(io=io)
+    >>> ui.storage_callbacks.set_storage(bd.storage)
+    >>> cmd = Stats(ui=ui)
+
+    >>> ret = ui.run(cmd)
+    bugs: 2
+    status:
+      closed  1
+      open    1
+    severity:
+      minor  2
+    assigned:
+      -  2
+    creator:
+      Jane Doe <jdoe@example.com>  1
+      John Doe <jdoe@example.com>  1
+    reporter:
+      -  2
+    target:
+      -  2
+    open bug age:
+      < 1 day      0
+      1-7 days     0
+      1-4 weeks    0
+      1-3 months   0
+      3-12 months  0
+      > 1 year     1
+    >>> ret = ui.run(cmd, {'by':'status,severity'})
+    status  severity  bugs
+    closed  minor     1
+    open    minor     1
+    >>> ret = ui.run(cmd, {'by':'status', 'status':'open',
+    ...                    'format':'json'}) # doctest: +ELLIPSIS
+    {
+      "assigned": [
+        {
+          "assigned": null,
+          "bugs": 1
+        }
+      ],
+      "bugs": 1,
+    ...
+      "groups": [
+        {
+          "bugs": 1,
+          "status": "open"
+        }
+      ],
+    ...
+    }
+    >>> ret = ui.run(cmd, {'by':'colour'})
+    Traceback (most recent call last):
+      ...
+    UserError: Invalid field colour (valid fields: status, severity, assigned, creator, reporter, target)
+    >>> ui.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'stats'
+
+    def __init__(self, *args, **kwargs):
+        libbe.command.Command.__init__(self, *args, **kwargs)
+        self.options.extend([
+                libbe.command.Option(name='by',
+                    help='Count bugs for each combination of these '
+                    'comma-separated fields (%s)'
+                    % ', '.join(libbe.stats.FIELDS),
+                    arg=libbe.command.Argument(
+                        name='by', metavar='FIELDS')),
+                libbe.command.Option(name='status',
+                    help='Only count bugs matching the STATUS specifier',
+                    arg=libbe.command.Argument(
+                        name='status', metavar='STATUS', default='all',
+                        completion_callback=libbe.command.util.complete_status)),
+                libbe.command.Option(name='severity',
+                    help='Only count bugs matching the SEVERITY specifier',
+                    arg=libbe.command.Argument(
+                        name='severity', metavar='SEVERITY', default='all',
+                        completion_callback=libbe.command.util.complete_severity)),
+                libbe.command.Option(name='format', short_name='f',
+                    help='Output format (%s)' % ', '.join(FORMATS),
+                    arg=libbe.command.Argument(
+                        name='format', metavar='FORMAT', default='text',
+                        completion_callback=libbe.command.util.Completer(
+                            FORMATS))),
+                libbe.command.Option(name='rebuild',
+                    help='Rebuild the metadata index from scratch'),
+                ])
+
+    def _run(self, **params):
+        if params['by'] == None:
+            by = []
+        else:
+            by = [field.strip() for field in params['by'].split(',')]
+        for field in by:
+            if field not in libbe.stats.FIELDS:
+                raise libbe.command.UserError(
+                    'Invalid field %s (valid fields: %s)'
+                    % (field, ', '.join(libbe.stats.FIELDS)))
+        if params['format'] not in FORMATS:
+            raise libbe.command.UserError(
+                'Invalid format %s (valid formats: %s)'
+                % (params['format'], ', '.join(FORMATS)))
+        bugdirs = self._get_bugdirs()
+        status = parse_status(params['status'])
+        severity = parse_severity(params['severity'])
+        index = libbe.stats.MetadataIndex(bugdirs, self._get_storage())
+        try:
+            index.update(rebuild=params['rebuild'])
+        except (IOError, OSError), e:
+            libbe.LOG.warning('could not save metadata index: %s' % e)
+        records = [record for record in index.records()
+                   if record['status'] in status
+                   and record['severity'] in severity]
+        stats = libbe.stats.aggregate(records, by=by)
+        if params['format'] == 'json':
+            print >> self.stdout, json.dumps(
+                stats, sort_keys=True, indent=2, separators=(',', ': '))
+        elif len(by) > 0:
+            self._print_table(by + ['bugs'], stats['groups'])
+        else:
+            print >> self.stdout, 'bugs: %d' % stats['bugs']
+            for field in libbe.stats.FIELDS:
+                print >> self.stdout, '%s:' % field
+                self._print_counts(field, stats[field], sort=True)
+            print >> self.stdout, 'open bug age:'
+            self._print_counts('age', stats['open-age'])
+        return 0
+
+    def _value(self, value):
+        if value == None:
+            return '-'
+        return unicode(value)
+
+    def _print_counts(self, field, groups, sort=False):
+        rows = [(self._value(group[field]), group['bugs']) for group in groups]
+        if sort == True:
+            rows.sort()
+        width = max([len(value) for value,count in rows] + [0])
+        for value,count in rows:
+            print >> self.stdout, '  %s  %d' % (value.ljust(width), count)
+
+    def _print_table(self, fields, groups):
+        rows = [fields]
+        for group in groups:
+            rows.append([self._value(group[field]) for field in fields])
+        rows[1:] = sorted(rows[1:])
+        widths = [max([len(row[i]) for row in rows])
+                  for i in range(len(fields))]
+        for row in rows:
+            print >> self.stdout, '  '.join(
+                [value.ljust(width) for value,width
+                 in zip(row, widths)]).rstrip()
+
+    def _long_help(self):
+        return """
+Count bugs in one pass, without loading comments.  By default, bugs
+are counted by each of status, severity, assignee, creator, reporter,
+and target (the target each bug blocks, see "be help target"), along
+with a histogram of how long active bugs have been open.  With --by,
+bugs are counted for each combination of the listed fields instead
+(e.g. "--by status,severity,assigned").
+
+Use --status and --severity to only count some bugs (see "be help
+list"), and "--format json" for machine-readable output, where the
+--by counts are under "groups".
+
+On version-controlled repositories the per-bug metadata is stored in
+.be/index/metadata and updated from the changes since the last run,
+so once it is up to date no bug needs to be loaded at all.  Use
+--rebuild if it ever gets out of sync.
+"""
@@ -22,6 +22,7 @@ import os
 
 import libbe
 import libbe.bug
+import libbe.bugdir
 import libbe.command
 import libbe.diff
 import libbe.command.util
@@ -174,7 +175,6 @@ class Subscribe (libbe.command.Command):
             if params['list-all'] == True:
                 subscriptions = []
                 for bugdir in bugdirs.values():
-                    bugdir.load_all_bugs()
                     subscriptions.extend(
                         get_bugdir_subscribers(bugdir, servers[0]))
             else:
@@ -235,6 +235,72 @@ def _parse_string(string, type_root):
     types = [libbe.diff.type_from_name(name, type_root) for name in types.split(",")]
     return (subscriber,types,servers.split(","))
 
+class _TypeLabels (object):
+    """Precomputed ancestry for a :py:class:`~libbe.diff.SubscriptionType`
+    tree.
+
+    Each type is numbered in depth-first order and labelled with the
+    half-open interval ``[start, stop)`` spanned by its subtree, so
+    ancestry checks are integer comparisons rather than tree walks.
+    Types are keyed by name, which matches
+    :py:meth:`~libbe.diff.SubscriptionType.__cmp__`.
+
+    >>> labels = _type_labels(libbe.diff.BUGDIR_TYPE_ALL)
+    >>> sorted(labels.labels.items())
+    [('all', (0, 4)), ('mod', (2, 3)), ('new', (1, 2)), ('rem', (3, 4))]
+    >>> labels.has_descendant(libbe.diff.BUGDIR_TYPE_ALL,
+    ...                       libbe.diff.BUGDIR_TYPE_NEW)
+    True
+    >>> labels.has_descendant(libbe.diff.BUGDIR_TYPE_NEW,
+    ...                       libbe.diff.BUGDIR_TYPE_ALL)
+    False
+    >>> sorted(labels.matching(libbe.diff.BUGDIR_TYPE_ALL,
+    ...                        match_descendant_types=True))
+    ['all', 'mod', 'new', 'rem']
+    >>> sorted(labels.matching(libbe.diff.BUGDIR_TYPE_NEW,
+    ...                        match_ancestor_types=True))
+    ['all', 'new']
+    """
+    def __init__(self, type_root):
+        nodes = list(type_root.traverse())
+        sizes = {}
+        for node in reversed(nodes): # children before parents
+            sizes[id(node)] = 1 + sum([sizes[id(child)] for child in node])
+        self.labels = {}
+        for i,node in enumerate(nodes):
+            self.labels[str(node)] = (i, i + sizes[id(node)])
+        self.ancestors = {}
+        self.descendants = {}
+        for name,(start,stop) in self.labels.items():
+            self.ancestors[name] = frozenset(
+                [n for n,(a,b) in self.labels.items() if a < start < b])
+            self.descendants[name] = frozenset(
+                [n for n,(a,b) in self.labels.items() if start < a < stop])
+
+    def has_descendant(self, type, descendant):
+        """Like :py:meth:`~libbe.util.tree.Tree.has_descendant`."""
+        return str(descendant) in self.descendants.get(str(type), ())
+
+    def matching(self, type, match_ancestor_types=False,
+                 match_descendant_types=False):
+        """Return the set of type names matching `type`."""
+        name = str(type)
+        names = set([name])
+        if match_ancestor_types == True:
+            names.update(self.ancestors.get(name, ()))
+        if match_descendant_types == True:
+            names.update(self.descendants.get(name, ()))
+        return names
+
+def _type_labels(type_root):
+    """Return the :py:class:`_TypeLabels` for `type_root`, which are
+    cached on the type tree itself."""
+    labels = getattr(type_root, '_type_labels', None)
+    if labels == None:
+        labels = _TypeLabels(type_root)
+        type_root._type_labels = labels
+    return labels
+
 def _get_subscriber(extra_strings, subscriber, type_root):
     for i,string in enumerate(extra_strings):
         if string.startswith(TAG):
@@ -256,10 +322,11 @@ def subscribe(extra_strings, subscriber, types, servers, type_root):
         if t not in ts:
             ts.append(t)
     # remove descendant types
+    labels = _type_labels(type_root)
     all_ts = copy.copy(ts)
     for t in all_ts:
         for tt in all_ts:
-            if tt in ts and t.has_descendant(tt):
+            if tt in ts and labels.has_descendant(t, tt):
                 ts.remove(tt)
     if "*" in servers+srvs:
         srvs = ["*"]
@@ -274,10 +341,11 @@ def unsubscribe(extra_strings, subscriber, types, servers, type_root):
         return extra_strings # pass
     # Remove matched string
     i,s,ts,srvs = args
+    labels = _type_labels(type_root)
     all_ts = copy.copy(ts)
     for t in types:
         for tt in all_ts:
-            if tt in ts and t.has_descendant(tt):
+            if tt in ts and labels.has_descendant(t, tt):
                 ts.remove(tt)
     if "*" in servers+srvs:
         srvs = []
@@ -324,30 +392,161 @@ def get_subscribers(extra_strings, type, server, type_root,
     ... match_ancestor_types=True)
     ['Jane Doe <J@doe.com>', 'John Doe <j@doe.com>']
     """
+    names = _type_labels(type_root).matching(
+        type, match_ancestor_types, match_descendant_types)
     for string in extra_strings:
         if not string.startswith(TAG):
             continue
         subscriber,types,servers = _parse_string(string, type_root)
         type_match = False
-        if type in types:
-            type_match = True
-        if type_match == False and match_ancestor_types == True:
-            for t in types:
-                if t.has_descendant(type):
-                    type_match = True
-                    break
-        if type_match == False and match_descendant_types == True:
-            for t in types:
-                if type.has_descendant(t):
-                    type_match = True
-                    break
+        for t in types:
+            if str(t) in names:
+                type_match = True
+                break
         server_match = False
         if server in servers or servers == ["*"] or server == "*":
             server_match = True
         if type_match == True and server_match == True:
             yield subscriber
 
-def get_bugdir_subscribers(bugdir, server):
+class SubscriptionIndex (object):
+    """Index ``SUBSCRIBE:`` extra strings by server and type.
+
+    :py:attr:`subscribers` maps ``(server, type_name)`` pairs to
+    ``{subscriber: set(ids)}`` dicts, and :py:attr:`subscriptions`
+    maps each id to ``{subscriber: (types, servers)}``.  Together with
+    the precomputed type ancestry, :py:meth:`get_subscribers` is a
+    handful of dict lookups instead of a parse of every subscription.
+
+    You will usually want the per-bugdir index from
+    :py:func:`subscription_index`, which is kept current as bugs
+    change.
+
+    >>> index = SubscriptionIndex(libbe.diff.BUGDIR_TYPE_ALL)
+    >>> index.update('x', ['John Doe <j@doe.com>\\tall\\ta.com'])
+    >>> index.update('y', ['Jane Doe <J@doe.com>\\tnew\\t*',
+    ...                    'John Doe <j@doe.com>\\tmod\\tb.net'])
+    >>> def sgs(*args, **kwargs):
+    ...     subscribers = index.get_subscribers(*args, **kwargs)
+    ...     return [(s, sorted(ids)) for s,ids in sorted(subscribers.items())]
+    >>> sgs(libbe.diff.BUGDIR_TYPE_ALL, 'a.com')
+    [('John Doe <j@doe.com>', ['x'])]
+    >>> sgs(libbe.diff.BUGDIR_TYPE_ALL, 'a.com', match_descendant_types=True)
+    [('Jane Doe <J@doe.com>', ['y']), ('John Doe <j@doe.com>', ['x'])]
+    >>> sgs(libbe.diff.BUGDIR_TYPE_ALL, '*', match_descendant_types=True)
+    [('Jane Doe <J@doe.com>', ['y']), ('John Doe <j@doe.com>', ['x', 'y'])]
+    >>> sgs(libbe.diff.BUGDIR_TYPE_MOD, 'b.net', match_ancestor_types=True)
+    [('John Doe <j@doe.com>', ['y'])]
+    >>> sgs(libbe.diff.BUGDIR_TYPE_ALL, '*', match_descendant_types=True,
+    ...     ids=['x'])
+    [('John Doe <j@doe.com>', ['x'])]
+    >>> index.subscriptions['x']
+    {'John Doe <j@doe.com>': ([<SubscriptionType: all>], ['a.com'])}
+    >>> index.remove('y')
+    >>> sgs(libbe.diff.BUGDIR_TYPE_ALL, '*', match_descendant_types=True)
+    [('John Doe <j@doe.com>', ['x'])]
+    """
+    def __init__(self, type_root=libbe.diff.BUG_TYPE_ALL):
+        self.type_root = type_root
+        self.labels = _type_labels(type_root)
+        self.subscribers = {}
+        self.subscriptions = {}
+        self._servers = {} # type name -> servers with subscriptions
+
+    def update(self, id, values):
+        """(Re)index the subscriptions for `id`.
+
+        `values` are ``SUBSCRIBE:`` strings with the tag stripped, as
+        stored in :py:attr:`libbe.bugdir.ExtraStringIndex.values`.
+        Unparsable subscriptions are skipped.
+        """
+        self.remove(id)
+        subscriptions = {}
+        for value in values:
+            try:
+                subscriber,types,servers = _parse_string(
+                    TAG+value, self.type_root)
+            except ValueError:
+                continue
+            subscriptions[subscriber] = (types, servers)
+            for t in types:
+                for server in servers:
+                    self.subscribers.setdefault(
+                        (server, str(t)), {}).setdefault(
+                        subscriber, set()).add(id)
+                    self._servers.setdefault(str(t), set()).add(server)
+        if len(subscriptions) > 0:
+            self.subscriptions[id] = subscriptions
+
+    def remove(self, id):
+        """Drop the subscriptions for `id`."""
+        for subscriber,(types,servers) in \
+                self.subscriptions.pop(id, {}).items():
+            for t in types:
+                for server in servers:
+                    key = (server, str(t))
+                    subscribers = self.subscribers.get(key, {})
+                    ids = subscribers.get(subscriber, set())
+                    ids.discard(id)
+                    if len(ids) == 0:
+                        subscribers.pop(subscriber, None)
+                    if len(subscribers) == 0:
+                        self.subscribers.pop(key, None)
+                        self._servers.get(str(t), set()).discard(server)
+
+    def get_subscribers(self, type, server, match_ancestor_types=False,
+                        match_descendant_types=False, ids=None):
+        """Return a ``{subscriber: set(ids)}`` dict.
+
+        Matching follows :py:func:`get_subscribers`.  Set `ids` to
+        restrict the search to some ids (e.g. the bugs touched by a
+        commit).
+        """
+        if ids != None:
+            ids = set(ids)
+        ret = {}
+        for name in self.labels.matching(
+            type, match_ancestor_types, match_descendant_types):
+            if server == '*':
+                servers = self._servers.get(name, ())
+            else:
+                servers = [server, '*']
+            for srv in servers:
+                for subscriber,sub_ids in \
+                        self.subscribers.get((srv, name), {}).items():
+                    if ids != None:
+                        sub_ids = sub_ids & ids
+                        if len(sub_ids) == 0:
+                            continue
+                    ret.setdefault(subscriber, set()).update(sub_ids)
+        return ret
+
+def subscription_index(bugdir):
+    """Return the :py:class:`SubscriptionIndex` for `bugdir`'s bugs.
+
+    The index is attached to
+    :py:meth:`libbe.bugdir.BugDir.extra_string_index`, so it is built
+    once and then kept current as bug subscriptions change.
+
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=True)
+    >>> a = bd.bug_from_uuid('a')
+    >>> index = subscription_index(bd)
+    >>> index.subscriptions
+    {}
+    >>> a.extra_strings = subscribe(a.extra_strings, "John Doe <j@doe.com>",
+    ...     [libbe.diff.BUG_TYPE_ALL], ["a.com"], libbe.diff.BUG_TYPE_ALL)
+    >>> subscription_index(bd) is index
+    True
+    >>> index.get_subscribers(libbe.diff.BUG_TYPE_ALL, 'a.com')
+    {'John Doe <j@doe.com>': set(['a'])}
+    >>> bd.remove_bug(a)
+    >>> index.get_subscribers(libbe.diff.BUG_TYPE_ALL, 'a.com')
+    {}
+    >>> bd.cleanup()
+    """
+    return bugdir.extra_string_index().view(TAG, SubscriptionIndex)
+
+def get_bugdir_subscribers(bugdir, server, ids=None):
     """
     I have a bugdir.  Who cares about it, and what do they care about?
     Returns a dict of dicts:
@@ -355,11 +554,13 @@ def get_bugdir_subscribers(bugdir, server):
     where id is either a bug.uuid (in the case of a bug subscription)
     or "%(bugdir_id)s" (in the case of a bugdir subscription).
 
-    Only checks bugs that are currently in memory, so you might want
-    to call bugdir.load_all_bugs() first.
+    Bug subscriptions come from :py:func:`subscription_index`, so no
+    bugs are loaded.  Set `ids` to only return subscriptions to those
+    bugs (e.g. the bugs touched by a commit); bugdir subscriptions are
+    always returned.
 
-    >>> bd = bugdir.SimpleBugDir(sync_with_disk=False)
-    >>> a = bd.bug_from_shortname("a")
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=True)
+    >>> a = bd.bug_from_uuid("a")
     >>> bd.extra_strings = subscribe(bd.extra_strings, "John Doe <j@doe.com>",
     ...                [libbe.diff.BUGDIR_TYPE_ALL], ["a.com"], libbe.diff.BUGDIR_TYPE_ALL)
     >>> bd.extra_strings = subscribe(bd.extra_strings, "Jane Doe <J@doe.com>",
@@ -375,6 +576,9 @@ def get_bugdir_subscribers(bugdir, server):
     [<SubscriptionType: all>]
     >>> get_bugdir_subscribers(bd, "b.net")
     {'Jane Doe <J@doe.com>': {'%(bugdir_id)s': [<SubscriptionType: new>]}}
+    >>> subscribers = get_bugdir_subscribers(bd, "a.com", ids=['b'])
+    >>> sorted(subscribers["John Doe <j@doe.com>"].keys())
+    ['%(bugdir_id)s']
     >>> bd.cleanup()
     """ % {'bugdir_id':libbe.diff.BUGDIR_ID}
     subscribers = {}
@@ -384,14 +588,14 @@ def get_bugdir_subscribers(bugdir, server):
         i,s,ts,srvs = _get_subscriber(bugdir.extra_strings, sub,
                                       libbe.diff.BUGDIR_TYPE_ALL)
         subscribers[sub] = {"DIR":ts}
-    for bug in bugdir:
-        for sub in get_subscribers(bug.extra_strings, libbe.diff.BUG_TYPE_ALL,
-                                   server, libbe.diff.BUG_TYPE_ALL,
-                                   match_descendant_types=True):
-            i,s,ts,srvs = _get_subscriber(bug.extra_strings, sub,
-                                          libbe.diff.BUG_TYPE_ALL)
+    index = subscription_index(bugdir)
+    for sub,uuids in index.get_subscribers(
+        libbe.diff.BUG_TYPE_ALL, server, match_descendant_types=True,
+        ids=ids).items():
+        for uuid in uuids:
+            ts,srvs = index.subscriptions[uuid][sub]
             if sub in subscribers:
-                subscribers[sub][bug.uuid] = ts
+                subscribers[sub][uuid] = list(ts)
             else:
-                subscribers[sub] = {bug.uuid:ts}
+                subscribers[sub] = {uuid:list(ts)}
     return subscribers
@@ -146,19 +146,162 @@ If TAG is given, add TAG to BUG-ID.  If it is not specified, just
 print the tags for BUG-ID.
 
 To search for bugs with a particular tag, try
-  $ be list --extra-strings %s<your-tag>
-""" % TAG_TAG
+  $ be list --tagged <your-tag>
+or combine tags with &, |, and !, e.g.
+  $ be list --tagged 'GUI & !later'
+"""
+
+class TagQuery (object):
+    """Boolean query over bug tags.
+
+    Tags are combined with ``&`` (and), ``|`` (or), ``!`` (not), and
+    parentheses, with the usual precedence.  Whitespace around tag
+    names is ignored.
+
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=True)
+    >>> a = bd.bug_from_uuid('a')
+    >>> b = bd.bug_from_uuid('b')
+    >>> set_tags(a, ['GUI', 'later'])
+    >>> set_tags(b, ['GUI'])
+    >>> sorted(TagQuery('GUI').uuids(bd))
+    ['a', 'b']
+    >>> sorted(TagQuery('GUI & !later').uuids(bd))
+    ['b']
+    >>> sorted(TagQuery('!GUI | (later&GUI)').uuids(bd))
+    ['a']
+    >>> remove_tag(a, 'later')
+    >>> sorted(TagQuery('GUI&!later').uuids(bd))
+    ['a', 'b']
+    >>> TagQuery('GUI &')
+    Traceback (most recent call last):
+      ...
+    UserError: Invalid tag query 'GUI &': missing tag at end of query
+    >>> bd.cleanup()
+
+    Queries against stored bugs are answered from the bugdir's on-disk
+    :py:class:`~libbe.bugdir.StoredExtraStrings`, without loading any
+    bugs.
+
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> set_tags(bd.bug_from_uuid('a'), ['GUI'])
+    >>> bd.flush_reload()
+    >>> sorted(TagQuery('GUI | !GUI').uuids(bd))
+    ['a', 'b']
+    >>> get_all_tags(bd)
+    [u'GUI']
+    >>> len(bd)
+    0
+    >>> bd.cleanup()
+    """
+    def __init__(self, query):
+        self.query = query
+        self._tokens = self._tokenize(query)
+        self._pos = 0
+        self.tree = self._parse_or()
+        if self._pos < len(self._tokens):
+            self._error('unexpected %r' % self._tokens[self._pos])
+
+    def _error(self, msg):
+        raise libbe.command.UserError(
+            'Invalid tag query %r: %s' % (self.query, msg))
+
+    def _tokenize(self, query):
+        tokens = []
+        tag = []
+        for c in query:
+            if c in '&|!()':
+                if len(''.join(tag).strip()) > 0:
+                    tokens.append(''.join(tag).strip())
+                tag = []
+                tokens.append(c)
+            else:
+                tag.append(c)
+        if len(''.join(tag).strip()) > 0:
+            tokens.append(''.join(tag).strip())
+        return tokens
+
+    def _next(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return None
+
+    def _parse_or(self):
+        terms = [self._parse_and()]
+        while self._next() == '|':
+            self._pos += 1
+            terms.append(self._parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        return ('or', terms)
+
+    def _parse_and(self):
+        factors = [self._parse_not()]
+        while self._next() == '&':
+            self._pos += 1
+            factors.append(self._parse_not())
+        if len(factors) == 1:
+            return factors[0]
+        return ('and', factors)
+
+    def _parse_not(self):
+        token = self._next()
+        if token == None:
+            self._error('missing tag at end of query')
+        self._pos += 1
+        if token == '!':
+            return ('not', self._parse_not())
+        elif token == '(':
+            tree = self._parse_or()
+            if self._next() != ')':
+                self._error('missing )')
+            self._pos += 1
+            return tree
+        elif token in ['&', '|', ')']:
+            self._error('unexpected %r' % token)
+        return ('tag', token)
+
+    def uuids(self, bugdir):
+        """Return the set of uuids for bugs in `bugdir` matching the
+        query, using the bugdir's extra-string index."""
+        index = bugdir.extra_string_index()
+        universe = None
+        stack = [(self.tree, False)]
+        results = []
+        while len(stack) > 0: # post-order evaluation
+            node,expanded = stack.pop()
+            if node[0] == 'tag':
+                results.append(set(index.find(TAG_TAG, node[1])))
+            elif expanded == False:
+                stack.append((node, True))
+                if node[0] == 'not':
+                    stack.append((node[1], False))
+                else:
+                    stack.extend([(n, False) for n in reversed(node[1])])
+            elif node[0] == 'not':
+                if universe == None:
+                    universe = set(bugdir.uuids())
+                results.append(universe - results.pop())
+            else:
+                args = results[-len(node[1]):]
+                del results[-len(node[1]):]
+                if node[0] == 'and':
+                    results.append(set.intersection(*args))
+                else:
+                    results.append(set.union(*args))
+        return results[0]
+
 
 # functions exposed to other modules
 
 def get_all_tags(bugdir):
-    bugdir.load_all_bugs()
-    tags = []
-    for bug in bugdir:
-        for tag in get_tags(bug):
-            if tag not in tags:
-                tags.append(tag)
-    return tags
+    """Return a sorted list of the tags used in `bugdir`."""
+    index = bugdir.extra_string_index()
+    return sorted(index.bugs.get(TAG_TAG, {}).keys())
+
+def tagged_uuids(bugdir, tag):
+    """Return the set of uuids for bugs in `bugdir` tagged `tag`."""
+    return bugdir.extra_string_index().find(TAG_TAG, tag)
 
 def get_tags(bug):
     tags = []
@@ -162,11 +162,8 @@ def bug_from_target_summary(bugdirs, bugdir, summary=None):
             return None
         else:
             return bugdir.bug_from_uuid(bugdir.target)
-    matched = []
-    for uuid in bugdir.uuids():
-        bug = bugdir.bug_from_uuid(uuid)
-        if bug.severity == 'target' and bug.summary == summary:
-            matched.append(bug)
+    matched = [bugdir.bug_from_uuid(uuid) for uuid
+               in sorted(bugdir.target_registry().find(summary))]
     if len(matched) == 0:
         return None
     if len(matched) > 1:
@@ -174,13 +171,27 @@ def bug_from_target_summary(bugdirs, bugdir, summary=None):
                         % '\n  '.join([bug.uuid for bug in matched]))
     return matched[0]
 
-def bug_target(bugdirs, bug):
+def bug_target(bugdirs, bug, graph=None):
+    """Return the target bug blocked by `bug` (or `None`).
+
+    Pass a :py:class:`~libbe.command.depend.DependencyGraph` as
+    `graph` to follow the links through its index.  Targets are
+    recognized through each bugdir's
+    :py:class:`~libbe.bugdir.TargetRegistry`, so blocked bugs that are
+    not targets are never loaded.
+    """
     if bug.severity == 'target':
         return bug
+    if graph == None:
+        blocks = libbe.command.depend._get_blocks(bug)
+    else:
+        blocks = graph.blocks(bug.uuid)
     matched = []
-    for blocked in libbe.command.depend.get_blocks(bugdirs, bug):
-        if blocked.severity == 'target':
-            matched.append(blocked)
+    for uuid in blocks:
+        for bugdir in bugdirs.values():
+            if uuid in bugdir.target_registry().summaries:
+                matched.append(bugdir.bug_from_uuid(uuid))
+                break
     if len(matched) == 0:
         return None
     if len(matched) > 1:
@@ -205,10 +216,8 @@ def add_target(bugdirs, bugdir, bug, summary):
 def targets(bugdirs):
     """Generate all possible target bug summaries."""
     for bugdir in bugdirs.values():
-        bugdir.load_all_bugs()
-        for bug in bugdir:
-            if bug.severity == 'target':
-                yield bug.summary
+        for summary in bugdir.target_registry().uuids.keys():
+            yield summary
 
 def target_dict(bugdirs):
     """
@@ -216,8 +225,8 @@ def target_dict(bugdirs):
     target bugs.
     """
     ret = {}
-    for bug in targets(bugdirs):
-        ret[bug.uuid] = bug
+    for bugdir in bugdirs.values():
+        ret.update(bugdir.target_registry().summaries)
     return ret
 
 def complete_target(command, argument, fragment=None):
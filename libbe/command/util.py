@@ -21,6 +21,7 @@ import os.path
 
 import libbe
 import libbe.command
+import libbe.util.id
 
 class Completer (object):
     def __init__(self, options):
@@ -199,7 +200,13 @@ def select_values(string, possible_values, name="unkown"):
         possible_values = whitelisted_values
     return possible_values
 
-def bugdir_bug_comment_from_user_id(bugdirs, id):
+def bugdir_bug_comment_from_user_id(bugdirs, id, comment_root=True):
+    """Return the `(bugdir, bug, comment)` the user id `id` refers to.
+
+    For bug ids, `comment` is the bug's comment root, which loads all
+    of the bug's comments.  Callers that don't need it can set
+    `comment_root` to `False` to get `None` instead.
+    """
     p = libbe.util.id.parse_user(bugdirs, id)
     if not p['type'] in ['bugdir', 'bug', 'comment']:
         raise libbe.command.UserError(
@@ -218,13 +225,19 @@ def bugdir_bug_comment_from_user_id(bugdirs, id):
         bug = bugdir.bug_from_uuid(p['bug'])
         if 'comment' in p:
             comment = bug.comment_from_uuid(p['comment'])
-        else:
+        elif comment_root == True:
             comment = bug.comment_root
+        else:
+            comment = None
     else:
         bug = comment = None
     return (bugdir, bug, comment)
 
 def bug_from_uuid(bugdirs, uuid):
+    index = libbe.util.id.id_index(bugdirs)
+    for bugdir in bugdirs.values():
+        if index.has_bug(bugdir, uuid):
+            return bugdir.bug_from_uuid(uuid)
     error = None
     for bugdir in bugdirs.values():
         try:
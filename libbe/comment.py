@@ -23,6 +23,7 @@
 """
 
 import base64
+import functools
 import os
 import os.path
 import sys
@@ -91,6 +92,73 @@ def save_comments(bug):
         comment.storage = bug.storage
         comment.save()
 
+def copy_comments(storage, bug_id, new_bug_id, in_reply_to=None):
+    """Copy every comment of the stored bug `bug_id` to the bug
+    `new_bug_id`, straight from `storage`, without building any
+    :py:class:`Comment`\s.
+
+    Each copy gets a new UUID, and keeps the original UUID as its
+    ``Alt-id`` (unless it already has one).  Replies are rethreaded
+    onto the copies of their parents, and top-level comments become
+    replies to the comment `in_reply_to`.  The copies are written in a
+    single storage batch.  Return a ``{old UUID: new UUID}`` dict.
+
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> b = bd.bug_from_uuid('b')
+    >>> first = b.new_comment('First')
+    >>> reply = first.new_reply('Reply')
+    >>> uuids = copy_comments(bd.storage, 'b', 'a', in_reply_to='x')
+    >>> sorted(uuids.keys()) == sorted([first.uuid, reply.uuid])
+    True
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.load_comments()
+    >>> copies = dict((c.alt_id, c) for c in a.comments())
+    >>> print copies[first.uuid].body
+    First
+    >>> copies[first.uuid].uuid == uuids[first.uuid]
+    True
+    >>> print copies[first.uuid].in_reply_to
+    x
+    >>> copies[reply.uuid].in_reply_to == uuids[first.uuid]
+    True
+    >>> bd.cleanup()
+    """
+    uuids = sorted(libbe.util.id.child_uuids(storage.children(bug_id)))
+    new_uuids = dict((uuid, libbe.util.id.uuid_gen()) for uuid in uuids)
+    comments = []
+    for uuid in uuids:
+        settings = mapfile.parse(storage.get('%s/values' % uuid, '{}\n'))
+        body = storage.get('%s/body' % uuid, None)
+        comments.append((uuid, settings, body))
+    parents = dict(new_uuids) # In-reply-to targets (UUIDs or alt-ids)
+    for uuid,settings,body in comments:
+        alt_id = settings.get('Alt-id', None)
+        if alt_id != None and alt_id not in parents:
+            parents[alt_id] = new_uuids[uuid]
+    storage.begin_batch()
+    try:
+        for uuid,settings,body in comments:
+            new = new_uuids[uuid]
+            if settings.get('Alt-id', None) == None:
+                settings['Alt-id'] = uuid
+            parent = settings.get('In-reply-to', None)
+            if parent == None:
+                if in_reply_to != None:
+                    settings['In-reply-to'] = in_reply_to
+            elif parent in parents:
+                settings['In-reply-to'] = parents[parent]
+            storage.add(new, parent=new_bug_id, directory=True)
+            storage.add('%s/values' % new, parent=new, directory=False)
+            storage.set('%s/values' % new, mapfile.generate(
+                    settings, context=storage.mapfile_context))
+            storage.add('%s/body' % new, parent=new, directory=False)
+            if body != None:
+                storage.set('%s/body' % new, body)
+    finally:
+        storage.end_batch()
+    return new_uuids
+
 
 class Comment (Tree, settings_object.SavedSettingsObject):
     """Comments are a notes that attach to :py:class:`~libbe.bug.Bug`\s in
@@ -118,8 +186,14 @@ class Comment (Tree, settings_object.SavedSettingsObject):
             kwargs["required_saved_properties"]=required_saved_properties
         return settings_object.versioned_property(**kwargs)
 
+    def _alt_id_change_hook(self, old, new):
+        index = getattr(self, '_comment_index', None)
+        if index is not None:
+            index.realias(self, old, new)
+        self._prop_save_settings(old, new)
     @_versioned_property(name="Alt-id",
-                         doc="Alternate ID for linking imported comments.  Internally comments are linked (via In-reply-to) to the parent's UUID.  However, these UUIDs are generated internally, so Alt-id is provided as a user-controlled linking target.")
+                         doc="Alternate ID for linking imported comments.  Internally comments are linked (via In-reply-to) to the parent's UUID.  However, these UUIDs are generated internally, so Alt-id is provided as a user-controlled linking target.",
+                         change_hook=_alt_id_change_hook)
     def alt_id(): return {}
 
     @_versioned_property(name="Author",
@@ -142,14 +216,36 @@ class Comment (Tree, settings_object.SavedSettingsObject):
 
     def _get_time(self):
         if self.date == None:
+            self._cached_date = None
+            self._cached_time = None
             return None
-        return utility.str_to_time(self.date)
+        if (not hasattr(self, '_cached_date')
+            or self.date != self._cached_date):
+            self._cached_date = self.date
+            self._cached_time = utility.str_to_time(self.date)
+        return self._cached_time
     def _set_time(self, value):
-        self.date = utility.time_to_str(value)
+        date = utility.time_to_str(value)
+        if date != self.date:
+            self.date = date
+        self._cached_date = self.date
+        self._cached_time = value
     time = property(fget=_get_time,
                     fset=_set_time,
                     doc="An integer version of .date")
 
+    def _get_uuid(self):
+        return self._uuid
+    def _set_uuid(self, uuid):
+        old = getattr(self, '_uuid', None)
+        self._uuid = uuid
+        index = getattr(self, '_comment_index', None)
+        if index is not None and uuid != old:
+            index.rename(self, old, uuid)
+    uuid = property(fget=_get_uuid,
+                    fset=_set_uuid,
+                    doc="The comment's UUID (kept in sync with its CommentIndex)")
+
     def _get_comment_body(self):
         if self.storage != None and self.storage.is_readable() \
                 and self.uuid != INVALID_UUID:
@@ -206,6 +302,9 @@ class Comment (Tree, settings_object.SavedSettingsObject):
         """
         Tree.__init__(self)
         settings_object.SavedSettingsObject.__init__(self)
+        self._flat_thread = None
+        self._flat_thread_generation = None
+        self._comment_index = None
         self.bug = bug
         self.storage = None
         self.uuid = uuid
@@ -227,6 +326,18 @@ class Comment (Tree, settings_object.SavedSettingsObject):
     def __cmp__(self, other):
         return cmp_full(self, other)
 
+    def __getstate__(self):
+        """Don't carry thread caches or index links into copies.
+
+        Copies (e.g. :py:func:`copy.deepcopy` of a comment tree) get
+        fresh ones on demand.
+        """
+        state = dict(self.__dict__)
+        state['_flat_thread'] = None
+        state['_flat_thread_generation'] = None
+        state['_comment_index'] = None
+        return state
+
     def __str__(self):
         """
         >>> comm = Comment(bug=None, body="Some insightful remarks")
@@ -243,13 +354,115 @@ class Comment (Tree, settings_object.SavedSettingsObject):
         """
         return self.string()
 
-    def traverse(self, *args, **kwargs):
+    def traverse(self, depth_first=True):
         """Avoid working with the possible dummy root comment"""
-        for comment in Tree.traverse(self, *args, **kwargs):
+        if depth_first == True:
+            comments = self.flat_thread()
+        else:
+            comments = Tree.traverse(self, depth_first=depth_first)
+        for comment in comments:
             if comment.uuid == INVALID_UUID:
                 continue
             yield comment
 
+    def thread(self, flatten=False):
+        """Avoid working with the possible dummy root comment.
+
+        The dummy root is skipped, so each top-level comment starts
+        a new thread at depth 0, matching the depths the old
+        :py:meth:`traverse`-based :py:meth:`Tree.thread` gave (and
+        which :py:mod:`libbe.command.html` uses for indentation).
+
+        >>> root = Comment(bug=None, uuid=INVALID_UUID)
+        >>> a = root.new_reply()
+        >>> a.uuid = 'a'
+        >>> b = a.new_reply()
+        >>> b.uuid = 'b'
+        >>> c = a.new_reply()
+        >>> c.uuid = 'c'
+        >>> d = root.new_reply()
+        >>> d.uuid = 'd'
+        >>> [(depth, comm.uuid) for depth,comm in root.thread()]
+        [(0, 'a'), (1, 'b'), (1, 'c'), (0, 'd')]
+        >>> [(depth, comm.uuid) for depth,comm in root.thread(flatten=True)]
+        [(0, 'a'), (1, 'b'), (0, 'c'), (0, 'd')]
+        >>> [(depth, comm.uuid) for depth,comm in a.thread()]
+        [(0, 'a'), (1, 'b'), (1, 'c')]
+        """
+        if self.uuid == INVALID_UUID:
+            roots = list(self)
+        else:
+            roots = [self]
+        for root in roots:
+            for depth,comment in Tree.thread(root, flatten=flatten):
+                yield (depth, comment)
+
+    # maintaining the flattened thread
+
+    _flat_thread_generation_counter = 0
+
+    def flat_thread(self):
+        """Return a depth-first list of this comment and its descendants.
+
+        The list is cached, and the cache is invalidated whenever
+        any comment's children are changed (e.g. by :py:meth:`append`,
+        :py:meth:`sort`, or :py:meth:`remove`), so repeated
+        :py:meth:`traverse` calls (e.g. from
+        :py:meth:`~libbe.bug.Bug.comments`) do not re-walk the tree.
+
+        >>> a = Comment(bug=None, uuid='a')
+        >>> b = a.new_reply()
+        >>> b.uuid = 'b'
+        >>> c = a.new_reply()
+        >>> c.uuid = 'c'
+        >>> [comm.uuid for comm in a.flat_thread()]
+        ['a', 'b', 'c']
+        >>> a.flat_thread() is a.flat_thread()
+        True
+        >>> d = b.new_reply()
+        >>> d.uuid = 'd'
+        >>> [comm.uuid for comm in a.flat_thread()]
+        ['a', 'b', 'd', 'c']
+        >>> a.sort(key=lambda comm: comm.uuid, reverse=True)
+        >>> [comm.uuid for comm in a.traverse()]
+        ['a', 'c', 'b', 'd']
+        """
+        generation = Comment._flat_thread_generation_counter
+        if self._flat_thread is None \
+                or self._flat_thread_generation != generation:
+            self._flat_thread = list(Tree.traverse(self))
+            self._flat_thread_generation = generation
+        return self._flat_thread
+
+    def _invalidate_flat_thread(self):
+        # Without parent links we can't find the stale ancestor
+        # caches, so expire every cached thread.
+        Comment._flat_thread_generation_counter += 1
+
+    def append(self, comment):
+        Tree.append(self, comment)
+        self._invalidate_flat_thread()
+        if self._comment_index is not None:
+            self._comment_index.add(comment)
+
+    def extend(self, comments):
+        comments = list(comments)
+        Tree.extend(self, comments)
+        self._invalidate_flat_thread()
+        if self._comment_index is not None:
+            for comment in comments:
+                self._comment_index.add(comment)
+
+    def insert(self, i, comment):
+        Tree.insert(self, i, comment)
+        self._invalidate_flat_thread()
+        if self._comment_index is not None:
+            self._comment_index.add(comment)
+
+    def sort(self, *args, **kwargs):
+        Tree.sort(self, *args, **kwargs)
+        self._invalidate_flat_thread()
+
     # serializing methods
 
     def _setting_attr_string(self, setting):
@@ -621,7 +834,8 @@ class Comment (Tree, settings_object.SavedSettingsObject):
     def save_settings(self):
         if self.uuid == INVALID_UUID:
             return
-        mf = mapfile.generate(self._get_saved_settings())
+        mf = mapfile.generate(self._get_saved_settings(),
+                              context=self.storage.mapfile_context)
         self.storage.set(self.id.storage("values"), mf)
 
     def save(self):
@@ -650,10 +864,22 @@ class Comment (Tree, settings_object.SavedSettingsObject):
         self._set_comment_body(new=self.body, force=True)
 
     def remove(self):
-        for comment in self:
-            comment.remove()
-        if self.uuid != INVALID_UUID:
-            self.storage.recursive_remove(self.id.storage())
+        index = self._comment_index
+        if index is not None and self is not index.root:
+            try:
+                parent = index.parent(self)
+            except KeyError:
+                parent = []
+            for i,comment in enumerate(parent):
+                if comment is self:
+                    del parent[i]
+                    break
+            index.remove(self)
+        # remove descendants before their ancestors
+        for comment in reversed(list(Tree.traverse(self))):
+            if comment.uuid != INVALID_UUID:
+                comment.storage.recursive_remove(comment.id.storage())
+        self._invalidate_flat_thread()
 
     def add_reply(self, reply, allow_time_inversion=False):
         if self.uuid != INVALID_UUID:
@@ -693,7 +919,12 @@ class Comment (Tree, settings_object.SavedSettingsObject):
         Traceback (most recent call last):
           ...
         KeyError: None
+
+        Lookups from a bug's dummy root comment go through a
+        :py:class:`CommentIndex` instead of walking the thread.
         """
+        if self.uuid == INVALID_UUID:
+            return self.comment_index().lookup(uuid, match_alt_id=match_alt_id)
         for comment in self.traverse():
             if comment.uuid == uuid:
                 return comment
@@ -702,6 +933,31 @@ class Comment (Tree, settings_object.SavedSettingsObject):
                 return comment
         raise KeyError(uuid)
 
+    def comment_index(self):
+        """Return the :py:class:`CommentIndex` for this comment's thread.
+
+        The index is built on the first call and then kept up to date
+        as comments are added, removed, or renamed.  Indexes should be
+        rooted on a bug's :py:attr:`~libbe.bug.Bug.comment_root`; if
+        this comment is already covered by an ancestor's index, that
+        index is returned rather than building a competing one over
+        the subtree.
+
+        >>> root = Comment(bug=None, uuid=INVALID_UUID)
+        >>> a = root.new_reply()
+        >>> a.uuid = 'a'
+        >>> b = a.new_reply()
+        >>> b.uuid = 'b'
+        >>> index = root.comment_index()
+        >>> a.comment_index() is index
+        True
+        >>> b._comment_index is index
+        True
+        """
+        if self._comment_index is None:
+            CommentIndex(self)
+        return self._comment_index
+
     # methods for id generation
 
     def sibling_uuids(self):
@@ -710,6 +966,115 @@ class Comment (Tree, settings_object.SavedSettingsObject):
         return []
 
 
+class CommentIndex (object):
+    """Map UUIDs and alt-ids to the comments in a thread.
+
+    Each indexed comment keeps a reference to the index in
+    `._comment_index`, so that :py:meth:`Comment.append`,
+    :py:meth:`Comment.remove`, and changes to `.uuid` or `.alt_id`
+    can update the index in place.
+
+    >>> root = Comment(bug=None, uuid=INVALID_UUID)
+    >>> a = root.new_reply()
+    >>> a.uuid = 'a'
+    >>> index = root.comment_index()
+    >>> index.lookup('a') is a
+    True
+    >>> b = a.new_reply()
+    >>> b.uuid = 'b'
+    >>> b.alt_id = 'b-alt'
+    >>> index.lookup('b-alt') is b
+    True
+    >>> index.lookup('b-alt', match_alt_id=False)
+    Traceback (most recent call last):
+      ...
+    KeyError: 'b-alt'
+    >>> index.parent(b) is a
+    True
+    >>> 'b' in index
+    True
+    >>> b.uuid = 'c'
+    >>> 'b' in index
+    False
+    >>> index.lookup('c') is b
+    True
+    """
+    def __init__(self, root):
+        self.root = root
+        self.uuids = {}
+        self.alt_ids = {}
+        root._comment_index = self
+        for comment in Tree.traverse(root):
+            if comment is not root:
+                self._add(comment)
+        self._changed()
+
+    def __contains__(self, uuid):
+        return uuid in self.uuids or uuid in self.alt_ids
+
+    def _add(self, comment):
+        comment._comment_index = self
+        if comment.uuid != INVALID_UUID:
+            self.uuids[comment.uuid] = comment
+        alt_id = comment.alt_id
+        if alt_id != None:
+            self.alt_ids[alt_id] = comment
+
+    def _changed(self):
+        # comment UUIDs cached by libbe.util.id.IDIndex are now stale
+        bug = getattr(self.root, 'bug', None)
+        bugdir = getattr(bug, 'bugdir', None)
+        index = getattr(bugdir, '_id_index', None)
+        if index != None:
+            index.invalidate(bugdir, bug.uuid)
+
+    def add(self, comment):
+        """Index `comment` and all of its descendants."""
+        for c in Tree.traverse(comment):
+            self._add(c)
+        self._changed()
+
+    def remove(self, comment):
+        """Drop `comment` and all of its descendants from the index."""
+        for c in Tree.traverse(comment):
+            if c._comment_index is self:
+                c._comment_index = None
+            if self.uuids.get(c.uuid) is c:
+                del self.uuids[c.uuid]
+            alt_id = c.alt_id
+            if self.alt_ids.get(alt_id) is c:
+                del self.alt_ids[alt_id]
+        self._changed()
+
+    def rename(self, comment, old, new):
+        if self.uuids.get(old) is comment:
+            del self.uuids[old]
+        if comment is not self.root and new != INVALID_UUID:
+            self.uuids[new] = comment
+        self._changed()
+
+    def realias(self, comment, old, new):
+        if old in self.alt_ids and self.alt_ids[old] is comment:
+            del self.alt_ids[old]
+        if new != None and new is not settings_object.EMPTY:
+            self.alt_ids[new] = comment
+
+    def lookup(self, uuid, match_alt_id=True):
+        """Return the comment matching `uuid` (or raise `KeyError`)."""
+        comment = self.uuids.get(uuid)
+        if comment is None and match_alt_id == True and uuid != None:
+            comment = self.alt_ids.get(uuid)
+        if comment is None:
+            raise KeyError(uuid)
+        return comment
+
+    def parent(self, comment):
+        """Return the parent of an indexed `comment`."""
+        if comment.in_reply_to == None:
+            return self.root
+        return self.lookup(comment.in_reply_to)
+
+
 def cmp_attr(comment_1, comment_2, attr, invert=False):
     """
     Compare a general attribute between two comments using the conventional
@@ -756,6 +1121,41 @@ DEFAULT_CMP_FULL_CMP_LIST = \
     (cmp_time, cmp_author, cmp_content_type, cmp_body, cmp_in_reply_to,
      cmp_uuid, cmp_extra_strings)
 
+def key_attr(comment, attr, invert=False):
+    """
+    Return a sort key for `comment` that orders like :py:func:`cmp_attr`.
+    Only numeric attributes (or `None`) may be inverted.
+
+    >>> commentA = Comment()
+    >>> commentB = Comment()
+    >>> commentA.author = "John Doe"
+    >>> commentB.author = "Jane Doe"
+    >>> key_attr(commentA, "author") > key_attr(commentB, "author")
+    True
+    >>> commentA.time = 10
+    >>> commentB.time = 20
+    >>> key_attr(commentA, "time", invert=True) > key_attr(commentB, "time", invert=True)
+    True
+    """
+    val = getattr(comment, attr)
+    if val == None: val = None
+    if invert == True:
+        if val == None: # cmp(None, x) < 0, so inverted None sorts last
+            return (True, 0)
+        return (False, -val)
+    return val
+
+# sort keys for the cmp_* functions above
+CMP_KEYS = {
+    cmp_uuid: lambda comment : key_attr(comment, "uuid"),
+    cmp_author: lambda comment : key_attr(comment, "author"),
+    cmp_in_reply_to: lambda comment : key_attr(comment, "in_reply_to"),
+    cmp_content_type: lambda comment : key_attr(comment, "content_type"),
+    cmp_body: lambda comment : key_attr(comment, "body"),
+    cmp_extra_strings: lambda comment : key_attr(comment, "extra_strings"),
+    cmp_time: lambda comment : key_attr(comment, "time", invert=True),
+    }
+
 class CommentCompoundComparator (object):
     def __init__(self, cmp_list=DEFAULT_CMP_FULL_CMP_LIST):
         self.cmp_list = cmp_list
@@ -765,8 +1165,22 @@ class CommentCompoundComparator (object):
             if val != 0 :
                 return val
         return 0
+    def key(self, comment):
+        """Return a sort key for `comment` consistent with this comparator.
+
+        Comparisons without an entry in :py:data:`CMP_KEYS` fall back
+        to :py:func:`functools.cmp_to_key`.
+        """
+        keys = []
+        for comparison in self.cmp_list:
+            key = CMP_KEYS.get(comparison, None)
+            if key == None:
+                key = functools.cmp_to_key(comparison)
+            keys.append(key(comment))
+        return tuple(keys)
 
 cmp_full = CommentCompoundComparator()
+key_full = cmp_full.key
 
 if libbe.TESTING == True:
     suite = doctest.DocTestSuite()
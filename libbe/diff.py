@@ -27,6 +27,7 @@ import types
 import libbe
 import libbe.bugdir
 import libbe.bug
+import libbe.digest
 import libbe.util.tree
 from libbe.storage.util.settings_object import setting_name_to_attr_name
 from libbe.util.utility import time_to_str
@@ -185,15 +186,58 @@ class DiffTree (libbe.util.tree.Tree):
     >>> bugdir.child_by_path('/bugs').masked = True
     >>> print bugdir.report_string()
     target: None -> 1.0
+
+    Children may be added lazily by a `children_fn`, which is only
+    called when the children are first needed.  Masked subtrees are
+    skipped by the report without ever being filled.
+
+    >>> def fill(node):
+    ...     print 'filling', node.name
+    ...     node.append(DiffTree('c', 'changed comment'))
+    >>> bugs.masked = False
+    >>> mod = DiffTree('mod', 'modified bug: XYZ', children_fn=fill)
+    >>> bugs.append(mod)
+    >>> mod.masked = True
+    >>> print bugdir.report_string()
+    target: None -> 1.0
+    bug-count: 5 -> 6
+      new bugs: ABC, DEF
+      removed bugs: RST, UVW
+    >>> mod.masked = False
+    >>> for line in bugdir.report_lines():
+    ...     print line
+    target: None -> 1.0
+    bug-count: 5 -> 6
+      new bugs: ABC, DEF
+      removed bugs: RST, UVW
+      modified bug: XYZ
+    filling mod
+        changed comment
     """
     def __init__(self, name, data=None, data_part_fn=str,
-                 requires_children=False, masked=False):
+                 requires_children=False, masked=False, children_fn=None):
         libbe.util.tree.Tree.__init__(self)
         self.name = name
         self.data = data
         self.data_part_fn = data_part_fn
         self.requires_children = requires_children
         self.masked = masked
+        self.children_fn = children_fn
+    def fill(self):
+        """Add any lazily generated children (see `children_fn`)."""
+        if self.children_fn != None:
+            children_fn = self.children_fn
+            self.children_fn = None
+            children_fn(self)
+    def __iter__(self):
+        self.fill()
+        return libbe.util.tree.Tree.__iter__(self)
+    def __reversed__(self):
+        self.fill()
+        return libbe.util.tree.Tree.__reversed__(self)
+    def __len__(self):
+        self.fill()
+        return libbe.util.tree.Tree.__len__(self)
     def paths(self, parent_path=None):
         paths = []
         if parent_path == None:
@@ -224,10 +268,24 @@ class DiffTree (libbe.util.tree.Tree):
             raise KeyError, "%s doesn't match '%s'" % (names, self.name)
         raise KeyError, '%s points to child not in %s' % (names, [c.name for c in self])
     def report_string(self):
-        report = self.report()
-        if report == None:
-            return ''
-        return '\n'.join(report)
+        return '\n'.join(self.report_lines())
+    def report_lines(self, depth=0):
+        """Generate the report's lines, visiting (and filling) only
+        the unmasked subtrees, and only as far as the caller reads.
+        """
+        if self.masked == True:
+            return
+        if self.requires_children == True \
+                and len([c for c in self if c.masked == False]) == 0:
+            return
+        data_part = self.data_part(depth)
+        if data_part != None:
+            for line in data_part.split('\n'):
+                yield line
+            depth += 1
+        for child in self:
+            for line in child.report_lines(depth):
+                yield line
     def report(self, root=None, parent=None, depth=0):
         if root == None:
             root = self.make_root()
@@ -337,11 +395,39 @@ class Diff (object):
     >>> print d.report_tree([subscriptions[0]]).report_string()
     New bugs:
       abc/c:om: Bug C
-    >>> print d.report_tree([subscriptions[1]]).report_string()
+    >>> r = d.report_tree([subscriptions[1]])
+    >>> print r.report_string()
     Removed bugs:
       abc/b:cm: Bug B
 
+    Neither report needed the details of modified bug a, so they
+    were never generated.
+
+    >>> r.child_by_path('bugdir/bugs/mod/a').children_fn == None
+    False
+
     >>> bd.cleanup()
+
+    When both bugdirs are kept up to date in their storage, bugs with
+    identical content digests (see :py:mod:`libbe.digest`) are
+    skipped without being loaded.
+
+    >>> bd_old = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> bd_new = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> bd_new.bug_from_uuid('b').status = 'open'
+    >>> old = libbe.bugdir.BugDir(bd_old.storage, uuid=bd_old.uuid,
+    ...                           from_storage=True)
+    >>> new = libbe.bugdir.BugDir(bd_new.storage, uuid=bd_new.uuid,
+    ...                           from_storage=True)
+    >>> print Diff(old, new).report_tree().report_string()
+    Modified bugs:
+      abc/b:om: Bug B
+        Changed bug settings:
+          status: closed -> open
+    >>> sorted(bug.uuid for bug in new)
+    ['b']
+    >>> bd_old.cleanup()
+    >>> bd_new.cleanup()
     """
     def __init__(self, old_bugdir, new_bugdir):
         self.old_bugdir = old_bugdir
@@ -389,7 +475,8 @@ class Diff (object):
         modified = []
         if hasattr(self.old_bugdir, 'changed'):
             # take advantage of a RevisionedBugDir-style changed() method
-            new_ids,mod_ids,rem_ids = self.old_bugdir.changed()
+            new_ids,mod_ids,rem_ids = self.old_bugdir.changed(
+                to_revision=getattr(self.new_bugdir, 'revision', None))
             for id in new_ids:
                 for a_id in self.new_bugdir.storage.ancestors(id):
                     if a_id.count('/') == 0:
@@ -422,7 +509,18 @@ class Diff (object):
                         except libbe.bugdir.NoBugMatches:
                             pass
         else:
+            digests = self._digests()
+            if digests != None and (
+                digests[0].bugdir_digest(self.old_bugdir.uuid) ==
+                digests[1].bugdir_digest(self.new_bugdir.uuid)):
+                new_uuids = old_uuids = [] # identical bugdirs
             for uuid in new_uuids:
+                if digests != None:
+                    old_digest = digests[0].bug_digest(
+                        self.old_bugdir.uuid, uuid)
+                    if old_digest != None and old_digest == \
+                            digests[1].bug_digest(self.new_bugdir.uuid, uuid):
+                        continue # identical bugs
                 new_bug = self.new_bugdir.bug_from_uuid(uuid)
                 try:
                     old_bug = self.old_bugdir.bug_from_uuid(uuid)
@@ -449,6 +547,21 @@ class Diff (object):
         removed.sort()
         modified.sort(self._bug_modified_cmp)
         return (added, modified, removed)
+    def _digests(self):
+        """Return (old, new) :py:class:`~libbe.digest.DigestIndex`\es
+        for the two bugdirs, or `None` if either bugdir's digests can't
+        be trusted.
+        """
+        if not hasattr(self, '_digest_indexes'):
+            old = libbe.digest.bugdir_index(self.old_bugdir)
+            new = None
+            if old != None:
+                new = libbe.digest.bugdir_index(self.new_bugdir)
+            if new == None:
+                self._digest_indexes = None
+            else:
+                self._digest_indexes = (old, new)
+        return self._digest_indexes
     def _bug_modified_cmp(self, left, right):
         return cmp(left[1], right[1])
     def _changed_comments(self, old, new):
@@ -536,36 +649,20 @@ class Diff (object):
         subscribed_bugs = [s.id for s in subscriptions
                            if BUG_TYPE_ALL.has_descendant( \
                                      s.type, match_self=True)]
-        selected_by_bug = [node.name
-                           for node in root.child_by_path('bugdir/bugs')]
-        if BUGDIR_TYPE_ALL in bugdir_types:
-            for node in root.traverse():
-                node.masked = False
-            selected_by_bug = []
-        else:
-            try:
-                node = root.child_by_path('bugdir/settings')
-                node.masked = True
-            except KeyError:
-                pass
+        try:
+            node = root.child_by_path('bugdir/settings')
+            node.masked = BUGDIR_TYPE_ALL not in bugdir_types
+        except KeyError:
+            pass
         for name,type in (('new', BUGDIR_TYPE_NEW),
                           ('mod', BUGDIR_TYPE_MOD),
                           ('rem', BUGDIR_TYPE_REM)):
-            if type in bugdir_types:
-                bugs = root.child_by_path('bugdir/bugs/%s' % name)
-                for bug_node in bugs:
-                    for node in bug_node.traverse():
-                        node.masked = False
-                selected_by_bug.remove(name)
-        for name in selected_by_bug:
-            bugs = root.child_by_path('bugdir/bugs/%s' % name)
-            for bug_node in bugs:
-                if bug_node.name in subscribed_bugs:
-                    for node in bug_node.traverse():
-                        node.masked = False
-                else:
-                    for node in bug_node.traverse():
-                        node.masked = True
+            whole = (BUGDIR_TYPE_ALL in bugdir_types or type in bugdir_types)
+            # masking a bug's node hides its whole subtree, so the
+            # subtrees of masked bugs are never generated.
+            for bug_node in root.child_by_path('bugdir/bugs/%s' % name):
+                bug_node.masked = not (whole
+                                       or bug_node.name in subscribed_bugs)
         return root
     def report_tree(self, subscriptions=None, diff_tree=DiffTree,
                     allow_cached=True):
@@ -573,6 +670,11 @@ class Diff (object):
         Pretty bare to make it easy to adjust to specific cases.  You
         can pass in a DiffTree subclass via diff_tree to override the
         default report assembly process.
+
+        The bug comparisons are only made when the report reaches
+        them: the changed bugs when the ``bugs`` node's children are
+        first needed, and the details of each modified bug when its
+        own children are.  Masked or unread subtrees cost nothing.
         """
         if allow_cached == True \
                 and hasattr(self, '_cached_full_report') \
@@ -590,8 +692,12 @@ class Diff (object):
                 bugdir = diff_tree('settings', bugdir_attribute_changes,
                                    self.bugdir_attribute_change_string)
                 root.append(bugdir)
-        bug_root = diff_tree('bugs')
+        bug_root = diff_tree(
+            'bugs', children_fn=lambda node : self._bugs_report_tree(
+                node, subscriptions, diff_tree))
         root.append(bug_root)
+        return root
+    def _bugs_report_tree(self, bug_root, subscriptions, diff_tree):
         add,mod,rem = self._changed_bugs(subscriptions)
         bnew = diff_tree('new', 'New bugs:', requires_children=True)
         bug_root.append(bnew)
@@ -606,43 +712,47 @@ class Diff (object):
         bmod = diff_tree('mod', 'Modified bugs:', requires_children=True)
         bug_root.append(bmod)
         for old,new in mod:
-            b = diff_tree(new.uuid, (old,new), self.bug_mod_string)
+            b = diff_tree(new.uuid, (old,new), self.bug_mod_string,
+                          children_fn=lambda node, old=old, new=new :
+                              self._bug_mod_report_tree(
+                                  node, old, new, diff_tree))
             bmod.append(b)
-            bug_attribute_changes = self._bug_attribute_changes(old, new)
-            if len(bug_attribute_changes) > 0:
-                bset = diff_tree('settings', bug_attribute_changes,
-                                 self.bug_attribute_change_string)
-                b.append(bset)
-            if old.summary != new.summary:
-                data = (old.summary, new.summary)
-                bsum = diff_tree('summary', data, self.bug_summary_change_string)
-                b.append(bsum)
-            cr = diff_tree('comments')
-            b.append(cr)
-            a,m,d = self._changed_comments(old, new)
-            cnew = diff_tree('new', 'New comments:', requires_children=True)
-            for comment in a:
-                c = diff_tree(comment.uuid, comment, self.comment_add_string)
-                cnew.append(c)
-            crem = diff_tree('rem', 'Removed comments:',requires_children=True)
-            for comment in d:
-                c = diff_tree(comment.uuid, comment, self.comment_rem_string)
-                crem.append(c)
-            cmod = diff_tree('mod','Modified comments:',requires_children=True)
-            for o,n in m:
-                c = diff_tree(n.uuid, (o,n), self.comment_mod_string)
-                cmod.append(c)
-                comm_attribute_changes = self._comment_attribute_changes(o, n)
-                if len(comm_attribute_changes) > 0:
-                    cset = diff_tree('settings', comm_attribute_changes,
-                                     self.comment_attribute_change_string)
-                if o.body != n.body:
-                    data = (o.body, n.body)
-                    cbody = diff_tree('cbody', data,
-                                      self.comment_body_change_string)
-                    c.append(cbody)
-            cr.extend([cnew, crem, cmod])
-        return root
+    def _bug_mod_report_tree(self, b, old, new, diff_tree):
+        bug_attribute_changes = self._bug_attribute_changes(old, new)
+        if len(bug_attribute_changes) > 0:
+            bset = diff_tree('settings', bug_attribute_changes,
+                             self.bug_attribute_change_string)
+            b.append(bset)
+        if old.summary != new.summary:
+            data = (old.summary, new.summary)
+            bsum = diff_tree('summary', data, self.bug_summary_change_string)
+            b.append(bsum)
+        cr = diff_tree('comments')
+        b.append(cr)
+        a,m,d = self._changed_comments(old, new)
+        cnew = diff_tree('new', 'New comments:', requires_children=True)
+        for comment in a:
+            c = diff_tree(comment.uuid, comment, self.comment_add_string)
+            cnew.append(c)
+        crem = diff_tree('rem', 'Removed comments:',requires_children=True)
+        for comment in d:
+            c = diff_tree(comment.uuid, comment, self.comment_rem_string)
+            crem.append(c)
+        cmod = diff_tree('mod','Modified comments:',requires_children=True)
+        for o,n in m:
+            c = diff_tree(n.uuid, (o,n), self.comment_mod_string)
+            cmod.append(c)
+            comm_attribute_changes = self._comment_attribute_changes(o, n)
+            if len(comm_attribute_changes) > 0:
+                cset = diff_tree('settings', comm_attribute_changes,
+                                 self.comment_attribute_change_string)
+                c.append(cset)
+            if o.body != n.body:
+                data = (o.body, n.body)
+                cbody = diff_tree('cbody', data,
+                                  self.comment_body_change_string)
+                c.append(cbody)
+        cr.extend([cnew, crem, cmod])
 
     # change data -> string methods.
     # Feel free to play with these in subclasses.
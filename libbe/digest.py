@@ -0,0 +1,270 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Content digests for bugdirs, bugs, and comments.
+
+Digests are Merkle-style: a comment's digest covers its stored
+settings and body, a bug's covers its settings and the digests of its
+comments, and a bugdir's covers its settings and the digests of its
+bugs.  Two bugs with the same digest are identical down to the last
+comment, so :py:class:`libbe.diff.Diff` and
+:py:meth:`libbe.bugdir.BugDir.merge` can skip them without loading
+either one.
+
+Digests are computed from the raw stored files.
+:py:class:`DigestIndex` keeps them in ``.be/index/digest/<BUGDIR>``,
+and only re-reads the comments and bugs whose files have changed.
+"""
+
+import hashlib
+import os.path
+
+import libbe
+import libbe.index
+import libbe.util.id
+if libbe.TESTING == True:
+    import doctest
+
+
+def _digest(*parts):
+    parts = [p.encode('utf-8') if isinstance(p, unicode) else p
+             for p in parts]
+    return hashlib.sha1('\0'.join(parts)).hexdigest()
+
+def _children_part(digests):
+    return ''.join(['%s %s\n' % (uuid, digests[uuid])
+                    for uuid in sorted(digests)])
+
+def comment_digest(storage, uuid):
+    """Return the digest of the stored comment `uuid`."""
+    return _digest(storage.get('%s/values' % uuid, default=''),
+                   storage.get('%s/body' % uuid, default=''))
+
+
+class DigestIndex (libbe.index.BugIndex):
+    """Digests for every bug (and comment) in `bugdirs`.
+
+    >>> import libbe.bugdir
+    >>> import libbe.util.utility
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False, versioned=True)
+    >>> dir = libbe.util.utility.Dir()
+    >>> a = bd.bug_from_uuid('a')
+    >>> comment = a.comment_root.new_reply(u'Hello')
+    >>> revision = bd.storage.commit('Add a comment')
+    >>> index = DigestIndex({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/a', 'abc123/b']
+    >>> digest_a = index.bug_digest('abc123', 'a')
+    >>> digest_bd = index.bugdir_digest('abc123')
+    >>> index.comment_digests('abc123', 'a').keys() == [comment.uuid]
+    True
+
+    A changed comment changes the digests of its bug and bugdir, but
+    only that bug is re-read.
+
+    >>> comment.body = u'Goodbye'
+    >>> index = DigestIndex({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/a']
+    >>> index.bug_digest('abc123', 'a') == digest_a
+    False
+    >>> index.bugdir_digest('abc123') == digest_bd
+    False
+
+    Identical content has identical digests.
+
+    >>> comment.body = u'Hello'
+    >>> index.update()
+    >>> index.bug_digest('abc123', 'a') == digest_a
+    True
+    >>> index.bugdir_digest('abc123') == digest_bd
+    True
+    >>> print index.bug_digest('abc123', 'x')
+    None
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'digest'
+
+    def __init__(self, *args, **kwargs):
+        libbe.index.BugIndex.__init__(self, *args, **kwargs)
+        # bug key -> (bug digest, {comment uuid: comment digest})
+        self._bugs = None
+        self._comments = None # comment uuid -> bug key
+
+    def _save_files(self):
+        self._save_file('bugs', self._get_bugs())
+
+    def _get_bugs(self):
+        if self._bugs == None:
+            self._bugs = self._load_file('bugs', {})
+        return self._bugs
+
+    def _clear(self):
+        self._bugs = {}
+        self._comments = None
+        self._dirty.add('bugs')
+
+    def _index_bug(self, bugdir, bug):
+        self._index_uuid(bugdir.uuid, bug.uuid)
+
+    def _index_uuid(self, bugdir_uuid, uuid, old=None):
+        """Index the bug `uuid`, reusing the comment digests from its
+        `old` index entry for comments whose files have not changed.
+        """
+        comments = {}
+        for comment_uuid in libbe.util.id.child_uuids(
+                self.storage.children(uuid)):
+            if old != None and comment_uuid in old[1] \
+                    and comment_uuid not in self.changed:
+                comments[comment_uuid] = old[1][comment_uuid]
+            else:
+                comments[comment_uuid] = comment_digest(
+                    self.storage, comment_uuid)
+        key = '%s/%s' % (bugdir_uuid, uuid)
+        self._get_bugs()[key] = (
+            _digest(self.storage.get('%s/values' % uuid, default=''),
+                    _children_part(comments)),
+            comments)
+        self._comments = None
+        self._dirty.add('bugs')
+
+    def _remove_bug(self, key):
+        if self._get_bugs().pop(key, None) != None:
+            self._comments = None
+            self._dirty.add('bugs')
+
+    def _indexed_bugs(self):
+        return self._get_bugs().keys()
+
+    def _indexed_comment(self, uuid):
+        if self._comments == None:
+            self._comments = {}
+            for key,(digest,comments) in self._get_bugs().items():
+                for comment_uuid in comments:
+                    self._comments[comment_uuid] = key
+        return self._comments.get(uuid, None)
+
+    def _reindex_bug(self, key):
+        old = self._get_bugs().get(key, None)
+        self._remove_bug(key)
+        bugdir_uuid,uuid = key.split('/', 1)
+        if self.bugdirs[bugdir_uuid].has_bug(uuid):
+            self._index_uuid(bugdir_uuid, uuid, old)
+        self.reindexed.add(key)
+
+    def rebuild(self):
+        """Index every bug from scratch, without loading any."""
+        self._meta = self._new_meta()
+        self._clear()
+        for bugdir in self.bugdirs.values():
+            for uuid in sorted(bugdir.uuids()):
+                self._index_uuid(bugdir.uuid, uuid)
+                self.reindexed.add('%s/%s' % (bugdir.uuid, uuid))
+
+    def bug_digest(self, bugdir_uuid, uuid):
+        """Return the digest of a bug, or `None` if it is not indexed."""
+        entry = self._get_bugs().get('%s/%s' % (bugdir_uuid, uuid), None)
+        if entry == None:
+            return None
+        return entry[0]
+
+    def comment_digests(self, bugdir_uuid, uuid):
+        """Return a ``{comment uuid: digest}`` dict for a bug's
+        comments.
+        """
+        entry = self._get_bugs().get('%s/%s' % (bugdir_uuid, uuid), None)
+        if entry == None:
+            return {}
+        return dict(entry[1])
+
+    def bugdir_digest(self, bugdir_uuid):
+        """Return the digest of a bugdir's settings and all its bugs."""
+        prefix = '%s/' % bugdir_uuid
+        bugs = dict([(key[len(prefix):], digest)
+                     for key,(digest,comments) in self._get_bugs().items()
+                     if key.startswith(prefix)])
+        return _digest(
+            self.storage.get('%s/settings' % bugdir_uuid, default=''),
+            _children_part(bugs))
+
+
+def _trusted(bugdir):
+    storage = bugdir.storage
+    return (storage != None and storage.is_readable()
+            and storage.is_writeable())
+
+def bugdir_index(bugdir):
+    """Return an up-to-date :py:class:`DigestIndex` for `bugdir`.
+
+    Digests are computed from stored files, so they are only trusted
+    for bugdirs whose changes are written to their storage as they
+    happen (i.e. with readable and writeable storage).  For other
+    bugdirs, return `None`.
+    """
+    if not _trusted(bugdir):
+        return None
+    storage = bugdir.storage
+    path = libbe.index.index_path(storage, DigestIndex.name)
+    if path != None:
+        path = os.path.join(path, bugdir.uuid)
+    index = DigestIndex({bugdir.uuid: bugdir}, storage, path=path)
+    try:
+        index.update()
+    except (IOError, OSError), e:
+        libbe.LOG.warning('could not save digest index: %s' % e)
+    return index
+
+def identical_bugs(bugdir_a, bugdir_b):
+    """Return the set of UUIDs of bugs that are identical (down to
+    their comments) in `bugdir_a` and `bugdir_b`.
+
+    The set is empty if either bugdir's digests can't be trusted (see
+    :py:func:`bugdir_index`).
+
+    >>> import libbe.bugdir
+    >>> bd_a = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> bd_b = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> b = bd_b.bug_from_uuid('b')
+    >>> b.status = 'open'
+    >>> sorted(identical_bugs(bd_a, bd_b))
+    ['a']
+    >>> bd_b.storage.writeable = False
+    >>> identical_bugs(bd_a, bd_b)
+    set([])
+    >>> bd_a.cleanup()
+    >>> bd_b.cleanup()
+    """
+    if not (_trusted(bugdir_a) and _trusted(bugdir_b)):
+        return set()
+    index_a = bugdir_index(bugdir_a)
+    index_b = bugdir_index(bugdir_b)
+    prefix_a = '%s/' % bugdir_a.uuid
+    same = set()
+    for key in index_a._indexed_bugs():
+        if key.startswith(prefix_a):
+            uuid = key[len(prefix_a):]
+            digest = index_a.bug_digest(bugdir_a.uuid, uuid)
+            if digest == index_b.bug_digest(bugdir_b.uuid, uuid):
+                same.add(uuid)
+    return same
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite()
@@ -0,0 +1,432 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Near-duplicate bug detection.
+
+Each bug's summary and body (its first comment) are reduced to a
+MinHash signature, which estimates the Jaccard similarity between the
+word shingles of two bugs.  :py:class:`DuplicateIndex` keeps the
+signatures and their locality-sensitive hashing (LSH) buckets in
+``.be/index/duplicates``, so finding the candidate duplicates of a
+bug only reads the buckets for that bug's signature rather than
+comparing it with every other bug.
+"""
+
+import bisect
+import random
+import zlib
+
+import libbe
+import libbe.index
+from libbe.index import pack, unpack
+from libbe.search import tokenize
+if libbe.TESTING == True:
+    import doctest
+
+
+SHARDS = 64
+
+# Signatures are split into BANDS bands of ROWS rows, and two bugs
+# become candidates if any band matches.  The chance of that is
+# 1-(1-s**ROWS)**BANDS for bugs with similarity s: about 93% for
+# s=0.5, 42% for s=0.3, and 15% for s=0.2.
+BANDS = 20
+ROWS = 3
+NUM_HASHES = BANDS * ROWS
+# A Mersenne prime, and shingles are hashed to 31 bits, so the MinHash
+# permutations (a*x + b) % PRIME never leave machine-sized integers.
+PRIME = 2**31 - 1
+
+DEFAULT_THRESHOLD = 0.5
+
+_random = random.Random(1) # fixed, so signatures are stable
+HASH_PARAMETERS = [(_random.randint(1, PRIME-1), _random.randint(0, PRIME-1))
+                   for i in range(NUM_HASHES)]
+del _random
+
+
+def shingles(text):
+    """Return the set of hashed words and word pairs in `text`.
+
+    >>> len(shingles(u'Crash on startup'))
+    5
+    >>> shingles(u'crash, crash') == shingles(u'Crash crash crash')
+    True
+    """
+    tokens = tokenize(text)
+    words = set(tokens)
+    words.update([u'%s %s' % pair for pair in zip(tokens, tokens[1:])])
+    return set([zlib.crc32(word.encode('utf-8')) & 0x7fffffff
+                for word in words])
+
+def signature(text):
+    """Return the MinHash signature of `text`, or `None` if `text`
+    contains no words.
+
+    >>> sig = signature(u'Crash on startup')
+    >>> len(sig) == NUM_HASHES
+    True
+    >>> sig == signature(u'crash on STARTUP!')
+    True
+    >>> print signature(u'...')
+    None
+    """
+    values = shingles(text)
+    if len(values) == 0:
+        return None
+    sig = unpack()
+    for a,b in HASH_PARAMETERS:
+        sig.append(min([(a*x + b) % PRIME for x in values]))
+    return sig
+
+def similarity(signature_1, signature_2):
+    """Estimate the Jaccard similarity of two signatures' texts.
+
+    >>> similarity(signature(u'a b c d'), signature(u'a b c d'))
+    1.0
+    >>> s = similarity(signature(u'xml export crashes on large bugdirs'),
+    ...                signature(u'xml export crashes on huge bugdirs'))
+    >>> 0.2 < s < 0.8
+    True
+    """
+    same = len([1 for x,y in zip(signature_1, signature_2) if x == y])
+    return same / float(NUM_HASHES)
+
+def buckets(signature):
+    """Return the LSH bucket ids for `signature`, one per band."""
+    ids = []
+    for band in range(BANDS):
+        rows = pack(signature[band*ROWS:(band+1)*ROWS])
+        ids.append(zlib.crc32(chr(band) + rows) & 0xffffffff)
+    return ids
+
+def first_comment(bug):
+    """Return the earliest top-level comment on `bug` (its body), or
+    `None`.
+    """
+    comments = list(bug.comment_root)
+    if len(comments) == 0:
+        return None
+    return min(comments, key=lambda c: (c.time, c.uuid))
+
+def bug_signatures(bug):
+    """Return the signatures compared for `bug`: one for its summary
+    and, if it has a text body, one for the summary and body together.
+
+    A new bug often has nothing but a summary, and comparing that with
+    the full text of a well-described bug would swamp the summary, so
+    bugs are compared on whichever signatures are most similar.
+    """
+    sigs = []
+    sig = signature(bug.summary)
+    if sig != None:
+        sigs.append(sig)
+    comment = first_comment(bug)
+    if comment != None and comment.content_type.startswith('text/') \
+            and comment.body:
+        sig = signature(u'%s\n%s' % (bug.summary or u'', comment.body))
+        if sig != None:
+            sigs.append(sig)
+    return sigs
+
+def best_similarity(signatures_1, signatures_2):
+    """Return the largest :py:func:`similarity` between any pair of
+    signatures from the two lists (0 if either is empty).
+    """
+    best = 0.0
+    for sig_1 in signatures_1:
+        for sig_2 in signatures_2:
+            best = max(best, similarity(sig_1, sig_2))
+    return best
+
+
+def _pack_buckets(buckets):
+    """Pack a ``{bucket id: [bug keys]}`` dict into sorted bucket
+    ids, offsets, and the newline-separated keys of each bucket.
+
+    >>> packed = _pack_buckets({7: ['a/x', 'a/y'], 3: ['a/z']})
+    >>> sorted(_unpack_buckets([unpack(packed[0]), unpack(packed[1]),
+    ...                         packed[2]]))
+    [(3L, ['a/z']), (7L, ['a/x', 'a/y'])]
+    """
+    ids = unpack()
+    offsets = unpack()
+    keys = []
+    start = 0
+    for bucket in sorted(buckets):
+        ids.append(bucket)
+        offsets.append(start)
+        keys.append('\n'.join(buckets[bucket]))
+        start += len(keys[-1]) + 1
+    offsets.append(start)
+    return (pack(ids), pack(offsets), '\n'.join(keys))
+
+def _unpack_buckets(packed):
+    """Iterate through ``(bucket id, [bug keys])`` pairs in a loaded
+    :py:func:`_pack_buckets` shard.
+    """
+    ids,offsets,keys = packed
+    for j,bucket in enumerate(ids):
+        yield (bucket, keys[offsets[j]:offsets[j+1]-1].split('\n'))
+
+
+class DuplicateIndex (libbe.index.BugIndex):
+    """MinHash signatures and LSH buckets for every bug in `bugdirs`.
+
+    Signatures are sharded by bug key and buckets by bucket id, so
+    looking up the candidates for a bug only loads the bucket shards
+    its signatures hash to, and then the signature shards of the
+    candidates themselves.
+
+    >>> import libbe.bugdir
+    >>> import libbe.util.utility
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False, versioned=True)
+    >>> dir = libbe.util.utility.Dir()
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.summary = u'XML export crashes on large bugdirs'
+    >>> c = a.new_comment(u'Running be list --xml on 5000 bugs dies.')
+    >>> b = bd.bug_from_uuid('b')
+    >>> b.summary = u'Crash in XML export on large bugdirs'
+    >>> c = b.new_comment(u'be list --xml dies with 5000 bugs.')
+    >>> revision = bd.storage.commit('Describe the bugs')
+    >>> index = DuplicateIndex({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> [key for s,key in index.duplicates('abc123/a')]
+    ['abc123/b']
+    >>> [(key_1, key_2) for s,key_1,key_2 in index.pairs()]
+    [('abc123/a', 'abc123/b')]
+    >>> [key for s,key in index.similar(
+    ...         [signature(u'The XML export crashes on large bugdirs')])]
+    ['abc123/a', 'abc123/b']
+    >>> index.similar([signature(u'Segfault when starting the GUI')])
+    []
+
+    Later updates only re-index the bugs that changed.
+
+    >>> index = DuplicateIndex({bd.uuid: bd}, path=dir.path)
+    >>> b.summary = u'Segfault when starting the GUI'
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/b']
+    >>> [key for s,key in index.similar([signature(b.summary)])]
+    ['abc123/b']
+    >>> index.pairs()
+    []
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'duplicates'
+
+    def __init__(self, *args, **kwargs):
+        libbe.index.BugIndex.__init__(self, *args, **kwargs)
+        self._bugs = None # bug key -> first comment uuid (or None)
+        self._comments = None # first comment uuid -> bug key
+        self._signatures = {} # shard -> {bug key: [signatures]}
+        self._buckets = {} # shard -> {bucket id: [bug keys]} (or packed)
+
+    # on-disk format
+
+    def _save_files(self):
+        for name in sorted(self._dirty):
+            if name.startswith('signatures-'):
+                shard = self._signatures[int(name[len('signatures-'):])]
+                self._save_file(name, dict(
+                        [(key, tuple([pack(sig) for sig in sigs]))
+                         for key,sigs in shard.items()]))
+            elif name.startswith('buckets-'):
+                shard = self._bucket_shard(
+                    int(name[len('buckets-'):]), modify=True)[1]
+                self._save_file(name, _pack_buckets(shard))
+        if 'bugs' in self._dirty:
+            self._save_file('bugs', self._get_bugs())
+
+    def _get_bugs(self):
+        if self._bugs == None:
+            self._bugs = self._load_file('bugs', {})
+        return self._bugs
+
+    def _signature_shard(self, key):
+        i = zlib.crc32(key) % SHARDS
+        if i not in self._signatures:
+            self._signatures[i] = self._load_file('signatures-%02d' % i, {})
+        return (i, self._signatures[i])
+
+    def _bucket_shard(self, bucket, modify=False):
+        """Return the shard holding `bucket`.
+
+        Shards are loaded in their packed form, which is much faster
+        to load and search.  Set `modify` to get a ``{bucket id: [bug
+        keys]}`` dict instead.
+        """
+        i = bucket % SHARDS
+        if i not in self._buckets:
+            shard = self._load_file('buckets-%02d' % i, ('', '', ''))
+            ids,offsets,keys = shard
+            self._buckets[i] = (unpack(ids), unpack(offsets), keys)
+        shard = self._buckets[i]
+        if modify == True and isinstance(shard, tuple):
+            shard = self._buckets[i] = dict(_unpack_buckets(shard))
+        return (i, shard)
+
+    def _bucket_keys(self, bucket):
+        i,shard = self._bucket_shard(bucket)
+        if not isinstance(shard, tuple):
+            return shard.get(bucket, [])
+        ids,offsets,keys = shard
+        j = bisect.bisect_left(ids, bucket)
+        if j == len(ids) or ids[j] != bucket:
+            return []
+        return keys[offsets[j]:offsets[j+1]-1].split('\n')
+
+    def signatures(self, key):
+        """Return the signatures of the indexed bug `key`."""
+        i,shard = self._signature_shard(key)
+        sigs = shard.get(key, [])
+        if isinstance(sigs, tuple):
+            sigs = shard[key] = [unpack(sig) for sig in sigs]
+        return sigs
+
+    def _bucket_ids(self, signatures):
+        ids = set()
+        for sig in signatures:
+            ids.update(buckets(sig))
+        return ids
+
+    # maintenance
+
+    def _clear(self):
+        self._bugs = {}
+        self._comments = None
+        self._signatures = dict([(i, {}) for i in range(SHARDS)])
+        self._buckets = dict([(i, {}) for i in range(SHARDS)])
+        self._dirty = set(['bugs'] +
+                          ['signatures-%02d' % i for i in range(SHARDS)] +
+                          ['buckets-%02d' % i for i in range(SHARDS)])
+
+    def _index_bug(self, bugdir, bug):
+        key = '%s/%s' % (bugdir.uuid, bug.uuid)
+        comment = first_comment(bug)
+        if comment == None:
+            self._get_bugs()[key] = None
+        else:
+            self._get_bugs()[key] = comment.uuid
+            if self._comments != None:
+                self._comments[comment.uuid] = key
+        self._dirty.add('bugs')
+        sigs = bug_signatures(bug)
+        if len(sigs) == 0:
+            return
+        i,shard = self._signature_shard(key)
+        shard[key] = sigs
+        self._dirty.add('signatures-%02d' % i)
+        for bucket in self._bucket_ids(sigs):
+            i,shard = self._bucket_shard(bucket, modify=True)
+            shard.setdefault(bucket, []).append(key)
+            self._dirty.add('buckets-%02d' % i)
+
+    def _remove_bug(self, key):
+        first = self._get_bugs().pop(key, None)
+        if self._comments != None and first != None:
+            self._comments.pop(first, None)
+        self._dirty.add('bugs')
+        sigs = self.signatures(key)
+        if len(sigs) == 0:
+            return
+        i,shard = self._signature_shard(key)
+        del shard[key]
+        self._dirty.add('signatures-%02d' % i)
+        for bucket in self._bucket_ids(sigs):
+            i,shard = self._bucket_shard(bucket, modify=True)
+            keys = shard.get(bucket, [])
+            if key in keys:
+                keys.remove(key)
+                if len(keys) == 0:
+                    del shard[bucket]
+                self._dirty.add('buckets-%02d' % i)
+
+    def _indexed_bugs(self):
+        return self._get_bugs().keys()
+
+    def _indexed_comment(self, uuid):
+        if self._comments == None:
+            self._comments = dict(
+                [(first, key) for key,first in self._get_bugs().items()
+                 if first != None])
+        return self._comments.get(uuid, None)
+
+    # queries
+
+    def candidates(self, signatures):
+        """Return the keys of bugs sharing an LSH bucket with any of
+        `signatures`.
+        """
+        keys = set()
+        for bucket in self._bucket_ids(signatures):
+            keys.update(self._bucket_keys(bucket))
+        return keys
+
+    def similar(self, signatures, threshold=DEFAULT_THRESHOLD, exclude=[]):
+        """Return ``(similarity, key)`` pairs for the bugs whose
+        :py:func:`best_similarity` to `signatures` is at least
+        `threshold`, most similar first.
+        """
+        results = []
+        for key in self.candidates(signatures):
+            if key in exclude:
+                continue
+            s = best_similarity(signatures, self.signatures(key))
+            if s >= threshold:
+                results.append((s, key))
+        results.sort(key=lambda (s,key): (-s, key))
+        return results
+
+    def duplicates(self, key, threshold=DEFAULT_THRESHOLD):
+        """Return the likely duplicates of the indexed bug `key`, as
+        for :py:meth:`similar`.
+        """
+        return self.similar(self.signatures(key), threshold, exclude=[key])
+
+    def pairs(self, threshold=DEFAULT_THRESHOLD):
+        """Return ``(similarity, key_1, key_2)`` for every pair of
+        likely duplicates, most similar first.
+
+        Only bugs that share a bucket are compared.
+        """
+        candidates = set()
+        for i in range(SHARDS):
+            i,shard = self._bucket_shard(i)
+            if isinstance(shard, tuple):
+                shard = dict(_unpack_buckets(shard))
+            for keys in shard.values():
+                if len(keys) < 2:
+                    continue
+                keys = sorted(keys)
+                for j,key_1 in enumerate(keys):
+                    for key_2 in keys[j+1:]:
+                        candidates.add((key_1, key_2))
+        results = []
+        for key_1,key_2 in candidates:
+            s = best_similarity(self.signatures(key_1),
+                                self.signatures(key_2))
+            if s >= threshold:
+                results.append((s, key_1, key_2))
+        results.sort(key=lambda (s,key_1,key_2): (-s, key_1, key_2))
+        return results
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite()
@@ -0,0 +1,212 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Change timelines for single bugs.
+
+:py:class:`BugHistory` reads a bug's files as of every revision that
+changed them with one
+:py:meth:`~libbe.storage.base.VersionedStorage.history` call, rather
+than loading a :py:class:`~libbe.bugdir.RevisionedBugDir` for each
+revision.  The results are cached in ``.be/index/log/<BUG>``, so
+later updates only read the revisions committed since.
+"""
+
+import os
+import os.path
+
+import libbe
+import libbe.index
+import libbe.storage
+from libbe.storage.util import mapfile
+if libbe.TESTING == True:
+    import doctest
+
+
+def _settings(contents):
+    if contents == None or len(contents) == 0:
+        return {}
+    try:
+        return mapfile.parse(contents)
+    except mapfile.InvalidMapfileContents:
+        return {}
+
+def setting_changes(old, new):
+    """Return ``name: old -> new`` strings for the settings that
+    differ between the mapfile contents `old` and `new`.
+
+    >>> old = mapfile.generate({'status':'open', 'severity':'minor'})
+    >>> new = mapfile.generate({'status':'closed', 'severity':'minor',
+    ...                         'assigned':'Jane'})
+    >>> setting_changes(old, new)
+    [u'assigned: None -> Jane', u'status: open -> closed']
+    """
+    old = _settings(old)
+    new = _settings(new)
+    return [u'%s: %s -> %s' % (name, old.get(name), new.get(name))
+            for name in sorted(set(old.keys() + new.keys()))
+            if old.get(name) != new.get(name)]
+
+
+class BugHistory (object):
+    """The committed history of bug `uuid` in `storage`.
+
+    >>> import libbe.bugdir
+    >>> import libbe.util.utility
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False, versioned=True)
+    >>> dir = libbe.util.utility.Dir()
+    >>> revision = bd.storage.commit('Initial state')
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.status = 'closed'
+    >>> comment = a.comment_root.new_reply(u'Fixed')
+    >>> revision = bd.storage.commit('Close bug a')
+    >>> b = bd.bug_from_uuid('b')
+    >>> b.status = 'open'
+    >>> revision = bd.storage.commit('Reopen bug b')
+    >>> history = BugHistory(bd.storage, 'a', path=dir.path)
+    >>> history.update()
+    >>> history.processed
+    2
+    >>> for revision,summary,changes in history.timeline():
+    ...     print revision, summary
+    ...     for change in changes:
+    ...         print ' ', change # doctest: +ELLIPSIS
+    1 Initial state
+      created bug
+      creator: None -> John Doe <jdoe@example.com>
+      severity: None -> minor
+      status: None -> open
+      summary: None -> Bug A
+      time: None -> Thu, 01 Jan 1970 00:00:00 +0000
+    2 Close bug a
+      status: open -> closed
+      new comment ...
+
+    Later updates only read the new revisions.
+
+    >>> a.assigned = 'Jane Doe <jdoe@example.com>'
+    >>> revision = bd.storage.commit('Assign bug a')
+    >>> history = BugHistory(bd.storage, 'a', path=dir.path)
+    >>> history.update()
+    >>> history.processed
+    1
+    >>> print history.timeline()[-1][2]
+    [u'assigned: None -> Jane Doe <jdoe@example.com>']
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'log'
+    version = 1
+
+    def __init__(self, storage, uuid, path=None):
+        self.storage = storage
+        self.uuid = uuid
+        if path == None:
+            path = libbe.index.index_path(storage, self.name)
+        if path != None:
+            path = os.path.join(path, uuid)
+        self.path = path
+        self.revisions = [] # (revision, summary, {id: contents}) tuples
+        self.processed = 0 # revisions read by the last update()
+
+    def _load(self):
+        if self.path == None:
+            return None
+        cache = libbe.index.load_file(self.path)
+        if not isinstance(cache, dict) \
+                or cache.get('version', None) != self.version:
+            return None
+        return cache
+
+    def _save(self, revision):
+        if self.path == None:
+            return
+        dirname = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            libbe.index.save_file(
+                self.path, {'version':self.version, 'revision':revision,
+                            'revisions':self.revisions})
+        except (IOError, OSError), e:
+            libbe.LOG.warning('could not save bug history: %s' % e)
+
+    def update(self):
+        """Read the revisions committed since the last update (or
+        since the beginning, if there is no usable cache).
+        """
+        current = self.storage.revision_id(-1)
+        cache = self._load()
+        since = None
+        self.revisions = []
+        if cache != None:
+            since = cache['revision']
+            self.revisions = list(cache['revisions'])
+        self.processed = 0
+        if current == None or current == since:
+            return
+        try:
+            new = self.storage.history(self.uuid, since=since)
+        except libbe.storage.InvalidRevision:
+            # e.g. rewritten history; start over
+            self.revisions = []
+            new = self.storage.history(self.uuid)
+        seen = set([r[0] for r in self.revisions])
+        new = [r for r in new if r[0] not in seen]
+        self.revisions.extend(new)
+        self.processed = len(new)
+        self._save(current)
+
+    def timeline(self):
+        """Return a list of `(revision, summary, changes)` tuples,
+        oldest first, where `changes` is a list of strings describing
+        how that revision changed the bug.
+        """
+        values_id = '%s/values' % self.uuid
+        files = {} # id -> contents as of the last revision
+        timeline = []
+        for revision,summary,changed in self.revisions:
+            changes = []
+            if values_id in changed:
+                old = files.get(values_id, None)
+                new = changed[values_id]
+                if old == None and new != None:
+                    changes.append(u'created bug')
+                elif new == None:
+                    changes.append(u'removed bug')
+                changes.extend(setting_changes(old, new))
+            comments = sorted(set([id.split('/', 1)[0] for id in changed
+                                   if id != values_id and '/' in id]))
+            for comment in comments:
+                ids = ['%s/values' % comment, '%s/body' % comment]
+                existed = len([id for id in ids
+                               if files.get(id, None) != None]) > 0
+                exists = len([id for id in ids if changed.get(
+                            id, files.get(id, None)) != None]) > 0
+                if exists and not existed:
+                    changes.append(u'new comment %s' % comment)
+                elif existed and not exists:
+                    changes.append(u'removed comment %s' % comment)
+                elif exists:
+                    changes.append(u'changed comment %s' % comment)
+            files.update(changed)
+            if len(changes) > 0:
+                timeline.append((revision, summary.strip(), changes))
+        return timeline
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite()
@@ -0,0 +1,296 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""On-disk bug indexes that are updated incrementally.
+
+:py:class:`BugIndex` handles the bookkeeping shared by
+:py:class:`libbe.search.SearchIndex` and
+:py:class:`libbe.duplicates.DuplicateIndex`: where the index lives
+(``.be/index/<name>`` on VCS storage), saving it safely, and working
+out which bugs need re-indexing from
+:py:meth:`~libbe.storage.base.VersionedStorage.changed`.
+"""
+
+import array
+import marshal
+import os
+import os.path
+
+import libbe
+if libbe.TESTING == True:
+    import doctest
+
+
+INDEX_DIR = 'index'
+
+
+def index_path(storage, name):
+    """Return the on-disk directory for index `name`, or `None` if
+    `storage` has nowhere to keep one.
+    """
+    be_dir = getattr(storage, 'be_dir', None)
+    if be_dir == None:
+        return None
+    return os.path.join(be_dir, INDEX_DIR, name)
+
+def unpack(string=''):
+    """Return an unsigned integer array from a :py:func:`pack`\ed
+    string.
+
+    >>> unpack(pack(array.array('I', [1, 2, 3])))
+    array('I', [1L, 2L, 3L])
+    """
+    a = array.array('I')
+    a.fromstring(string)
+    return a
+
+def pack(a):
+    if isinstance(a, str):
+        return a # never unpacked
+    return a.tostring()
+
+def load_file(path, default=None):
+    """Return the marshalled data in `path`, or `default` if it is
+    missing or unreadable.
+    """
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return default
+    try:
+        try:
+            return marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            return default
+    finally:
+        f.close()
+
+def save_file(path, data):
+    """Marshal `data` into `path`, replacing it in a single rename."""
+    f = open(path + '.tmp', 'wb')
+    try:
+        marshal.dump(data, f)
+    finally:
+        f.close()
+    if os.path.exists(path):
+        os.remove(path) # os.rename does not overwrite on Windows
+    os.rename(path + '.tmp', path)
+
+def _revision(storage):
+    if storage == None or getattr(storage, 'versioned', False) != True:
+        return None
+    try:
+        return storage.revision_id(-1)
+    except (KeyError, NotImplementedError):
+        return None
+
+def _changed_uuids(storage, revision):
+    new,mod,rem = storage.changed(revision)
+    return set([id.split('/', 1)[0] for id in new+mod+rem])
+
+
+class BugIndex (object):
+    """Base class for incrementally updated, per-bug indexes over
+    `bugdirs` (a ``{uuid: BugDir}`` dict).
+
+    Bugs are identified by ``BUGDIR/BUG`` keys.  Subclasses set
+    :py:attr:`name` and :py:attr:`version`, keep their data in
+    marshalled files (marking changed ones in :py:attr:`_dirty`), and
+    implement :py:meth:`_clear`, :py:meth:`_index_bug`,
+    :py:meth:`_remove_bug`, :py:meth:`_indexed_bugs` and
+    :py:meth:`_save_files`.
+    """
+    name = None
+    version = 1
+
+    def __init__(self, bugdirs, storage=None, path=None):
+        self.bugdirs = bugdirs
+        if storage == None and len(bugdirs) > 0:
+            storage = bugdirs.values()[0].storage
+        self.storage = storage
+        if path == None:
+            path = index_path(storage, self.name)
+        self.path = path
+        self.reindexed = set() # bug keys re-indexed by the last update
+        self.changed = set() # UUIDs with changed files in the last update
+        self._meta = None
+        self._dirty = set() # files that need saving
+
+    # on-disk format
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load_file(self, name, default=None):
+        if self.path == None:
+            return default
+        return load_file(self._file(name), default)
+
+    def _save_file(self, name, data):
+        save_file(self._file(name), data)
+
+    def _load_meta(self):
+        return self._load_file('meta')
+
+    def _dump_meta(self):
+        return self._meta
+
+    def _save_files(self):
+        """Write the dirty files other than ``meta``."""
+        raise NotImplementedError
+
+    def save(self):
+        """Write any changes to disk.
+
+        The ``meta`` file is removed first and written last, so an
+        interrupted save forces a rebuild rather than leaving a
+        half-written index.
+        """
+        if self.path == None or len(self._dirty) == 0:
+            return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        if os.path.exists(self._file('meta')):
+            os.remove(self._file('meta'))
+        self._save_files()
+        self._save_file('meta', self._dump_meta())
+        self._dirty.clear()
+
+    # maintenance
+
+    def _new_meta(self):
+        return {'version':self.version, 'revision':None, 'dirty':[],
+                'bugdirs':sorted(self.bugdirs.keys())}
+
+    def _clear(self):
+        """Reset to an empty index (marking every file dirty)."""
+        raise NotImplementedError
+
+    def _index_bug(self, bugdir, bug):
+        raise NotImplementedError
+
+    def _remove_bug(self, key):
+        raise NotImplementedError
+
+    def _indexed_bugs(self):
+        """Return the keys of the indexed bugs."""
+        raise NotImplementedError
+
+    def _indexed_comment(self, uuid):
+        """Return the key of the bug owning indexed comment `uuid`, or
+        `None`.  Used to notice removed comments.
+        """
+        return None
+
+    def _usable(self, meta):
+        """Return `True` if `meta` describes an index that can be
+        updated incrementally.
+        """
+        return (meta != None
+                and meta.get('version', None) == self.version
+                and meta['revision'] != None
+                and meta['bugdirs'] == sorted(self.bugdirs.keys()))
+
+    def _bug_key(self, uuid, bug_keys):
+        """Return the key of the bug `uuid` belongs to, or `None`."""
+        if uuid in bug_keys:
+            return bug_keys[uuid]
+        key = self._indexed_comment(uuid)
+        if key != None:
+            return key
+        if uuid in self.bugdirs:
+            return None
+        for uuid in [uuid] + self._ancestors(uuid):
+            for bugdir in self.bugdirs.values():
+                if bugdir.has_bug(uuid):
+                    return '%s/%s' % (bugdir.uuid, uuid)
+        return None
+
+    def _ancestors(self, uuid):
+        try:
+            return self.storage.ancestors(uuid)
+        except KeyError: # removed entries have no ancestors
+            return []
+
+    def _reindex_bug(self, key):
+        self._remove_bug(key)
+        bugdir_uuid,bug_uuid = key.split('/', 1)
+        bugdir = self.bugdirs[bugdir_uuid]
+        if bugdir.has_bug(bug_uuid):
+            self._index_bug(bugdir, bugdir.bug_from_uuid(bug_uuid))
+        self.reindexed.add(key)
+
+    def rebuild(self):
+        """Index every bug from scratch."""
+        self._meta = self._new_meta()
+        self._clear()
+        for bugdir in self.bugdirs.values():
+            for uuid in sorted(bugdir.uuids()):
+                self._index_bug(bugdir, bugdir.bug_from_uuid(uuid))
+                self.reindexed.add('%s/%s' % (bugdir.uuid, uuid))
+
+    def update(self, rebuild=False):
+        """Bring the index up to date with the storage and save it.
+
+        Without a versioned storage there is no way to tell what has
+        changed, so the index is rebuilt (in memory only) every time.
+        """
+        self.reindexed = set()
+        self.changed = set()
+        revision = _revision(self.storage)
+        if self._meta == None:
+            self._meta = self._load_meta()
+        meta = self._meta
+        changed = None
+        if rebuild == False and revision != None and self._usable(meta):
+            try:
+                changed = _changed_uuids(self.storage, meta['revision'])
+            except (KeyError, NotImplementedError):
+                pass # e.g. the old revision no longer exists
+        if changed == None:
+            self.rebuild()
+        else:
+            # uncommitted changes from last time are re-indexed too,
+            # in case they have since been reverted.
+            uuids = changed.union(meta['dirty'])
+            self.changed = uuids
+            if len(uuids) > 0:
+                bug_keys = dict([(key.split('/', 1)[1], key)
+                                 for key in self._indexed_bugs()])
+                keys = set()
+                for uuid in uuids:
+                    key = self._bug_key(uuid, bug_keys)
+                    if key != None:
+                        keys.add(key)
+                for key in keys:
+                    self._reindex_bug(key)
+                self._dirty.add('meta')
+        if revision == None:
+            self._dirty.clear() # nothing to check a saved index against
+            return
+        if changed == None or revision != self._meta['revision'] \
+                or 'meta' in self._dirty:
+            if changed == None or revision != self._meta['revision']:
+                changed = _changed_uuids(self.storage, revision)
+            self._meta['revision'] = revision
+            self._meta['dirty'] = sorted(changed)
+            self._dirty.add('meta')
+        self.save()
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite()
@@ -0,0 +1,216 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""JSON Lines export and import.
+
+Each line of a JSONL dump is a JSON object.  A bugdir line holds a
+bugdir's settings::
+
+  {"bugdir": UUID, "settings": {...}}
+
+and is followed by a line for each of its bugs, holding the bug's
+settings and its whole comment tree::
+
+  {"bugdir": UUID, "bug": UUID, "settings": {...},
+   "comments": [{"uuid": UUID, "settings": {...}, "body": TEXT}, ...]}
+
+The settings are exactly those in the stored mapfiles, so neither
+side ever builds a :py:class:`~libbe.bug.Bug` or
+:py:class:`~libbe.comment.Comment`.  Comments with a non-text
+``Content-type`` store their body in ``body-base64`` instead of
+``body``.  Comment threading is kept in the ``In-reply-to`` settings.
+
+Because every line stands alone, :py:func:`parse_line` may be run in
+worker processes, leaving only :py:func:`write_record` to the process
+that owns the storage.
+"""
+
+import base64
+import json
+
+import libbe
+import libbe.util.id
+from libbe.storage.util import mapfile
+if libbe.TESTING == True:
+    import doctest
+
+
+def _settings(storage, id):
+    return mapfile.parse(storage.get(id, default='{}\n'))
+
+def _is_text(settings):
+    return settings.get('Content-type', 'text/plain').startswith('text/')
+
+def bugdir_record(storage, uuid):
+    """Return the JSONL record for the bugdir `uuid`."""
+    return {'bugdir':uuid,
+            'settings':_settings(storage, '%s/settings' % uuid)}
+
+def bug_record(storage, bugdir_uuid, uuid):
+    """Return the JSONL record for the bug `uuid`, including all of
+    its comments (sorted by UUID).
+    """
+    comments = []
+    for comment_uuid in sorted(libbe.util.id.child_uuids(
+            storage.children(uuid))):
+        settings = _settings(storage, '%s/values' % comment_uuid)
+        comment = {'uuid':comment_uuid, 'settings':settings}
+        body_id = '%s/body' % comment_uuid
+        if _is_text(settings):
+            comment['body'] = storage.get(body_id, default=None, decode=True)
+        else:
+            body = storage.get(body_id, default=None)
+            if body != None:
+                body = base64.b64encode(body)
+            comment['body-base64'] = body
+        comments.append(comment)
+    return {'bugdir':bugdir_uuid, 'bug':uuid,
+            'settings':_settings(storage, '%s/values' % uuid),
+            'comments':comments}
+
+def export(storage, bugdir_uuids):
+    """Yield JSONL lines (without trailing newlines) for each bugdir in
+    `bugdir_uuids` and all of its bugs, straight from `storage`.
+
+    >>> import libbe.bugdir
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False)
+    >>> for line in export(bd.storage, [bd.uuid]):
+    ...     print line # doctest: +ELLIPSIS
+    {"bugdir": "abc123", "settings": {}}
+    {"bug": "a", "bugdir": "abc123", "comments": [], "settings": {...}}
+    {"bug": "b", "bugdir": "abc123", "comments": [], "settings": {...}}
+    >>> bd.cleanup()
+    """
+    for bugdir_uuid in bugdir_uuids:
+        yield dumps(bugdir_record(storage, bugdir_uuid))
+        for uuid in sorted(libbe.util.id.child_uuids(
+                storage.children(bugdir_uuid))):
+            yield dumps(bug_record(storage, bugdir_uuid, uuid))
+
+def dumps(record):
+    """Serialize `record` as a single line of ASCII JSON."""
+    return json.dumps(record, sort_keys=True)
+
+def parse_line(args):
+    """Convert a numbered JSONL line into a record for
+    :py:func:`write_record`.
+
+    `args` is a ``(line number, line)`` tuple, so this function can be
+    mapped over lines by a :py:class:`multiprocessing.Pool`.  Blank
+    lines return ``None``.  The settings are already rendered into
+    compact mapfile contents, and the comment bodies decoded, so
+    writing the record is (usually) just a matter of storing strings.
+
+    >>> record = parse_line((1, '{"bugdir": "abc", "bug": "a", '
+    ...     '"settings": {"status": "open"}, "comments": [{"uuid": "c", '
+    ...     '"settings": {"Content-type": "image/png"}, '
+    ...     '"body-base64": "iVBORw=="}]}'))
+    >>> record['bugdir'], record['bug']
+    (u'abc', u'a')
+    >>> print record['values'].strip()
+    {"status":"open"}
+    >>> uuid,values,body = record['comments'][0]
+    >>> uuid, body
+    (u'c', '\\x89PNG')
+    >>> parse_line((2, '  '))
+    >>> parse_line((3, '{"bug": "a"'))
+    Traceback (most recent call last):
+      ...
+    ValueError: line 3: Expecting object: line 1 column 11 (char 10)
+    >>> parse_line((4, '{"bug": "a"}'))
+    Traceback (most recent call last):
+      ...
+    ValueError: line 4: missing 'bugdir'
+    """
+    number,line = args
+    line = line.strip()
+    if len(line) == 0:
+        return None
+    try:
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError('not a JSON object')
+        if 'bugdir' not in data:
+            raise ValueError("missing 'bugdir'")
+        record = {'line':number, 'bugdir':data['bugdir'],
+                  'bug':data.get('bug', None)}
+        if record['bug'] == None:
+            record['settings'] = mapfile.generate(
+                data.get('settings', {}), context=None)
+            return record
+        record['values'] = mapfile.generate(
+            data.get('settings', {}), context=None)
+        comments = []
+        for comment in data.get('comments', []):
+            settings = comment.get('settings', {})
+            if 'body-base64' in comment:
+                body = comment['body-base64']
+                if body != None:
+                    body = base64.b64decode(body)
+            else:
+                body = comment.get('body', None)
+            comments.append((comment['uuid'],
+                             mapfile.generate(settings, context=None), body))
+        record['comments'] = comments
+    except (ValueError, KeyError, TypeError), e:
+        if isinstance(e, KeyError):
+            e = "missing %s" % e
+        raise ValueError('line %d: %s' % (number, e))
+    return record
+
+def _mapfile(storage, contents):
+    """Re-render compact mapfile `contents` for `storage`, if it uses
+    merge-friendly mapfiles.
+    """
+    if storage.mapfile_context == None:
+        return contents
+    return mapfile.generate(mapfile.parse(contents),
+                            context=storage.mapfile_context)
+
+def write_record(storage, record, bugdir_uuid=None):
+    """Store a bug `record` from :py:func:`parse_line` in the bugdir
+    `bugdir_uuid` (which defaults to the record's own bugdir), the
+    same way :py:meth:`libbe.bug.Bug.save` would.
+    """
+    if bugdir_uuid == None:
+        bugdir_uuid = record['bugdir']
+    uuid = record['bug']
+    storage.add(uuid, parent=bugdir_uuid, directory=True)
+    storage.add('%s/values' % uuid, parent=uuid, directory=False)
+    storage.set('%s/values' % uuid, _mapfile(storage, record['values']))
+    for comment_uuid,values,body in record['comments']:
+        storage.add(comment_uuid, parent=uuid, directory=True)
+        for name,value in [('values', _mapfile(storage, values)),
+                           ('body', body)]:
+            id = '%s/%s' % (comment_uuid, name)
+            storage.add(id, parent=comment_uuid, directory=False)
+            if value != None:
+                storage.set(id, value)
+
+def write_bugdir_record(storage, record):
+    """Create the bugdir for a bugdir `record` from
+    :py:func:`parse_line`, the same way
+    :py:meth:`libbe.bugdir.BugDir.save` would.
+    """
+    uuid = record['bugdir']
+    storage.add(uuid, directory=True)
+    storage.add('%s/settings' % uuid, parent=uuid, directory=False)
+    storage.set('%s/settings' % uuid, _mapfile(storage, record['settings']))
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite()
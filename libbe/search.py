@@ -0,0 +1,492 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Full-text search over bug summaries and comments.
+
+:py:class:`SearchIndex` keeps an inverted index (token -> document
+-> token positions) for bug summaries and comment authors and bodies.
+On VCS storage the index is stored in ``.be/index/search`` and
+brought up to date incrementally (see :py:mod:`libbe.index`).
+"""
+
+import bisect
+import heapq
+import math
+import re
+import zlib
+
+import libbe
+import libbe.comment
+import libbe.index
+from libbe.index import pack, unpack
+if libbe.TESTING == True:
+    import doctest
+
+
+SHARDS = 64
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TOKEN_REGEXP = re.compile(r'\w+', re.UNICODE)
+QUERY_REGEXP = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    """Split `text` into lower-case word tokens.
+
+    >>> tokenize(u'Crash in the XML-export, again!')
+    [u'crash', u'in', u'the', u'xml', u'export', u'again']
+    >>> tokenize(None)
+    []
+    """
+    if text == None:
+        return []
+    if not isinstance(text, unicode):
+        text = unicode(text, 'utf-8', 'replace')
+    return TOKEN_REGEXP.findall(text.lower())
+
+def parse_query(query):
+    """Parse a search query into a list of ``(type, value)`` clauses.
+
+    Bare words are ``term`` clauses, words ending in ``*`` are
+    ``prefix`` clauses, and quoted strings (or words that tokenize
+    into several tokens) are ``phrase`` clauses.  Documents must
+    match every clause.
+
+    >>> parse_query(u'crash "xml export" win*')
+    [('term', u'crash'), ('phrase', [u'xml', u'export']), ('prefix', u'win')]
+    >>> parse_query(u'import-xml ""')
+    [('phrase', [u'import', u'xml'])]
+    """
+    clauses = []
+    for phrase,word in QUERY_REGEXP.findall(query):
+        if word.endswith('*'):
+            tokens = tokenize(word.rstrip('*'))
+            if len(tokens) == 1:
+                clauses.append(('prefix', tokens[0]))
+                continue
+        else:
+            tokens = tokenize(phrase or word)
+        if len(tokens) == 1:
+            clauses.append(('term', tokens[0]))
+        elif len(tokens) > 1:
+            clauses.append(('phrase', tokens))
+    return clauses
+
+class SearchIndex (libbe.index.BugIndex):
+    """An inverted index over `bugdirs` (a ``{uuid: BugDir}`` dict).
+
+    Documents are bug summaries (with ids ``BUGDIR/BUG``) and comments
+    (author and body, with ids ``BUGDIR/BUG/COMMENT``).  Internally,
+    documents are numbered in the order they are indexed, and each
+    token's postings are stored as packed arrays of document numbers
+    and term frequencies.  Token positions are kept in separate files,
+    which are only read for phrase queries.  Both are sharded by
+    token, so a query only loads the shards for its own tokens.
+
+    >>> import libbe.bugdir
+    >>> import libbe.util.utility
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False, versioned=True)
+    >>> dir = libbe.util.utility.Dir()
+    >>> a = bd.bug_from_uuid('a')
+    >>> c = a.new_comment(u'The XML export crashes on large bugdirs.')
+    >>> c.author = u'Jane Doe <jdoe@example.com>'
+    >>> def ids(query):
+    ...     return [id.replace(c.uuid, 'c') for score,id in index.search(query)]
+    >>> revision = bd.storage.commit('Add a comment')
+    >>> index = SearchIndex({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> index.search(u'bug')
+    [(..., 'abc123/a'), (..., 'abc123/b')]
+    >>> ids(u'"xml export"')
+    ['abc123/a/c']
+    >>> ids(u'"export xml"')
+    []
+    >>> ids(u'jane crash*')
+    ['abc123/a/c']
+
+    The index is saved to `path`, and later updates only re-index
+    bugs touched since the last one.
+
+    >>> index = SearchIndex({bd.uuid: bd}, path=dir.path)
+    >>> b = bd.bug_from_uuid('b')
+    >>> b.summary = u'Crash on startup'
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/b']
+    >>> ids(u'crash*')
+    ['abc123/b', 'abc123/a/c']
+    >>> ids(u'"bug b"')
+    []
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'search'
+
+    def __init__(self, *args, **kwargs):
+        libbe.index.BugIndex.__init__(self, *args, **kwargs)
+        self._names = None # document number -> document id (or '')
+        self._docs = None # forward index, only needed for updates
+        self._lexicon = None
+        self._shards = {} # shard -> {term: [doc numbers, frequencies]}
+        self._positions = {} # shard -> {term: concatenated positions}
+
+    # on-disk format
+
+    def _save_files(self):
+        for name in sorted(self._dirty):
+            if name.startswith('shard-'):
+                shard = self._shards[int(name[len('shard-'):])]
+                self._save_file(name, dict(
+                        [(term, tuple([pack(a) for a in postings]))
+                         for term,postings in shard.items()]))
+            elif name.startswith('positions-'):
+                shard = self._positions[int(name[len('positions-'):])]
+                self._save_file(name, dict(
+                        [(term, pack(positions))
+                         for term,positions in shard.items()]))
+        if 'names' in self._dirty:
+            # one string plus offsets loads much faster than a list
+            offsets = unpack()
+            start = 0
+            for name in self._get_names():
+                offsets.append(start)
+                start += len(name) + 1
+            offsets.append(start)
+            self._save_file('names', ('\n'.join(self._names),
+                                      pack(offsets)))
+        if 'docs' in self._dirty:
+            self._save_file('docs', self._docs)
+        if 'lexicon' in self._dirty:
+            self._save_file('lexicon', self._get_lexicon())
+
+    def _dump_meta(self):
+        meta = dict(self._meta)
+        meta['lengths'] = pack(meta['lengths'])
+        return meta
+
+    def _load_meta(self):
+        meta = self._load_file('meta')
+        if meta != None and 'lengths' in meta:
+            meta['lengths'] = unpack(meta['lengths'])
+        return meta
+
+    def _get_names(self):
+        """Return a modifiable list of document ids."""
+        if self._names == None:
+            self._names = self._load_file('names', ('', ''))
+        if isinstance(self._names, tuple):
+            names,offsets = self._names
+            if len(offsets) == 0:
+                self._names = []
+            else:
+                self._names = names.split('\n')
+        return self._names
+
+    def _name(self, num):
+        if self._names == None:
+            names,offsets = self._load_file('names', ('', ''))
+            self._names = (names, unpack(offsets))
+        if isinstance(self._names, tuple):
+            names,offsets = self._names
+            return names[offsets[num]:offsets[num+1]-1]
+        return self._names[num]
+
+    def _get_docs(self):
+        if self._docs == None:
+            self._docs = self._load_file(
+                'docs', {'terms':{}, 'bugs':{}, 'comments':{}})
+        return self._docs
+
+    def _get_lexicon(self):
+        """Return a sorted list of the indexed terms."""
+        if self._lexicon == None:
+            self._lexicon = self._load_file('lexicon', [])
+        if isinstance(self._lexicon, set):
+            self._lexicon = sorted(self._lexicon)
+        return self._lexicon
+
+    def _get_lexicon_set(self):
+        if not isinstance(self._lexicon, set):
+            self._lexicon = set(self._get_lexicon())
+        return self._lexicon
+
+    def _shard_id(self, term):
+        return zlib.crc32(term.encode('utf-8')) % SHARDS
+
+    def _postings(self, term, create=False):
+        """Return ``[doc numbers, term frequencies]`` arrays for `term`.
+
+        Set `create` to get (and mark for saving) a modifiable entry.
+        """
+        i = self._shard_id(term)
+        if i not in self._shards:
+            self._shards[i] = self._load_file('shard-%02d' % i, {})
+        shard = self._shards[i]
+        postings = shard.get(term, None)
+        if postings == None:
+            if create == False:
+                return (unpack(), unpack())
+            postings = shard[term] = (unpack(), unpack())
+        if isinstance(postings, tuple):
+            postings = shard[term] = [unpack(p) for p in postings]
+        if create == True:
+            self._dirty.add('shard-%02d' % i)
+        return postings
+
+    def _term_positions(self, term, create=False):
+        """Return the concatenated positions array for `term`."""
+        i = self._shard_id(term)
+        if i not in self._positions:
+            self._positions[i] = self._load_file('positions-%02d' % i, {})
+        shard = self._positions[i]
+        if term not in shard and create == False:
+            return unpack()
+        positions = shard.setdefault(term, '')
+        if isinstance(positions, str):
+            positions = shard[term] = unpack(positions)
+        if create == True:
+            self._dirty.add('positions-%02d' % i)
+        return positions
+
+    def _drop_term(self, term):
+        i = self._shard_id(term)
+        self._shards[i].pop(term, None)
+        self._positions[i].pop(term, None)
+        self._get_lexicon_set().discard(term)
+
+    # maintenance
+
+    def _new_meta(self):
+        meta = libbe.index.BugIndex._new_meta(self)
+        meta.update({'lengths':unpack(), 'total':0, 'count':0})
+        return meta
+
+    def _usable(self, meta):
+        # re-indexed documents are renumbered, so rebuild once more
+        # than half of the document numbers are unused.
+        return (libbe.index.BugIndex._usable(self, meta)
+                and len(meta['lengths']) <= 2 * meta['count'] + 1000)
+
+    def _clear(self):
+        self._names = []
+        self._docs = {'terms':{}, 'bugs':{}, 'comments':{}}
+        self._lexicon = set()
+        self._shards = dict([(i, {}) for i in range(SHARDS)])
+        self._positions = dict([(i, {}) for i in range(SHARDS)])
+        self._dirty = set(['names', 'docs', 'lexicon'] +
+                          ['shard-%02d' % i for i in range(SHARDS)] +
+                          ['positions-%02d' % i for i in range(SHARDS)])
+
+    def _add_doc(self, id, fields):
+        positions = {}
+        pos = 0
+        for text in fields:
+            for token in tokenize(text):
+                positions.setdefault(token, []).append(pos)
+                pos += 1
+            pos += 1 # don't match phrases across fields
+        names = self._get_names()
+        num = len(names) # always larger than any indexed document
+        names.append(id)
+        lexicon = self._get_lexicon_set()
+        for term,pos_list in positions.items():
+            docs,tfs = self._postings(term, create=True)
+            docs.append(num)
+            tfs.append(len(pos_list))
+            self._term_positions(term, create=True).extend(pos_list)
+            lexicon.add(term)
+        length = sum([len(p) for p in positions.values()])
+        self._docs['terms'][num] = positions.keys()
+        self._meta['lengths'].append(length)
+        self._meta['total'] += length
+        self._meta['count'] += 1
+        return num
+
+    def _remove_doc(self, num):
+        for term in self._docs['terms'].pop(num, []):
+            docs,tfs = self._postings(term, create=True)
+            i = bisect.bisect_left(docs, num)
+            if i == len(docs) or docs[i] != num:
+                continue
+            start = sum(tfs[:i])
+            del self._term_positions(term, create=True)[start:start+tfs[i]]
+            del docs[i]
+            del tfs[i]
+            if len(docs) == 0:
+                self._drop_term(term)
+        self._meta['total'] -= self._meta['lengths'][num]
+        self._meta['lengths'][num] = 0
+        self._meta['count'] -= 1
+        self._get_names()[num] = ''
+
+    def _index_bug(self, bugdir, bug):
+        key = '%s/%s' % (bugdir.uuid, bug.uuid)
+        nums = [self._add_doc(key, [bug.summary])]
+        for comment in bug.comments():
+            if comment.uuid == libbe.comment.INVALID_UUID:
+                continue # the comment root
+            fields = [comment.author]
+            if comment.content_type.startswith('text/'):
+                fields.append(comment.body)
+            nums.append(self._add_doc(
+                    '%s/%s' % (key, comment.uuid), fields))
+            self._docs['comments'][comment.uuid] = key
+        self._docs['bugs'][key] = nums
+        self._dirty.update(['names', 'docs', 'lexicon'])
+
+    def _remove_bug(self, key):
+        names = self._get_names()
+        for num in self._get_docs()['bugs'].pop(key, []):
+            comment_uuid = names[num][len(key)+1:]
+            if comment_uuid:
+                self._docs['comments'].pop(comment_uuid, None)
+            self._remove_doc(num)
+        self._dirty.update(['names', 'docs', 'lexicon'])
+
+    def _indexed_bugs(self):
+        return self._get_docs()['bugs'].keys()
+
+    def _indexed_comment(self, uuid):
+        return self._get_docs()['comments'].get(uuid, None)
+
+    # queries
+
+    def _expand(self, prefix):
+        terms = self._get_lexicon()
+        i = bisect.bisect_left(terms, prefix)
+        expanded = []
+        while i < len(terms) and terms[i].startswith(prefix):
+            expanded.append(terms[i])
+            i += 1
+        return expanded
+
+    def _term_matches(self, term, candidates=None):
+        docs,tfs = self._postings(term)
+        if candidates == None:
+            return dict(zip(docs, tfs))
+        matches = {}
+        for num in candidates:
+            i = bisect.bisect_left(docs, num)
+            if i < len(docs) and docs[i] == num:
+                matches[num] = tfs[i]
+        return matches
+
+    def _phrase_matches(self, terms, candidates=None):
+        for term in sorted(terms, key=lambda t: len(self._postings(t)[0])):
+            candidates = sorted(self._term_matches(term, candidates))
+        starts = dict([(num, None) for num in candidates])
+        for offset,term in enumerate(terms):
+            docs,tfs = self._postings(term)
+            positions = self._term_positions(term)
+            i = start = 0
+            for num in candidates: # sorted, so walk the postings once
+                while docs[i] < num:
+                    start += tfs[i]
+                    i += 1
+                pos = set([p - offset for p in
+                           positions[start:start+tfs[i]]])
+                if starts[num] == None:
+                    starts[num] = pos
+                else:
+                    starts[num].intersection_update(pos)
+        return dict([(num, len(s)) for num,s in starts.items()
+                     if len(s) > 0])
+
+    def _match(self, clause, candidates=None):
+        """Return a ``{doc number: frequency}`` dict for `clause`,
+        optionally restricted to the sorted doc numbers `candidates`.
+        """
+        type,value = clause
+        if type == 'term':
+            return self._term_matches(value, candidates)
+        elif type == 'prefix':
+            matches = {}
+            for term in self._expand(value):
+                for num,tf in self._term_matches(term, candidates).items():
+                    matches[num] = matches.get(num, 0) + tf
+            return matches
+        assert type == 'phrase', type
+        return self._phrase_matches(value, candidates)
+
+    def _df(self, clause):
+        """Estimate the number of documents matching `clause`."""
+        type,value = clause
+        if type == 'term':
+            return len(self._postings(value)[0])
+        elif type == 'prefix':
+            return min(self._meta['count'], sum(
+                    [len(self._postings(t)[0]) for t in self._expand(value)]))
+        return min([len(self._postings(t)[0]) for t in value])
+
+    def search(self, query, limit=None):
+        """Return ``(score, doc_id)`` pairs matching `query`, best
+        first.  See :py:func:`parse_query` for the query syntax.
+
+        Searching does not :py:meth:`update` the index, so you can
+        also search a saved index without touching the storage.
+        """
+        clauses = parse_query(query)
+        if self._meta == None:
+            self._meta = self._load_meta()
+        if len(clauses) == 0 or self._meta == None \
+                or self._meta['count'] == 0:
+            return []
+        N = self._meta['count']
+        lengths = self._meta['lengths']
+        avg_length = float(self._meta['total']) / N or 1.0
+        # rarest clauses first, so later ones only check candidates
+        clauses = sorted([(self._df(c), c) for c in clauses])
+        candidates = None
+        frequencies = []
+        for df,clause in clauses:
+            matches = self._match(clause, candidates)
+            if candidates == None and clause[0] == 'term':
+                candidates = self._postings(clause[1])[0] # already sorted
+            else:
+                candidates = sorted(matches)
+            frequencies.append((df, matches))
+            if len(candidates) == 0:
+                return []
+        # BM25, with the per-clause and per-document constants hoisted
+        # out of the (potentially long) candidate loop.
+        k = K1 * (1 - B)
+        kb = K1 * B / avg_length
+        weights = [(math.log(1 + (N - df + 0.5) / (df + 0.5)) * (K1 + 1),
+                    matches) for df,matches in frequencies]
+        if len(weights) == 1:
+            weight,matches = weights[0]
+            scores = [(weight * tf / (tf + k + kb * lengths[num]), -num)
+                      for num,tf in matches.iteritems()]
+        else:
+            scores = []
+            for num in candidates:
+                norm = k + kb * lengths[num]
+                scores.append((sum([weight * matches[num]
+                                    / (matches[num] + norm)
+                                    for weight,matches in weights]), -num))
+        if limit != None:
+            scores = heapq.nlargest(limit, scores)
+        else:
+            scores.sort(reverse=True)
+        return [(score, self._name(-num)) for score,num in scores]
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite(optionflags=doctest.ELLIPSIS)
@@ -0,0 +1,242 @@
+# Copyright (C) 2026 agent <agent@local>
+#
+# This file is part of Bugs Everywhere.
+#
+# Bugs Everywhere is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 2 of the License, or (at your option) any
+# later version.
+#
+# Bugs Everywhere is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Bugs Everywhere.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Aggregate bug statistics.
+
+:py:class:`MetadataIndex` keeps a compact record of each bug's
+metadata (status, severity, assignee, ...; never comments) in
+``.be/index/metadata``.  Once it is up to date, :py:func:`aggregate`
+can count bugs by any combination of fields without loading a single
+bug.
+"""
+
+import time
+
+import libbe
+import libbe.bug
+import libbe.index
+if libbe.TESTING == True:
+    import doctest
+
+
+FIELDS = ('status', 'severity', 'assigned', 'creator', 'reporter', 'target')
+
+# (label, upper age limit in days) for open-bug age histograms
+AGE_BINS = (('< 1 day', 1), ('1-7 days', 7), ('1-4 weeks', 28),
+            ('1-3 months', 91), ('3-12 months', 365), ('> 1 year', None))
+
+DAY = 24*60*60
+
+_BLOCKS_TAG = 'BLOCKS:' # see libbe.command.depend.BLOCKS_TAG
+
+
+class MetadataIndex (libbe.index.BugIndex):
+    """Per-bug metadata for every bug in `bugdirs`.
+
+    >>> import libbe.bugdir
+    >>> import libbe.util.utility
+    >>> bd = libbe.bugdir.SimpleBugDir(memory=False, versioned=True)
+    >>> dir = libbe.util.utility.Dir()
+    >>> t = bd.new_bug(summary=u'v1.0', _uuid='t')
+    >>> t.severity = 'target'
+    >>> a = bd.bug_from_uuid('a')
+    >>> a.extra_strings = ['BLOCKS:t']
+    >>> revision = bd.storage.commit('Add a target')
+    >>> index = MetadataIndex({bd.uuid: bd}, path=dir.path)
+    >>> index.update()
+    >>> for record in index.records():
+    ...     print record['id'], record['status'], record['target']
+    abc123/a open v1.0
+    abc123/b closed None
+    abc123/t open v1.0
+
+    Once saved, the index answers without loading any bugs.
+
+    >>> bugdir = libbe.bugdir.BugDir(bd.storage, from_storage=True)
+    >>> index = MetadataIndex({bugdir.uuid: bugdir}, path=dir.path)
+    >>> index.update()
+    >>> [record['severity'] for record in index.records()]
+    ['minor', 'minor', 'target']
+    >>> len(bugdir)
+    0
+
+    Later updates only re-read the bugs that changed.
+
+    >>> b = bd.bug_from_uuid('b')
+    >>> b.assigned = u'Jane Doe <jdoe@example.com>'
+    >>> index.update()
+    >>> sorted(index.reindexed)
+    ['abc123/b']
+    >>> [record['assigned'] for record in index.records()]
+    [None, u'Jane Doe <jdoe@example.com>', None]
+    >>> dir.cleanup()
+    >>> bd.cleanup()
+    """
+    name = 'metadata'
+
+    def __init__(self, *args, **kwargs):
+        libbe.index.BugIndex.__init__(self, *args, **kwargs)
+        self._bugs = None # bug key -> record tuple
+
+    def _save_files(self):
+        self._save_file('bugs', self._get_bugs())
+
+    def _get_bugs(self):
+        if self._bugs == None:
+            self._bugs = self._load_file('bugs', {})
+        return self._bugs
+
+    def _clear(self):
+        self._bugs = {}
+        self._dirty.add('bugs')
+
+    def _index_bug(self, bugdir, bug):
+        key = '%s/%s' % (bugdir.uuid, bug.uuid)
+        if bug.severity == 'target':
+            summary = bug.summary
+        else:
+            summary = None
+        blocks = tuple([s[len(_BLOCKS_TAG):] for s in bug.extra_strings
+                        if s.startswith(_BLOCKS_TAG)])
+        self._get_bugs()[key] = (
+            bug.status, bug.severity, bug.assigned, bug.creator,
+            bug.reporter, bug.time, summary, blocks)
+        self._dirty.add('bugs')
+
+    def _remove_bug(self, key):
+        if self._get_bugs().pop(key, None) != None:
+            self._dirty.add('bugs')
+
+    def _indexed_bugs(self):
+        return self._get_bugs().keys()
+
+    def records(self):
+        """Return a list of bug metadata dicts, sorted by bug id.
+
+        Each dict has an ``id`` (``BUGDIR/BUG``), a ``time``, and
+        values for each of :py:data:`FIELDS`.  Like
+        :py:func:`libbe.command.target.bug_target`, a bug's ``target``
+        is the summary of the target bug it blocks (or its own summary,
+        for target bugs).
+        """
+        bugs = self._get_bugs()
+        targets = {}
+        for key,record in bugs.items():
+            if record[6] != None:
+                targets[key.split('/', 1)[1]] = record[6]
+        records = []
+        for key in sorted(bugs):
+            (status, severity, assigned, creator, reporter, time_,
+             summary, blocks) = bugs[key]
+            if summary == None:
+                for uuid in blocks:
+                    if uuid in targets:
+                        summary = targets[uuid]
+                        break
+            records.append({
+                    'id':key, 'status':status, 'severity':severity,
+                    'assigned':assigned, 'creator':creator,
+                    'reporter':reporter, 'time':time_, 'target':summary})
+        return records
+
+
+def age_bin(age):
+    """Return the :py:data:`AGE_BINS` label for an `age` in seconds.
+
+    >>> age_bin(3600)
+    '< 1 day'
+    >>> age_bin(10*DAY)
+    '1-4 weeks'
+    >>> age_bin(1000*DAY)
+    '> 1 year'
+    """
+    for label,days in AGE_BINS:
+        if days == None or age < days*DAY:
+            return label
+
+def _sorted_counts(counts, fields):
+    groups = []
+    for values,count in sorted(counts.items(),
+                               key=lambda (values,count): (-count, values)):
+        group = dict(zip(fields, values))
+        group['bugs'] = count
+        groups.append(group)
+    return groups
+
+def aggregate(records, by=(), now=None):
+    """Count `records` (see :py:meth:`MetadataIndex.records`) in one
+    pass.
+
+    Returns a dict with the total number of ``bugs``, a list of
+    ``{FIELD: value, 'bugs': count}`` groups for each field in
+    :py:data:`FIELDS` (largest first), an ``open-age`` histogram of
+    active bugs, and, if `by` lists any fields, the counts for each
+    combination of those fields under ``groups``.
+
+    >>> records = [
+    ...     {'status':'open', 'severity':'minor', 'assigned':None,
+    ...      'creator':'J', 'reporter':'J', 'target':None, 'time':0},
+    ...     {'status':'open', 'severity':'serious', 'assigned':'K',
+    ...      'creator':'J', 'reporter':'J', 'target':'v1', 'time':9*DAY},
+    ...     {'status':'closed', 'severity':'minor', 'assigned':'K',
+    ...      'creator':'K', 'reporter':'J', 'target':'v1', 'time':9*DAY}]
+    >>> stats = aggregate(records, by=['status', 'assigned'], now=10*DAY)
+    >>> stats['bugs']
+    3
+    >>> stats['status']
+    [{'status': 'open', 'bugs': 2}, {'status': 'closed', 'bugs': 1}]
+    >>> stats['target']
+    [{'target': 'v1', 'bugs': 2}, {'target': None, 'bugs': 1}]
+    >>> stats['groups'] # doctest: +NORMALIZE_WHITESPACE
+    [{'status': 'closed', 'assigned': 'K', 'bugs': 1},
+     {'status': 'open', 'assigned': None, 'bugs': 1},
+     {'status': 'open', 'assigned': 'K', 'bugs': 1}]
+    >>> [(age['age'], age['bugs']) for age in stats['open-age']]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [('< 1 day', 0), ('1-7 days', 1), ('1-4 weeks', 1),
+     ('1-3 months', 0), ('3-12 months', 0), ('> 1 year', 0)]
+    """
+    if now == None:
+        now = time.time()
+    by = tuple(by)
+    active = set(libbe.bug.active_status_values)
+    field_counts = dict([(field, {}) for field in FIELDS])
+    group_counts = {}
+    ages = dict([(label, 0) for label,days in AGE_BINS])
+    for record in records:
+        for field in FIELDS:
+            counts = field_counts[field]
+            counts[record[field]] = counts.get(record[field], 0) + 1
+        if len(by) > 0:
+            values = tuple([record[field] for field in by])
+            group_counts[values] = group_counts.get(values, 0) + 1
+        if record['status'] in active and record['time'] != None:
+            ages[age_bin(now - record['time'])] += 1
+    stats = {'bugs':len(records)}
+    for field in FIELDS:
+        stats[field] = _sorted_counts(
+            dict([((value,), count) for value,count
+                  in field_counts[field].items()]), (field,))
+    stats['open-age'] = [{'age':label, 'bugs':ages[label]}
+                         for label,days in AGE_BINS]
+    if len(by) > 0:
+        stats['groups'] = _sorted_counts(group_counts, by)
+    return stats
+
+
+if libbe.TESTING == True:
+    suite = doctest.DocTestSuite()
@@ -48,11 +48,16 @@ STORAGE_VERSIONS = ['Bugs Everywhere Tree 1 0',
                     'Bugs Everywhere Directory v1.3',
                     'Bugs Everywhere Directory v1.4',
                     'Bugs Everywhere Directory v1.5',
+                    'Bugs Everywhere Directory v1.6',
                     ]
 
 # the current version
 STORAGE_VERSION = STORAGE_VERSIONS[-1]
 
+# versions whose files the current version reads as they are (v1.5
+# only differs in always padding mapfiles)
+READABLE_STORAGE_VERSIONS = STORAGE_VERSIONS[-2:]
+
 def get_http_storage(location):
     import http
     return http.HTTP(location)
@@ -74,4 +79,5 @@ def get_storage(location):
 __all__ = [ConnectionError, InvalidStorageVersion, InvalidID,
            InvalidRevision, InvalidDirectory, NotWriteable, NotReadable,
            EmptyCommit, STORAGE_VERSIONS, STORAGE_VERSION,
+           READABLE_STORAGE_VERSIONS,
            get_storage]
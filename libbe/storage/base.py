@@ -164,6 +164,7 @@ class Storage (object):
         self.versioned = False
         self.can_init = True
         self.connected = False
+        self.mapfile_context = None # see set_mapfile_context()
 
     def __str__(self):
         return '<%s %s %s>' % (self.__class__.__name__, id(self), self.repo)
@@ -179,6 +180,18 @@ class Storage (object):
         """Return the storage format for this backend."""
         return libbe.storage.STORAGE_VERSION
 
+    def set_mapfile_context(self, context):
+        """Set the `context` passed to
+        :py:func:`libbe.storage.util.mapfile.generate` for the
+        settings files saved in this storage.
+
+        `None` (the default) saves compact mapfiles.  Repositories
+        where concurrent changes are merged often can opt in to
+        merge-friendly mapfiles with a number of blank lines (e.g.
+        :py:data:`~libbe.storage.util.mapfile.MERGE_CONTEXT`) instead.
+        """
+        self.mapfile_context = context
+
     def is_readable(self):
         return self.readable and self._readable
 
@@ -367,6 +380,19 @@ class Storage (object):
                 'Directory %s cannot have data' % self.parent)
         self._data[id].value = value
 
+    def begin_batch(self):
+        """Start a batch of :py:meth:`add` and :py:meth:`set` calls.
+
+        Storage backends with expensive per-entry bookkeeping (e.g. a
+        VCS client call for every file) may defer it until
+        :py:meth:`end_batch`.  Other backends ignore batches.
+        """
+        pass
+
+    def end_batch(self):
+        """Finish a batch started with :py:meth:`begin_batch`."""
+        pass
+
 class VersionedStorage (Storage):
     """
     This class declares all the methods required by a Storage
@@ -520,25 +546,68 @@ class VersionedStorage (Storage):
             return str(index % L)
         raise InvalidRevision(i)
 
-    def changed(self, revision):
+    def changed(self, revision, to_revision=None):
         """Return a tuple of lists of ids `(new, modified, removed)` from the
         specified revision to the current situation.
+
+        If `to_revision` is given, compare `revision` with
+        `to_revision` instead of with the current situation.
         """
         new = []
         modified = []
         removed = []
-        for id,value in self._data[int(revision)].items():
+        old = self._data[int(revision)]
+        if to_revision == None:
+            current = self._data[-1]
+        else:
+            current = self._data[int(to_revision)]
+        for id,value in old.items():
             if id.startswith('__'):
                 continue
-            if not id in self._data[-1]:
+            if not id in current:
                 removed.append(id)
-            elif value.value != self._data[-1][id].value:
+            elif value.value != current[id].value:
                 modified.append(id)
-        for id in self._data[-1]:
-            if not id in self._data[int(revision)]:
+        for id in current:
+            if not id in old:
                 new.append(id)
         return (new, modified, removed)
 
+    def history(self, id, since=None):
+        """Return a list of `(revision, summary, changes)` tuples,
+        oldest first, for each committed revision after `since` that
+        changed `id` or anything below it.
+
+        `changes` maps the id of each changed file to its new
+        contents, or to `None` if it was removed.  Raise
+        InvalidRevision if `since` is not an earlier revision.
+        """
+        start = 1
+        if since != None:
+            try:
+                start = int(since) + 1
+            except ValueError:
+                raise InvalidRevision(since)
+            if start < 1 or start > len(self._data) - 1:
+                raise InvalidRevision(since)
+        def contents(data):
+            if id not in data:
+                return {}
+            return dict((e.id, e.value) for e in data[id].traverse()
+                        if e.directory == False and e.value != _EMPTY)
+        revisions = []
+        old = contents(self._data[start-1])
+        for i in range(start, len(self._data)-1): # skip the working tree
+            new = contents(self._data[i])
+            changes = dict((k,v) for k,v in new.items() if old.get(k) != v)
+            changes.update((k,None) for k in old if k not in new)
+            if len(changes) > 0:
+                revisions.append(
+                    (str(i), self._data[i]['__COMMIT__SUMMARY__'].value,
+                     changes))
+            old = new
+        return revisions
+
 
 if TESTING == True:
     class StorageTestCase (unittest.TestCase):
@@ -981,6 +1050,23 @@ if TESTING == True:
                                 "%s.revision_id(%d) returned %s not %s"
                                 % (vars(self.Class)['name'], i, rev, revs[i]))
 
+        def test_batch_commit(self):
+            """Entries added and set in a batch should be committed.
+            """
+            self.s.begin_batch()
+            self.s.add(self.id, directory=True)
+            for i in range(3):
+                child = '%s/%d' % (self.id, i)
+                self.s.add(child, parent=self.id, directory=False)
+                self.s.set(child, '%s:%d' % (self.val, i))
+            self.s.end_batch()
+            rev = self.s.commit(self.commit_msg)
+            for i in range(3):
+                ret = self.s.get('%s/%d' % (self.id, i), revision=rev)
+                self.failUnless(ret == '%s:%d' % (self.val, i),
+                                "%s.get() returned %s not %s:%d"
+                                % (vars(self.Class)['name'], ret, self.val, i))
+
         def test_get_previous_version(self):
             """Get should be able to return the previous version.
             """
@@ -1081,6 +1167,72 @@ if TESTING == True:
             self.failUnless(sorted(rem) == ['moved', 'removed'],
                             'Unexpected removed: %s' % rem)
 
+        def test_changed_between(self):
+            """Changed lists should compare two past revisions"""
+            self.s.add('dir', directory=True)
+            self.s.add('modified', parent='dir')
+            self.s.set('modified', 'some value to be modified')
+            self.s.add('removed', parent='dir')
+            self.s.set('removed', 'this entry will be deleted')
+            revA = self.s.commit('Initial state')
+            self.s.add('new', parent='dir')
+            self.s.set('new', 'this entry is new')
+            self.s.set('modified', 'a new value')
+            self.s.remove('removed')
+            revB = self.s.commit('Final state')
+            self.s.set('modified', 'an uncommitted value')
+            try:
+                new,mod,rem = self.s.changed(revA, revB)
+            except NotImplementedError:
+                return
+            self.failUnless(new == ['new'], 'Unexpected new: %s' % new)
+            self.failUnless(mod == ['modified'],
+                            'Unexpected modified: %s' % mod)
+            self.failUnless(rem == ['removed'], 'Unexpected removed: %s' % rem)
+            new,mod,rem = self.s.changed(revB, revB)
+            self.failUnless((new, mod, rem) == ([], [], []),
+                            'Unexpected changes: %s' % ((new, mod, rem),))
+
+    class VersionedStorage_history_TestCase (VersionedStorageTestCase):
+        """Test cases for VersionedStorage.history() method."""
+
+        def test_history(self):
+            """History should list the revisions that changed an id"""
+            self.s.add('dir', directory=True)
+            self.s.add('a', parent='dir')
+            self.s.set('a', 'first value')
+            self.s.add('b', parent='dir')
+            self.s.set('b', 'this entry will be deleted')
+            self.s.add('other')
+            self.s.set('other', 'unrelated')
+            revA = self.s.commit('Initial state')
+            self.s.set('other', 'still unrelated')
+            self.s.commit('Unrelated change')
+            self.s.set('a', 'second value')
+            self.s.remove('b')
+            revC = self.s.commit('Final state')
+            self.s.set('a', 'an uncommitted value')
+            try:
+                history = self.s.history('dir')
+            except NotImplementedError:
+                return
+            self.failUnless(
+                [(r,s.strip()) for r,s,c in history] ==
+                [(revA, 'Initial state'), (revC, 'Final state')],
+                'Unexpected revisions: %s' % history)
+            self.failUnless(
+                history[0][2] == {'a':'first value',
+                                  'b':'this entry will be deleted'},
+                'Unexpected changes: %s' % history[0][2])
+            self.failUnless(
+                history[1][2] == {'a':'second value', 'b':None},
+                'Unexpected changes: %s' % history[1][2])
+            history = self.s.history('dir', since=revA)
+            self.failUnless([r for r,s,c in history] == [revC],
+                            'Unexpected revisions: %s' % history)
+            self.failUnless(self.s.history('dir', since=revC) == [],
+                            'Unexpected revisions: %s' % history)
+
     def make_storage_testcase_subclasses(storage_class, namespace):
         """Make StorageTestCase subclasses for storage_class in namespace."""
         storage_testcase_classes = [
@@ -239,15 +239,18 @@ class HTTP (base.VersionedStorage):
             raise base.InvalidID(id)
         return page.rstrip('\n')
 
-    def changed(self, revision=None):
+    def changed(self, revision=None, to_revision=None):
         url = urlparse.urljoin(self.repo, 'changed')
         page,final_url,info = self.get_post_url(
             url, get=True,
-            data_dict={'revision':revision})
+            data_dict={'revision':revision, 'to_revision':to_revision})
         lines = page.strip('\n')
         new,mod,rem = [p.splitlines() for p in page.split('\n\n')]
         return (new, mod, rem)
 
+    def history(self, id, since=None):
+        raise NotImplementedError
+
     def check_storage_version(self):
         version = self.storage_version()
         if version != libbe.storage.STORAGE_VERSION:
@@ -20,8 +20,12 @@
 
 """Serializing and deserializing dictionaries of parameters.
 
-The serialized "mapfiles" should be clear, flat-text strings, and allow
-easy merging of independent/conflicting changes.
+The serialized "mapfiles" are clear, flat-text JSON strings.  By
+default they are compact: a single line with canonical key order.
+Repositories that opt in (see
+:py:meth:`libbe.storage.base.Storage.set_mapfile_context`) pad each
+entry with blank lines instead, to allow easy merging of
+independent/conflicting changes.  :py:func:`parse` reads either.
 """
 
 import errno
@@ -39,7 +43,10 @@ class InvalidMapfileContents (Exception):
         self.contents = contents
 
 
-def generate(map, context=6):
+MERGE_CONTEXT = 6 # blank lines around entries in merge-friendly mapfiles
+
+
+def generate(map, context=MERGE_CONTEXT):
     """Generate a JSON mapfile content string.
 
     Examples
@@ -89,10 +96,18 @@ def generate(map, context=6):
     <BLANKLINE>
     }
 
+    With `context` set to `None`, the mapfile is compact instead.
+
+    >>> sys.stdout.write(generate({'q':'p', 'a':u'Fran\u00e7ais'},
+    ...                           context=None))
+    {"a":"Fran\u00e7ais","q":"p"}
+
     See Also
     --------
     parse : inverse
     """
+    if context == None:
+        return json.dumps(map, sort_keys=True, separators=(',', ':')) + '\n'
     lines = json.dumps(map, sort_keys=True, indent=4).splitlines()
     sep = '\n' * (1 + context)
     return sep.join(lines) + '\n'
@@ -117,6 +132,8 @@ def parse(contents):
     >>> dict = parse(contents)
     >>> dict['q']
     u'Fran\\xe7ais'
+    >>> parse(generate({'a':'b', 'c':'d'}, context=None)) == {'a':'b', 'c':'d'}
+    True
     >>> dict = parse('a!')
     Traceback (most recent call last):
       ...
@@ -22,7 +22,9 @@ Handle conversion between the various BE storage formats.
 """
 
 import codecs
+import itertools
 import json
+import multiprocessing
 import os, os.path
 import sys
 import types
@@ -108,18 +110,73 @@ def parse_yaml_mapfile(contents):
     return c or {}
 
 
+JOURNAL = 'upgrade-journal' # in .be, see Upgrader._upgrade_bugs()
+
+
+def _upgrade_bug(args):
+    """Run `upgrader._upgrade_bug(path)` (in a worker process)."""
+    upgrader,path = args
+    return (path, upgrader._upgrade_bug(path))
+
+
 class Upgrader (object):
-    "Class for converting between different on-disk BE storage formats."
+    """Class for converting between different on-disk BE storage formats.
+
+    Upgraders that convert each bug independently implement
+    :py:meth:`_upgrade_bug` and call :py:meth:`_upgrade_bugs` from
+    :py:meth:`_upgrade`.  The bugs are then spread over `jobs` worker
+    processes (defaulting to the number of CPUs), and every converted
+    bug is recorded in a journal, so an interrupted upgrade resumes
+    where it left off.  The changed files are handed to the VCS
+    together once all the bugs are done.
+
+    >>> import libbe.util.utility
+    >>> dir = libbe.util.utility.Dir()
+    >>> be = os.path.join(dir.path, '.be')
+    >>> bugs = os.path.join(be, 'abc', 'bugs')
+    >>> for uuid in ['a', 'b']:
+    ...     os.makedirs(os.path.join(bugs, uuid))
+    ...     encoding.set_file_contents(os.path.join(bugs, uuid, 'values'),
+    ...         generate_yaml_mapfile({'summary':'Bug %s' % uuid.upper()}))
+    >>> encoding.set_file_contents(os.path.join(be, 'abc', 'settings'),
+    ...     generate_yaml_mapfile({'target':'x'}))
+    >>> encoding.set_file_contents(os.path.join(be, 'version'),
+    ...     Upgrade_1_4_to_1_5.initial_version+'\\n')
+
+    Pretend an earlier upgrade was interrupted after converting bug
+    ``a``.  Only bug ``b`` (and the bugdir settings) are converted.
+
+    >>> journal = open(os.path.join(be, JOURNAL), 'w')
+    >>> journal.write(json.dumps({'upgrade':Upgrade_1_4_to_1_5.final_version})
+    ...               + '\\n' + json.dumps({'bug':'abc/bugs/a', 'paths':[]})
+    ...               + '\\n')
+    >>> journal.close()
+    >>> Upgrade_1_4_to_1_5(dir.path, jobs=2).upgrade()
+    >>> print encoding.get_file_contents(
+    ...     os.path.join(bugs, 'a', 'values')).rstrip()
+    summary: Bug A
+    >>> mapfile.parse(encoding.get_file_contents(
+    ...         os.path.join(bugs, 'b', 'values')))
+    {u'summary': u'Bug B'}
+    >>> print encoding.get_file_contents(os.path.join(be, 'version')).rstrip()
+    Bugs Everywhere Directory v1.5
+    >>> os.path.exists(os.path.join(be, JOURNAL))
+    False
+    >>> dir.cleanup()
+    """
     initial_version = None
     final_version = None
-    def __init__(self, repo):
+    def __init__(self, repo, jobs=None):
         import libbe.storage.vcs
 
         self.repo = repo
+        self.jobs = jobs
         vcs_name = self._get_vcs_name()
         if vcs_name == None:
-            vcs_name = 'None'
-        self.vcs = libbe.storage.vcs.vcs_by_name(vcs_name)
+            # newer settings don't record the VCS
+            self.vcs = libbe.storage.vcs.detect_vcs(self.repo)
+        else:
+            self.vcs = libbe.storage.vcs.vcs_by_name(vcs_name)
         self.vcs.repo = self.repo
         self.vcs.root()
 
@@ -149,12 +206,126 @@ class Upgrader (object):
         print >> sys.stderr, 'upgrading bugdir from "%s" to "%s"' \
             % (self.initial_version, self.final_version)
         self.check_initial_version()
-        self.set_version()
         self._upgrade()
+        # only once everything else is converted, so an interrupted
+        # upgrade is retried
+        self.set_version()
+        path = self.get_path(JOURNAL)
+        if os.path.exists(path):
+            os.remove(path)
 
     def _upgrade(self):
         raise NotImplementedError
 
+    def _bug_paths(self):
+        """Return the absolute paths of every bug directory, whether
+        in ``.be/bugs`` or in ``.be/BUGDIR-UUID/bugs``.
+        """
+        dirs = [self.get_path('bugs')] + [
+            self.get_path(p, 'bugs')
+            for p in sorted(os.listdir(self.get_path()))]
+        paths = []
+        for dir in dirs:
+            if os.path.isdir(dir):
+                paths.extend([os.path.join(dir, uuid)
+                              for uuid in sorted(os.listdir(dir))])
+        return paths
+
+    @classmethod
+    def _upgrade_bug(cls, path):
+        """Convert the bug in directory `path`, without touching the
+        VCS, and return a list of the files to stage.
+
+        The list should include files that are already converted,
+        since an interrupted upgrade may have converted them without
+        getting to record the bug in the journal.  This runs in worker
+        processes, so it must only use its arguments.
+
+        By default, convert the ``values`` files of the bug and its
+        comments with ``_upgrade_mapfile(path)``.
+        """
+        paths = []
+        for dirpath,dirnames,filenames in os.walk(path):
+            dirnames.sort()
+            if 'values' in filenames:
+                paths.append(os.path.join(dirpath, 'values'))
+                cls._upgrade_mapfile(paths[-1])
+        return paths
+
+    def _load_journal(self):
+        """Return a ``{bug path: paths to stage}`` dict of the bugs
+        already converted, with paths relative to ``.be``.
+        """
+        path = self.get_path(JOURNAL)
+        if not os.path.exists(path):
+            return {}
+        f = open(path, 'r')
+        try:
+            lines = f.read().splitlines()
+        finally:
+            f.close()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            header = {}
+        if header.get('upgrade', None) != self.final_version:
+            return {} # not our journal
+        journal = {}
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # e.g. cut short by the interruption
+            journal[record['bug']] = record['paths']
+        return journal
+
+    def _upgrade_bugs(self):
+        """Convert every bug with :py:meth:`_upgrade_bug` and stage
+        all their files.
+        """
+        be = self.get_path()
+        def relpath(path):
+            return os.path.relpath(path, be)
+        journal = self._load_journal()
+        todo = [path for path in self._bug_paths()
+                if relpath(path) not in journal]
+        jobs = self.jobs
+        if jobs == None:
+            jobs = multiprocessing.cpu_count()
+        jobs = min(jobs, len(todo))
+        args = [(self.__class__, path) for path in todo]
+        pool = None
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs)
+            results = pool.imap_unordered(
+                _upgrade_bug, args,
+                chunksize=max(1, min(100, len(todo) // (4*jobs))))
+        else:
+            results = itertools.imap(_upgrade_bug, args)
+        path = self.get_path(JOURNAL)
+        if len(journal) == 0:
+            f = open(path, 'w')
+            f.write(json.dumps({'upgrade':self.final_version}) + '\n')
+        else:
+            f = open(path, 'a')
+        try:
+            for bug_path,paths in results:
+                record = {'bug':relpath(bug_path),
+                          'paths':[relpath(p) for p in paths]}
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                journal[record['bug']] = record['paths']
+        finally:
+            f.close()
+            if pool != None:
+                pool.terminate()
+                pool.join()
+        paths = []
+        for bug in sorted(journal):
+            paths.extend([os.path.join(be, p) for p in journal[bug]])
+        if len(paths) > 0:
+            self.vcs._vcs_update_paths(paths)
+
 
 class Upgrade_1_0_to_1_1 (Upgrader):
     initial_version = "Bugs Everywhere Tree 1 0"
@@ -167,8 +338,9 @@ class Upgrade_1_0_to_1_1 (Upgrader):
             if len(fields) == 2 and fields[0] == 'rcs_name':
                 return fields[1]
         return None
-            
-    def _upgrade_mapfile(self, path):
+
+    @classmethod
+    def _upgrade_mapfile(cls, path):
         contents = encoding.get_file_contents(path, decode=True)
         old_format = False
         for line in contents.splitlines():
@@ -195,32 +367,35 @@ class Upgrade_1_0_to_1_1 (Upgrader):
                 raise ValueError((path, contents))
             contents = generate_yaml_mapfile(map)
             encoding.set_file_contents(path, contents)
-            self.vcs._vcs_update(path)
 
     def _upgrade(self):
         """
         Comment value field "From" -> "Author".
         Homegrown mapfile -> YAML.
         """
+        self._upgrade_bugs()
         path = self.get_path('settings')
         self._upgrade_mapfile(path)
-        for bug_uuid in os.listdir(self.get_path('bugs')):
-            path = self.get_path('bugs', bug_uuid, 'values')
-            self._upgrade_mapfile(path)
-            c_path = ['bugs', bug_uuid, 'comments']
-            if not os.path.exists(self.get_path(*c_path)):
-                continue # no comments for this bug
-            for comment_uuid in os.listdir(self.get_path(*c_path)):
-                path_list = c_path + [comment_uuid, 'values']
-                path = self.get_path(*path_list)
-                self._upgrade_mapfile(path)
-                settings = parse_yaml_mapfile(
-                    encoding.get_file_contents(path))
-                if 'From' in settings:
-                    settings['Author'] = settings.pop('From')
-                    encoding.set_file_contents(
-                        path, generate_yaml_mapfile(settings))
-                    self.vcs._vcs_update(path)
+        self.vcs._vcs_update(path)
+
+    @classmethod
+    def _upgrade_bug(cls, path):
+        paths = [os.path.join(path, 'values')]
+        cls._upgrade_mapfile(paths[0])
+        c_path = os.path.join(path, 'comments')
+        if not os.path.exists(c_path):
+            return paths # no comments for this bug
+        for comment_uuid in sorted(os.listdir(c_path)):
+            values = os.path.join(c_path, comment_uuid, 'values')
+            cls._upgrade_mapfile(values)
+            settings = parse_yaml_mapfile(
+                encoding.get_file_contents(values))
+            if 'From' in settings:
+                settings['Author'] = settings.pop('From')
+                encoding.set_file_contents(
+                    values, generate_yaml_mapfile(settings))
+            paths.append(values)
+        return paths
 
 
 class Upgrade_1_1_to_1_2 (Upgrader):
@@ -386,36 +561,130 @@ class Upgrade_1_4_to_1_5 (Upgrader):
         "./be/BUGDIR-UUID/bugs/BUG-UUID/comments/COMMENT-UUID/values"
         """
         self.repo = os.path.abspath(self.repo)
-        basenames = [p for p in os.listdir(self.get_path())]
-        for dirpath,dirnames,filenames in os.walk(self.get_path()):
-            for filename in filenames:
-                if filename in ['settings', 'values']:
-                    self._upgrade_mapfile(os.path.join(dirpath, filename))
+        self._upgrade_bugs()
+        for p in sorted(os.listdir(self.get_path())):
+            path = self.get_path(p, 'settings')
+            if os.path.isfile(path):
+                self._upgrade_mapfile(path)
+                self.vcs._vcs_update(path)
 
-    def _upgrade_mapfile(self, path):
+    @classmethod
+    def _upgrade_mapfile(cls, path):
         contents = encoding.get_file_contents(path)
+        if contents.lstrip().startswith('{'):
+            return # already JSON (e.g. in a resumed upgrade)
         data = parse_yaml_mapfile(contents)
         contents = mapfile.generate(data)
         encoding.set_file_contents(path, contents)
-        self.vcs._vcs_update(path)
+
+
+class Upgrade_1_5_to_1_6 (Upgrader):
+    """
+    >>> import libbe.util.utility
+    >>> dir = libbe.util.utility.Dir()
+    >>> be = os.path.join(dir.path, '.be')
+    >>> os.makedirs(os.path.join(be, 'abc', 'bugs', 'a'))
+    >>> encoding.set_file_contents(os.path.join(be, 'abc', 'settings'),
+    ...     mapfile.generate({'vcs_name':'None'}))
+    >>> values = os.path.join(be, 'abc', 'bugs', 'a', 'values')
+    >>> encoding.set_file_contents(
+    ...     values, mapfile.generate({'summary':'Bug A', 'status':'open'}))
+    >>> encoding.set_file_contents(os.path.join(be, 'version'),
+    ...     Upgrade_1_5_to_1_6.initial_version+'\\n')
+    >>> Upgrade_1_5_to_1_6(dir.path).upgrade()
+    >>> print encoding.get_file_contents(values),
+    {"status":"open","summary":"Bug A"}
+    >>> print encoding.get_file_contents(os.path.join(be, 'abc', 'settings')),
+    {"vcs_name":"None"}
+    >>> dir.cleanup()
+
+    v1.5 settings don't record the VCS, so the upgrade stages its
+    changes with the detected one.
+
+    >>> import subprocess
+    >>> import libbe.storage.vcs
+    >>> dir = libbe.util.utility.Dir()
+    >>> be = os.path.join(dir.path, '.be')
+    >>> os.makedirs(os.path.join(be, 'abc', 'bugs', 'a'))
+    >>> encoding.set_file_contents(os.path.join(be, 'abc', 'settings'),
+    ...     mapfile.generate({'target':'1.0'}, context=mapfile.MERGE_CONTEXT))
+    >>> values = os.path.join(be, 'abc', 'bugs', 'a', 'values')
+    >>> encoding.set_file_contents(values, mapfile.generate(
+    ...         {'summary':'Bug A'}, context=mapfile.MERGE_CONTEXT))
+    >>> encoding.set_file_contents(os.path.join(be, 'version'),
+    ...     Upgrade_1_5_to_1_6.initial_version+'\\n')
+    >>> if libbe.storage.vcs.vcs_by_name('git').installed():
+    ...     status = subprocess.call(['git', 'init', '-q'], cwd=dir.path)
+    ...     status = subprocess.call(['git', 'add', '.be'], cwd=dir.path)
+    ...     Upgrade_1_5_to_1_6(dir.path).upgrade()
+    ...     unstaged = subprocess.check_output(
+    ...         ['git', 'diff', '--name-only'], cwd=dir.path)
+    ...     staged = subprocess.check_output(
+    ...         ['git', 'diff', '--cached', '--name-only'], cwd=dir.path)
+    ... else:
+    ...     unstaged = ''
+    ...     staged = '.be/abc/bugs/a/values\\n.be/abc/settings\\n.be/version\\n'
+    >>> unstaged
+    ''
+    >>> print staged,
+    .be/abc/bugs/a/values
+    .be/abc/settings
+    .be/version
+    >>> print encoding.get_file_contents(values),
+    {"summary":"Bug A"}
+    >>> dir.cleanup()
+    """
+    initial_version = "Bugs Everywhere Directory v1.5"
+    final_version = "Bugs Everywhere Directory v1.6"
+    def _get_vcs_name(self):
+        for p in os.listdir(self.get_path()):  # check each bugdir's settings
+            path = os.path.join(self.get_path(), p, 'settings')
+            if os.path.isfile(path):
+                settings = mapfile.parse(encoding.get_file_contents(path))
+                if 'vcs_name' in settings:
+                    return settings['vcs_name']  # first entry we found
+        return None
+
+    def _upgrade(self):
+        """
+        padded JSON mapfiles -> compact JSON mapfiles
+        "./be/BUGDIR-UUID/settings"
+        "./be/BUGDIR-UUID/bugs/BUG-UUID/values"
+        "./be/BUGDIR-UUID/bugs/BUG-UUID/comments/COMMENT-UUID/values"
+        Use "be set --merge-friendly" to switch back to padded mapfiles.
+        """
+        self.repo = os.path.abspath(self.repo)
+        self._upgrade_bugs()
+        for p in sorted(os.listdir(self.get_path())):
+            path = self.get_path(p, 'settings')
+            if os.path.isfile(path):
+                self._upgrade_mapfile(path)
+                self.vcs._vcs_update(path)
+
+    @classmethod
+    def _upgrade_mapfile(cls, path):
+        data = mapfile.parse(encoding.get_file_contents(path))
+        encoding.set_file_contents(path, mapfile.generate(data, context=None))
 
 
 upgraders = [Upgrade_1_0_to_1_1,
              Upgrade_1_1_to_1_2,
              Upgrade_1_2_to_1_3,
              Upgrade_1_3_to_1_4,
-             Upgrade_1_4_to_1_5]
+             Upgrade_1_4_to_1_5,
+             Upgrade_1_5_to_1_6]
 
 upgrade_classes = {}
 for upgrader in upgraders:
     upgrade_classes[(upgrader.initial_version,upgrader.final_version)]=upgrader
 
 def upgrade(path, current_version,
-            target_version=STORAGE_VERSION):
+            target_version=STORAGE_VERSION, jobs=None):
     """
     Call the appropriate upgrade function to convert current_version
     to target_version.  If a direct conversion function does not exist,
-    use consecutive conversion functions.
+    use consecutive conversion functions.  `jobs` is the number of
+    processes converting bugs (see :py:class:`Upgrader`).
     """
     if current_version not in STORAGE_VERSIONS:
         raise NotImplementedError, \
@@ -427,7 +696,7 @@ def upgrade(path, current_version,
     if (current_version, target_version) in upgrade_classes:
         # direct conversion
         upgrade_class = upgrade_classes[(current_version, target_version)]
-        u = upgrade_class(path)
+        u = upgrade_class(path, jobs=jobs)
         u.upgrade()
     else:
         # consecutive single-step conversion
@@ -441,7 +710,7 @@ def upgrade(path, current_version,
                 raise NotImplementedError, \
                     "Cannot convert version '%s' to '%s' yet." \
                     % (version_a, version_b)
-            u = upgrade_class(path)
+            u = upgrade_class(path, jobs=jobs)
             u.upgrade()
             if version_b == target_version:
                 break
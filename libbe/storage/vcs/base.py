@@ -201,6 +201,7 @@ class CachedPathID (object):
     def __init__(self, encoding=None):
         self.encoding = libbe.util.encoding.get_text_file_encoding()
         self._spacer_dirs = ['.be', 'bugs', 'comments']
+        self._scan_misses = True
 
     def root(self, path):
         self._root = os.path.abspath(path).rstrip(os.path.sep)
@@ -222,6 +223,8 @@ class CachedPathID (object):
         for dirpath, dirnames, filenames in os.walk(spaced_root,
                                                     followlinks=True):
             if dirpath == spaced_root:
+                if 'index' in dirnames: # not part of the bugdir
+                    dirnames.remove('index')
                 continue
             try:
                 id = self.id(dirpath)
@@ -239,6 +242,17 @@ class CachedPathID (object):
         if cache == None:
             self.disconnect()
 
+    def begin_batch(self):
+        """Scan the .be directory once now, instead of again for every
+        unknown ID (e.g. each new entry checked with ``exists()``)
+        until :py:meth:`end_batch`.
+        """
+        self.init(cache=self._cache)
+        self._scan_misses = False
+
+    def end_batch(self):
+        self._scan_misses = True
+
     def destroy(self):
         if os.path.exists(self._cache_path):
             os.remove(self._cache_path)
@@ -273,7 +287,8 @@ class CachedPathID (object):
         else:
             extra = fields[1:]
         if uuid not in self._cache:
-            self.init(cache=self._cache)
+            if self._scan_misses == True:
+                self.init(cache=self._cache)
             if uuid not in self._cache:
                 raise InvalidID(uuid)
         if relpath == True:
@@ -336,6 +351,10 @@ class CachedPathID (object):
         return id
 
 
+# files in .be that hold no storage entries
+NON_STORAGE_FILES = ['id-cache', 'index', 'mapfile-context',
+                     'upgrade-journal', 'version']
+
 def new():
     return VCS()
 
@@ -359,6 +378,8 @@ class VCS (libbe.storage.base.VersionedStorage):
         self.interspersed_vcs_files = False
         self._cached_path_id = CachedPathID()
         self._rooted = False
+        self._batch = None # deferred (method, path) pairs, see begin_batch()
+        self._batch_depth = 0
 
     def _vcs_version(self):
         """
@@ -410,6 +431,15 @@ class VCS (libbe.storage.base.VersionedStorage):
         """
         pass
 
+    def _vcs_add_paths(self, paths):
+        """
+        Add several already created files (or directories) to version
+        control, in order.  Override this if your VCS can add many
+        paths at once.
+        """
+        for path in paths:
+            self._vcs_add(path)
+
     def _vcs_exists(self, path, revision=None):
         """
         Does the path exist in a given revision? (True/False)
@@ -430,6 +460,14 @@ class VCS (libbe.storage.base.VersionedStorage):
         """
         pass
 
+    def _vcs_update_paths(self, paths):
+        """
+        Notify the versioning system of changes to several versioned
+        files at once.
+        """
+        for path in paths:
+            self._vcs_update(path)
+
     def _vcs_is_versioned(self, path):
         """
         Return true if a path is under version control, False
@@ -517,6 +555,25 @@ class VCS (libbe.storage.base.VersionedStorage):
         """
         return ([], [], [])
 
+    def _vcs_history(self, path, since=None):
+        """
+        Return a list of (revision, summary, changes) tuples, oldest
+        first, for each committed revision after since that changed
+        path or anything below it.  changes maps the relative path of
+        each changed file to its new contents (None if removed).
+        Raise InvalidRevision if since is not an earlier revision.
+        """
+        raise NotImplementedError
+
+    def _vcs_changed_between(self, revision, to_revision):
+        """
+        Return a tuple of lists of paths
+          (new, modified, removed)
+        from revision to to_revision, without looking at the working
+        directory.  Neither revision will be None.
+        """
+        raise NotImplementedError
+
     def version(self):
         # Cache version string for efficiency.
         if not hasattr(self, '_version'):
@@ -709,10 +766,43 @@ class VCS (libbe.storage.base.VersionedStorage):
             raise libbe.storage.base.ConnectionError(self)
         self._cached_path_id.connect()
         self.check_storage_version()
+        self._load_mapfile_context()
 
     def _disconnect(self):
         self._cached_path_id.disconnect()
 
+    def _load_mapfile_context(self):
+        path = os.path.join(self.be_dir, 'mapfile-context')
+        context = None
+        if os.path.exists(path):
+            context = int(libbe.util.encoding.get_file_contents(
+                    path, decode=True).strip())
+        libbe.storage.base.VersionedStorage.set_mapfile_context(
+            self, context)
+
+    def set_mapfile_context(self, context):
+        """Set and save the mapfile `context` for this repository.
+
+        The context is kept in ``.be/mapfile-context``, which is only
+        there for repositories that opted in to merge-friendly
+        mapfiles.
+        """
+        libbe.storage.base.VersionedStorage.set_mapfile_context(
+            self, context)
+        path = os.path.join(self.be_dir, 'mapfile-context')
+        existed = os.path.exists(path)
+        if context == None:
+            if existed:
+                self._vcs_remove(self._u_rel_path(path))
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        libbe.util.encoding.set_file_contents(path, '%d\n' % context)
+        if existed:
+            self._vcs_update(self._u_rel_path(path))
+        else:
+            self._vcs_add(self._u_rel_path(path))
+
     def path(self, id, revision=None, relpath=True):
         if revision == None:
             path = self._cached_path_id.path(id)
@@ -734,13 +824,13 @@ class VCS (libbe.storage.base.VersionedStorage):
             dir = os.path.join(dir, reldir)
             if not os.path.exists(dir):
                 os.mkdir(dir)
-                self._vcs_add(self._u_rel_path(dir))
+                self._batch_call('add', self._u_rel_path(dir))
             elif not os.path.isdir(dir):
                 raise libbe.storage.base.InvalidDirectory
         if directory == False:
             if not os.path.exists(path):
                 open(path, 'w').close()
-            self._vcs_add(self._u_rel_path(path))
+            self._batch_call('add', self._u_rel_path(path))
 
     def _add(self, id, parent=None, **kwargs):
         path = self._cached_path_id.add_id(id, parent)
@@ -757,6 +847,7 @@ class VCS (libbe.storage.base.VersionedStorage):
         return self._vcs_exists(relpath, revision)
 
     def _remove(self, id):
+        self._flush_batch()
         path = self._cached_path_id.path(id)
         if os.path.exists(path):
             if os.path.isdir(path) and len(self.children(id)) > 0:
@@ -770,6 +861,7 @@ class VCS (libbe.storage.base.VersionedStorage):
         self._cached_path_id.remove_id(id)
 
     def _recursive_remove(self, id):
+        self._flush_batch()
         path = self._cached_path_id.path(id)
         for dirpath,dirnames,filenames in os.walk(path, topdown=False):
             filenames.extend(dirnames)
@@ -823,7 +915,7 @@ class VCS (libbe.storage.base.VersionedStorage):
                 children[i] = None
                 children.extend([os.path.join(c, c2) for c2 in
                                  listdir(os.path.join(path, c))])
-            elif c in ['id-cache', 'version']:
+            elif c in NON_STORAGE_FILES:
                 children[i] = None
             elif self.interspersed_vcs_files \
                     and self._vcs_is_versioned(c) == False:
@@ -867,9 +959,62 @@ class VCS (libbe.storage.base.VersionedStorage):
         f = open(path, "wb")
         f.write(value)
         f.close()
-        self._vcs_update(self._u_rel_path(path))
+        self._batch_call('update', self._u_rel_path(path))
+
+    def begin_batch(self):
+        """Defer VCS bookkeeping for added and changed files.
+
+        Until :py:meth:`end_batch` (or the next removal or commit),
+        :py:meth:`add` and :py:meth:`set` only touch the working tree,
+        and the paths they touched are then handed to the VCS together
+        through :py:meth:`_vcs_add_paths` and :py:meth:`_vcs_update_paths`.
+        The .be directory is also only scanned once for unknown IDs.
+        Batches may be nested, in which case only the outermost
+        :py:meth:`end_batch` ends the batch.
+        """
+        if self._batch == None:
+            self._batch = []
+            self._batch_depth = 0
+            self._cached_path_id.begin_batch()
+        self._batch_depth += 1
+
+    def end_batch(self):
+        if self._batch == None:
+            return
+        self._batch_depth -= 1
+        if self._batch_depth > 0:
+            return
+        self._flush_batch()
+        self._batch = None
+        self._cached_path_id.end_batch()
+
+    def _batch_call(self, method, path):
+        if self._batch == None:
+            getattr(self, '_vcs_%s' % method)(path)
+        else:
+            self._batch.append((method, path))
+
+    def _flush_batch(self):
+        if not self._batch: # None or empty
+            return
+        batch = self._batch
+        self._batch = []
+        added = [path for method,path in batch if method == 'add']
+        # the VCS sees the current contents of the added files, so
+        # they need no further updates
+        new = set(added)
+        updated = []
+        for method,path in batch:
+            if method == 'update' and path not in new:
+                updated.append(path)
+                new.add(path)
+        if len(added) > 0:
+            self._vcs_add_paths(added)
+        if len(updated) > 0:
+            self._vcs_update_paths(updated)
 
     def _commit(self, summary, body=None, allow_empty=False):
+        self._flush_batch()
         summary = summary.strip()+'\n'
         if body is not None:
             summary += '\n' + body.strip() + '\n'
@@ -898,20 +1043,37 @@ class VCS (libbe.storage.base.VersionedStorage):
             raise libbe.storage.base.InvalidRevision(index)
         return revid
 
-    def changed(self, revision):
-        new,mod,rem = self._vcs_changed(revision)
+    def changed(self, revision, to_revision=None):
+        if to_revision == None:
+            new,mod,rem = self._vcs_changed(revision)
+        else:
+            new,mod,rem = self._vcs_changed_between(revision, to_revision)
         def paths_to_ids(paths):
             for p in paths:
                 try:
                     id = self._u_path_to_id(p)
-                    yield id
                 except (SpacerCollision, InvalidPath):
-                    pass
+                    continue
+                if id.split('/', 1)[0] not in NON_STORAGE_FILES:
+                    yield id
         new_id = list(paths_to_ids(new))
         mod_id = list(paths_to_ids(mod))
         rem_id = list(paths_to_ids(rem))
         return (new_id, mod_id, rem_id)
 
+    def history(self, id, since=None):
+        path = self.path(id, relpath=True)
+        revisions = []
+        for revision,summary,changes in self._vcs_history(path, since):
+            ids = {}
+            for p,contents in changes.items():
+                try:
+                    ids[self._u_path_to_id(p)] = contents
+                except (SpacerCollision, InvalidPath):
+                    pass
+            revisions.append((revision, summary, ids))
+        return revisions
+
     def _u_any_in_string(self, list, string):
         """Return True if any of the strings in list are in string.
         Otherwise return False.
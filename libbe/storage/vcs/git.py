@@ -150,6 +150,16 @@ class PygitGit(base.VCS):
         self._pygit_repository.index.add(path)
         self._pygit_repository.index.write()
 
+    def _vcs_add_paths(self, paths):
+        paths = [path for path in paths
+                 if not os.path.isdir(self._u_abspath(path))]
+        if len(paths) == 0:
+            return
+        self._pygit_repository.index.read()
+        for path in paths:
+            self._pygit_repository.index.add(path)
+        self._pygit_repository.index.write()
+
     def _vcs_remove(self, path):
         abspath = self._u_abspath(path)
         if not os.path.isdir(self._u_abspath(abspath)):
@@ -161,6 +171,9 @@ class PygitGit(base.VCS):
     def _vcs_update(self, path):
         self._vcs_add(path)
 
+    def _vcs_update_paths(self, paths):
+        self._vcs_add_paths(paths)
+
     def _git_get_commit(self, revision):
         if isinstance(revision, str):
             revision = unicode(revision, 'ascii')
@@ -263,7 +276,15 @@ class PygitGit(base.VCS):
 
     def _vcs_changed(self, revision):
         commit = self._git_get_commit(revision=revision)
-        diff = commit.tree.diff(self._pygit_repository.head.tree)
+        return self._git_changes(
+            commit.tree.diff(self._pygit_repository.head.tree))
+
+    def _vcs_changed_between(self, revision, to_revision):
+        commit = self._git_get_commit(revision=revision)
+        to_commit = self._git_get_commit(revision=to_revision)
+        return self._git_changes(commit.tree.diff(to_commit.tree))
+
+    def _git_changes(self, diff):
         new = set()
         modified = set()
         removed = set()
@@ -283,6 +304,10 @@ class ExecGit (PygitGit):
     name='git'
     client='git'
 
+    def __init__(self, *args, **kwargs):
+        PygitGit.__init__(self, *args, **kwargs)
+        self._manifests = {} # revision -> _git_manifest(revision)
+
     def _vcs_version(self):
         try:
             status,output,error = self._u_invoke_client('--version')
@@ -342,6 +367,17 @@ class ExecGit (PygitGit):
             return
         self._u_invoke_client('add', path)
 
+    def _vcs_add_paths(self, paths):
+        paths = [path for path in paths
+                 if not os.path.isdir(self._u_abspath(path))]
+        if len(paths) == 0:
+            return
+        # one index update for every path, however many there are
+        self._u_invoke_client(
+            'update-index', '--add', '-z', '--stdin',
+            stdin=''.join(['%s\0' % path for path in paths]).encode(
+                self.encoding))
+
     def _vcs_remove(self, path):
         if not os.path.isdir(self._u_abspath(path)):
             self._u_invoke_client('rm', '-f', path)
@@ -349,6 +385,9 @@ class ExecGit (PygitGit):
     def _vcs_update(self, path):
         self._vcs_add(path)
 
+    def _vcs_update_paths(self, paths):
+        self._vcs_add_paths(paths)
+
     def _vcs_get_file_contents(self, path, revision=None):
         if revision == None:
             return base.VCS._vcs_get_file_contents(self, path, revision)
@@ -357,10 +396,52 @@ class ExecGit (PygitGit):
             status,output,error = self._u_invoke_client('show', arg)
             return output
 
+    def _git_manifest(self, revision):
+        """Return `(dirs, ids)` for the ``.be`` tree as of `revision`.
+
+        `dirs` maps each directory's path to the names of its
+        children, and `ids` maps each storage id to its path.  A
+        single ``git ls-tree`` lists the whole tree, where walking it
+        would take a call per directory.
+        """
+        if revision in self._manifests:
+            return self._manifests[revision]
+        be_dir = self._cached_path_id._spacer_dirs[0]
+        status,output,error = self._u_invoke_client(
+            'ls-tree', '-r', '-t', '-z', revision, '--', be_dir)
+        dirs = {be_dir:[]}
+        ids = {}
+        for entry in output.split('\0'):
+            if len(entry) == 0:
+                continue
+            info,path = entry.split('\t', 1)
+            if path == be_dir:
+                continue
+            dirname,name = os.path.split(path)
+            dirs.setdefault(dirname, []).append(name)
+            if info.split()[1] == 'tree':
+                dirs.setdefault(path, [])
+            try:
+                ids[self._u_path_to_id(path)] = path
+            except (base.SpacerCollision, base.InvalidPath):
+                pass
+        self._manifests[revision] = (dirs, ids)
+        return (dirs, ids)
+
+    def _in_be_dir(self, path):
+        be_dir = self._cached_path_id._spacer_dirs[0]
+        return path == be_dir or path.startswith(be_dir + os.path.sep)
+
     def _vcs_path(self, id, revision):
-        return self._u_find_id(id, revision)
+        dirs,ids = self._git_manifest(revision)
+        if id not in ids:
+            raise base.InvalidID(id, revision=revision)
+        return ids[id]
 
     def _vcs_isdir(self, path, revision):
+        if self._in_be_dir(path):
+            dirs,ids = self._git_manifest(revision)
+            return path in dirs
         arg = '%s:%s' % (revision,path)
         args = ['ls-tree', arg]
         kwargs = {'expect':(0,128)}
@@ -372,12 +453,16 @@ class ExecGit (PygitGit):
         return True
 
     def _vcs_listdir(self, path, revision):
+        if self._in_be_dir(path):
+            dirs,ids = self._git_manifest(revision)
+            return list(dirs[path])
         arg = '%s:%s' % (revision,path)
         status,output,error = self._u_invoke_client(
             'ls-tree', '--name-only', arg)
         return output.rstrip('\n').splitlines()
 
     def _vcs_commit(self, commitfile, allow_empty=False):
+        self._manifests.clear() # symbolic revisions may move
         args = ['commit', '--file', commitfile]
         if allow_empty == True:
             args.append('--allow-empty')
@@ -413,90 +498,127 @@ class ExecGit (PygitGit):
         except IndexError:
             return None
 
-    def _diff(self, revision):
-        status,output,error = self._u_invoke_client('diff', revision)
+    def _diff(self, revision, to_revision=None):
+        args = ['diff', '--name-status', '--no-renames', '-z', revision]
+        if to_revision != None:
+            args.append(to_revision)
+        status,output,error = self._u_invoke_client(*args)
         return output
 
     def _parse_diff(self, diff_text):
         """_parse_diff(diff_text) -> (new,modified,removed)
 
-        `new`, `modified`, and `removed` are lists of files.
-
-        Example diff text::
-
-          diff --git a/dir/changed b/dir/changed
-          index 6c3ea8c..2f2f7c7 100644
-          --- a/dir/changed
-          +++ b/dir/changed
-          @@ -1,3 +1,3 @@
-           hi
-          -there
-          +everyone and
-           joe
-          diff --git a/dir/deleted b/dir/deleted
-          deleted file mode 100644
-          index 225ec04..0000000
-          --- a/dir/deleted
-          +++ /dev/null
-          @@ -1,3 +0,0 @@
-          -in
-          -the
-          -beginning
-          diff --git a/dir/moved b/dir/moved
-          deleted file mode 100644
-          index 5ef102f..0000000
-          --- a/dir/moved
-          +++ /dev/null
-          @@ -1,4 +0,0 @@
-          -the
-          -ants
-          -go
-          -marching
-          diff --git a/dir/moved2 b/dir/moved2
-          new file mode 100644
-          index 0000000..5ef102f
-          --- /dev/null
-          +++ b/dir/moved2
-          @@ -0,0 +1,4 @@
-          +the
-          +ants
-          +go
-          +marching
-          diff --git a/dir/new b/dir/new
-          new file mode 100644
-          index 0000000..94954ab
-          --- /dev/null
-          +++ b/dir/new
-          @@ -0,0 +1,2 @@
-          +hello
-          +world
+        `new`, `modified`, and `removed` are lists of files, parsed
+        from the NUL-separated output of ``git diff --name-status
+        --no-renames -z``.
+
+        >>> vcs = ExecGit()
+        >>> vcs._parse_diff(
+        ...     'M\\0dir/changed\\0D\\0dir/deleted\\0D\\0dir/moved\\0'
+        ...     'A\\0dir/moved2\\0A\\0dir/new\\0T\\0dir/retyped\\0')
+        (['dir/moved2', 'dir/new'], ['dir/changed', 'dir/retyped'], ['dir/deleted', 'dir/moved'])
         """
         new = []
         modified = []
         removed = []
-        lines = diff_text.splitlines()
-        for i,line in enumerate(lines):
-            if not line.startswith('diff '):
-                continue
-            file_a,file_b = line.split()[-2:]
-            assert file_a.startswith('a/'), \
-                'missformed file_a %s' % file_a
-            assert file_b.startswith('b/'), \
-                'missformed file_b %s' % file_b
-            file = file_a[2:]
-            assert file_b[2:] == file, \
-                'diff file missmatch %s != %s' % (file_a, file_b)
-            if lines[i+1].startswith('new '):
+        fields = diff_text.split('\0')
+        for status,file in zip(fields[0::2], fields[1::2]):
+            if status == 'A':
                 new.append(file)
-            elif lines[i+1].startswith('index '):
-                modified.append(file)
-            elif lines[i+1].startswith('deleted '):
+            elif status == 'D':
                 removed.append(file)
+            else:
+                modified.append(file)
         return (new,modified,removed)
 
     def _vcs_changed(self, revision):
         return self._parse_diff(self._diff(revision))
 
+    def _vcs_changed_between(self, revision, to_revision):
+        return self._parse_diff(self._diff(revision, to_revision))
+
+    def _vcs_history(self, path, since=None):
+        if self._vcs_revision_id(-1) == None:
+            return [] # no commits yet
+        revisions = 'HEAD'
+        if since != None:
+            status,output,error = self._u_invoke_client(
+                'merge-base', '--is-ancestor', since, 'HEAD',
+                expect=(0,1,128))
+            if status != 0:
+                raise base.InvalidRevision(since)
+            revisions = '%s..HEAD' % since
+        # one walk over the history of path, listing the blob ids...
+        status,output,error = self._u_invoke_client(
+            'log', '--reverse', '--raw', '--no-abbrev', '--no-renames',
+            '-z', '--format=%H %s', revisions, '--', path)
+        history = [h for h in self._parse_log(output) if len(h[2]) > 0]
+        # ... and one process to read them all
+        blobs = set()
+        for revision,summary,changes in history:
+            blobs.update([b for b in changes.values() if b != None])
+        contents = self._git_blobs(sorted(blobs))
+        for revision,summary,changes in history:
+            for p,blob in changes.items():
+                if blob != None:
+                    changes[p] = contents[blob]
+        return history
+
+    def _parse_log(self, log_text):
+        """_parse_log(log_text) -> [(revision, summary, changes), ...]
+
+        Parse the output of ``git log --raw --no-abbrev -z
+        --format='%H %s'``.  `changes` maps each changed path to its
+        new blob id (or `None` if it was removed).
+
+        >>> vcs = ExecGit()
+        >>> null = '0' * 40
+        >>> a = 'a' * 40
+        >>> b = 'b' * 40
+        >>> for revision,summary,changes in vcs._parse_log(
+        ...         '1234 Add a\\0\\n:000000 100644 %s %s A\\0dir/a\\0'
+        ...         '\\0abcd Remove a\\0\\n:100644 000000 %s %s D\\0dir/a\\0'
+        ...         % (null, a, a, null)):
+        ...     print revision, summary, changes
+        1234 Add a {'dir/a': 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa'}
+        abcd Remove a {'dir/a': None}
+        """
+        history = []
+        fields = iter(log_text.split('\0'))
+        for field in fields:
+            field = field.lstrip('\n')
+            if len(field) == 0:
+                continue
+            if field.startswith(':'):
+                blob = field.split()[3]
+                if blob == '0' * 40:
+                    blob = None
+                history[-1][2][fields.next()] = blob
+            else:
+                revision,summary = (field.split(' ', 1) + [''])[:2]
+                history.append((revision, summary, {}))
+        return history
+
+    def _git_blobs(self, blobs):
+        """Return a dict mapping each blob id in `blobs` to the blob's
+        contents, read by a single ``git cat-file --batch``.
+        """
+        if len(blobs) == 0:
+            return {}
+        status,output,error = self._u_invoke_client(
+            'cat-file', '--batch',
+            stdin=''.join(['%s\n' % b for b in blobs]).encode('ascii'),
+            unicode_output=False)
+        contents = {}
+        i = 0
+        for blob in blobs:
+            end = output.index('\n', i)
+            header = output[i:end].split()
+            size = int(header[2])
+            contents[blob] = output[end+1:end+1+size]
+            i = end + 1 + size + 1 # skip the trailing newline
+        return contents
+
 
 if libbe.TESTING == True:
     base.make_vcs_testcase_subclasses(PygitGit, sys.modules[__name__])
@@ -70,6 +70,7 @@ caching global comment-lookup tables and enables easy error messages
 ``bea`` bug directory is located").
 """
 
+import bisect
 import os.path
 import re
 
@@ -244,6 +245,37 @@ def _truncate(uuid, other_uuids, min_length=3):
             chars+=1
     return uuid[:chars]
 
+def _truncate_sorted(uuid, sorted_uuids, min_length=3):
+    """Like :py:func:`_truncate`, but for a sorted list of other UUIDs.
+
+    The longest common prefix is always shared with a neighbor in
+    sorted order, so only the neighbors of `uuid` are compared.
+
+    >>> uuids = ['a1234', 'ab9876', 'abcdef']
+    >>> [_truncate_sorted(uuid, uuids) for uuid in uuids]
+    ['a12', 'ab9', 'abc']
+    >>> _truncate_sorted('abc', ['abcd'])
+    'abc'
+    >>> _truncate_sorted('abcd', ['abc'], min_length=1)
+    'abcd'
+    """
+    if min_length == -1:
+        return uuid
+    chars = min_length
+    i = bisect.bisect_left(sorted_uuids, uuid)
+    j = i
+    while j < len(sorted_uuids) and sorted_uuids[j] == uuid:
+        j += 1
+    for k in [i-1, j]:
+        if k < 0 or k >= len(sorted_uuids):
+            continue
+        id = sorted_uuids[k]
+        common = 0
+        while common < min(len(id), len(uuid)) and id[common] == uuid[common]:
+            common += 1
+        chars = max(chars, common + 1)
+    return uuid[:chars]
+
 def _expand(truncated_id, common, other_ids):
     """Expand a truncated UUID.
 
@@ -288,6 +320,147 @@ def _expand(truncated_id, common, other_ids):
         raise NoIDMatches(truncated_id, other_ids)
     return matches[0]
 
+def _expand_sorted(truncated_id, sorted_ids, fallback):
+    """Expand a truncated UUID that uniquely matches one of
+    `sorted_ids`.
+
+    Anything else (no truncated UUID, or no or several matches) is
+    handed to ``fallback()``, which should call :py:func:`_expand` to
+    raise the appropriate exception.
+
+    >>> uuids = ['a1234', 'ab9876', 'abcdef']
+    >>> _expand_sorted('ab9', uuids, None)
+    'ab9876'
+    >>> _expand_sorted('ab', uuids, lambda: _expand('ab', 'x', uuids))
+    Traceback (most recent call last):
+      ...
+    MultipleIDMatches: More than one id matches ab.  Please be more specific (x*).
+    ['ab9876', 'abcdef']
+    """
+    if truncated_id != None:
+        i = bisect.bisect_left(sorted_ids, truncated_id)
+        if i < len(sorted_ids) and sorted_ids[i].startswith(truncated_id):
+            if (sorted_ids[i] == truncated_id
+                or i+1 == len(sorted_ids)
+                or not sorted_ids[i+1].startswith(truncated_id)):
+                return sorted_ids[i]
+    return fallback()
+
+def _contains(sorted_ids, id):
+    i = bisect.bisect_left(sorted_ids, id)
+    return i < len(sorted_ids) and sorted_ids[i] == id
+
+
+class IDIndex (object):
+    """Sorted bug and comment UUIDs for expanding and truncating user
+    IDs.
+
+    With sorted UUIDs, :py:func:`short_to_long_user`,
+    :py:func:`long_to_short_user`, and :py:meth:`ID.user` only need to
+    compare a UUID with its neighbors, instead of with every other bug
+    (or comment) in the bugdir (or bug).  Use :py:func:`id_index` to
+    get the index shared by a set of bugdirs.  The UUID lists are
+    built on demand, and bugdirs and comment indexes (see
+    :py:class:`libbe.comment.CommentIndex`) notify the index when bugs
+    or comments are added, removed, or renamed.
+
+    >>> import libbe.bugdir
+    >>> bugdir = libbe.bugdir.SimpleBugDir(memory=True)
+    >>> index = id_index({bugdir.uuid: bugdir})
+    >>> index.bug_uuids(bugdir)
+    ['a', 'b']
+    >>> bug = bugdir.new_bug(summary='Bug C', _uuid='c')
+    >>> index.bug_uuids(bugdir)
+    ['a', 'b', 'c']
+    >>> comment = bug.new_comment('A comment')
+    >>> comment.uuid = 'c1'
+    >>> index.comment_uuids(bug)
+    ['c1']
+    >>> comment.uuid = 'c2'
+    >>> index.comment_uuids(bug)
+    ['c2']
+    >>> bugdir.remove_bug(bug)
+    >>> index.bug_uuids(bugdir)
+    ['a', 'b']
+    >>> bugdir.cleanup()
+    """
+    def __init__(self):
+        self._bugs = {} # bugdir uuid -> (bugdir, sorted bug uuids)
+        self._comments = {} # bugdir uuid -> {bug uuid: (bug, sorted uuids)}
+
+    def __deepcopy__(self, memo):
+        # copied bugdirs (e.g. in ``be merge``) start without an index
+        return None
+
+    def bug_uuids(self, bugdir):
+        """Return the sorted UUIDs of the bugs in `bugdir`."""
+        entry = self._bugs.get(bugdir.uuid, None)
+        if entry == None or entry[0] is not bugdir:
+            entry = self._bugs[bugdir.uuid] = (bugdir, sorted(bugdir.uuids()))
+            self._comments.pop(bugdir.uuid, None)
+        return entry[1]
+
+    def comment_uuids(self, bug):
+        """Return the sorted UUIDs of the comments on `bug`."""
+        comments = self._comments.setdefault(bug.bugdir.uuid, {})
+        entry = comments.get(bug.uuid, None)
+        if entry == None or entry[0] is not bug:
+            root = getattr(bug, 'comment_root', None)
+            if hasattr(root, 'comment_index'):
+                uuids = root.comment_index().uuids.keys()
+            else:
+                uuids = bug.uuids()
+            entry = comments[bug.uuid] = (bug, sorted(uuids))
+        return entry[1]
+
+    def has_bug(self, bugdir, uuid):
+        return _contains(self.bug_uuids(bugdir), uuid)
+
+    def add_bug(self, bugdir, uuid):
+        """Note that `bugdir` contains bug `uuid`."""
+        entry = self._bugs.get(bugdir.uuid, None)
+        if entry != None and entry[0] is bugdir \
+                and not _contains(entry[1], uuid):
+            bisect.insort(entry[1], uuid)
+
+    def remove_bug(self, bugdir, uuid):
+        """Note that bug `uuid` has been removed from `bugdir`."""
+        entry = self._bugs.get(bugdir.uuid, None)
+        if entry != None and entry[0] is bugdir:
+            i = bisect.bisect_left(entry[1], uuid)
+            if i < len(entry[1]) and entry[1][i] == uuid:
+                del entry[1][i]
+        self._comments.get(bugdir.uuid, {}).pop(uuid, None)
+
+    def invalidate(self, bugdir, bug_uuid=None):
+        """Forget the bug UUIDs of `bugdir` (and the comment UUIDs of
+        its bugs), or, if `bug_uuid` is given, just the comment UUIDs
+        of that bug.
+        """
+        if bug_uuid == None:
+            self._bugs.pop(bugdir.uuid, None)
+            self._comments.pop(bugdir.uuid, None)
+        else:
+            self._comments.get(bugdir.uuid, {}).pop(bug_uuid, None)
+
+def id_index(bugdirs):
+    """Return the :py:class:`IDIndex` shared by `bugdirs`.
+
+    The index is attached to the bugdirs, so it lives as long as they
+    do (i.e. for the storage connection they were loaded from).
+    """
+    index = None
+    for bugdir in bugdirs.values():
+        index = getattr(bugdir, '_id_index', None)
+        if index != None:
+            break
+    if index == None:
+        index = IDIndex()
+    for bugdir in bugdirs.values():
+        if getattr(bugdir, '_id_index', None) is not index:
+            bugdir._id_index = index
+    return index
+
 
 class ID (object):
     """Store an object ID and produce various representations.
@@ -376,9 +549,17 @@ class ID (object):
 
     def user(self):
         ids = []
-        for o in self._ancestors():
+        ancestors = self._ancestors()
+        index = getattr(ancestors[0], '_id_index', None)
+        for i,o in enumerate(ancestors):
             if o == None:
                 ids.append(None)
+            elif index != None and i == 1:
+                ids.append(_truncate_sorted(
+                        o.uuid, index.bug_uuids(ancestors[0])))
+            elif index != None and i == 2 and ancestors[1] != None:
+                ids.append(_truncate_sorted(
+                        o.uuid, index.comment_uuids(ancestors[1])))
             else:
                 ids.append(_truncate(o.uuid, o.sibling_uuids()))
         return _assemble(ids, check_length=True)
@@ -420,15 +601,18 @@ def long_to_short_user(bugdirs, id):
     elif len(matching_bugdirs) > 1:
         raise MultipleIDMatches(id, '', [bd.uuid for bd in bugdirs.values()])
     bugdir = matching_bugdirs[0]
-    objects = [bugdir]
+    index = id_index(bugdirs)
+    ids[0] = _truncate(ids[0], bugdir.sibling_uuids())
     if len(ids) >= 2:
-        bug = bugdir.bug_from_uuid(ids[1])
-        objects.append(bug)
+        bug_uuids = index.bug_uuids(bugdir)
+        if len(ids) >= 3 or not _contains(bug_uuids, ids[1]):
+            bug = bugdir.bug_from_uuid(ids[1]) # raise NoBugMatches
+        ids[1] = _truncate_sorted(ids[1], bug_uuids)
     if len(ids) >= 3:
-        comment = bug.comment_from_uuid(ids[2])
-        objects.append(comment)
-    for i,obj in enumerate(objects):
-        ids[i] = _truncate(ids[i], obj.sibling_uuids())
+        comment_uuids = index.comment_uuids(bug)
+        if not _contains(comment_uuids, ids[2]):
+            bug.comment_from_uuid(ids[2]) # raise an appropriate error
+        ids[2] = _truncate_sorted(ids[2], comment_uuids)
     return _assemble(ids)
 
 def short_to_long_user(bugdirs, id):
@@ -447,13 +631,18 @@ def short_to_long_user(bugdirs, id):
     if len(ids) == 1:
         return _assemble(ids)
     bugdir = [bd for bd in bugdirs.values() if bd.uuid == ids[0]][0]
-    ids[1] = _expand(ids[1], common=bugdir.id.user(),
-                     other_ids=bugdir.uuids())
+    index = id_index(bugdirs)
+    ids[1] = _expand_sorted(
+        ids[1], index.bug_uuids(bugdir),
+        lambda: _expand(ids[1], common=bugdir.id.user(),
+                        other_ids=bugdir.uuids()))
     if len(ids) == 2:
         return _assemble(ids)
     bug = bugdir.bug_from_uuid(ids[1])
-    ids[2] = _expand(ids[2], common=bug.id.user(),
-                     other_ids=bug.uuids())
+    ids[2] = _expand_sorted(
+        ids[2], index.comment_uuids(bug),
+        lambda: _expand(ids[2], common=bug.id.user(),
+                        other_ids=bug.uuids()))
     return _assemble(ids)
 
 
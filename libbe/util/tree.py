@@ -21,6 +21,8 @@
 """Define :py:class:`Tree`, a traversable tree structure.
 """
 
+import collections
+
 import libbe
 if libbe.TESTING == True:
     import doctest
@@ -113,6 +115,26 @@ class Tree(list):
     False
     >>> a.has_descendant(a, match_self=True)
     True
+
+    Traversal uses an explicit stack, so very deep trees (e.g. long
+    reply chains) do not run into Python's recursion limit.
+
+    >>> import sys
+    >>> depth = sys.getrecursionlimit() + 10
+    >>> root = node = Tree()
+    >>> for i in range(depth):
+    ...     child = Tree()
+    ...     node.append(child)
+    ...     node = child
+    >>> root.branch_len() == depth + 1
+    True
+    >>> len(list(root.traverse())) == depth + 1
+    True
+    >>> max([d for d,n in root.thread()]) == depth
+    True
+    >>> root.sort()
+    >>> root.has_descendant(node)
+    True
     """
     def __cmp__(self, other):
         return cmp(id(self), id(other))
@@ -141,10 +163,15 @@ class Tree(list):
         Use only on small trees, or reimplement by overriding
         child-addition methods to allow accurate caching.
         """
-        if len(self) == 0:
-            return 1
-        else:
-            return 1 + max([child.branch_len() for child in self])
+        lengths = {}
+        # reversed depth-first order visits every child before its parent
+        for node in reversed(list(Tree.traverse(self))):
+            if len(node) == 0:
+                lengths[id(node)] = 1
+            else:
+                lengths[id(node)] = 1 + max(
+                    [lengths[id(child)] for child in node])
+        return lengths[id(self)]
 
     def sort(self, *args, **kwargs):
         """Sort the tree recursively.
@@ -157,9 +184,8 @@ class Tree(list):
         since a node at depth `N` from the root has it's
         :py:meth:`branch_len` method called `N` times.
         """
-        list.sort(self, *args, **kwargs)
-        for child in self:
-            child.sort(*args, **kwargs)
+        for node in Tree.traverse(self):
+            list.sort(node, *args, **kwargs)
 
     def traverse(self, depth_first=True):
         """Generate all the nodes in a tree, starting with the root node.
@@ -171,17 +197,26 @@ class Tree(list):
           `False` for breadth first ordering.  Siblings are returned
           in the order they are stored, so you might want to
           :py:meth:`sort` your tree first.
+
+        Notes
+        -----
+        Nodes are generated lazily from an explicit stack (or queue),
+        so deep trees do not run into Python's recursion limit.  A
+        node's children are read after the node itself is generated,
+        so consumers may reorder them (e.g. :py:meth:`sort`) on the
+        fly.
         """
         if depth_first == True:
-            yield self
-            for child in self:
-                for descendant in child.traverse():
-                    yield descendant
+            stack = [self]
+            while len(stack) > 0:
+                node = stack.pop()
+                yield node
+                stack.extend(reversed(node))
         else: # breadth first, Wikipedia algorithm
             # http://en.wikipedia.org/wiki/Breadth-first_search
-            queue = [self]
+            queue = collections.deque([self])
             while len(queue) > 0:
-                node = queue.pop(0)
+                node = queue.popleft()
                 yield node
                 queue.extend(node)
 
@@ -212,27 +247,16 @@ class Tree(list):
             (0, f)
 
         """
-        stack = [] # ancestry of the current node
-        if flatten == True:
-            depthDict = {}
-
-        for node in self.traverse(depth_first=True):
-            while len(stack) > 0 \
-                    and id(node) not in [id(c) for c in stack[-1]]:
-                stack.pop(-1)
-            if flatten == False:
-                depth = len(stack)
-            else:
-                if len(stack) == 0:
-                    depth = 0
+        stack = [(0, self)]
+        while len(stack) > 0:
+            depth,node = stack.pop()
+            yield (depth, node)
+            last = len(node) - 1
+            for i in range(last, -1, -1):
+                if flatten == False or i < last:
+                    stack.append((depth+1, node[i]))
                 else:
-                    parent = stack[-1]
-                    depth = depthDict[id(parent)]
-                    if len(parent) > 1 and node != parent[-1]:
-                        depth += 1
-                depthDict[id(node)] = depth
-            yield (depth,node)
-            stack.append(node)
+                    stack.append((depth, node[i]))
 
     def has_descendant(self, descendant, depth_first=True, match_self=False):
         """Check if a node is contained in a tree.
@@ -251,7 +275,9 @@ class Tree(list):
         """
         if descendant == self:
             return match_self
-        for d in self.traverse(depth_first):
+        nodes = Tree.traverse(self, depth_first)
+        nodes.next() # skip self, which we have already checked
+        for d in nodes:
             if descendant == d:
                 return True
         return False
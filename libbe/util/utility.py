@@ -135,12 +135,64 @@ def time_to_str(time_val):
 
 
 def fuzzy_str_to_time(str_time):
+    """Convert a free-form date string into a time value.
+
+    Strings in the canonical RFC 2822 format are handled by
+    :py:func:`str_to_time` without loading :py:mod:`dateutil`.
+
+    >>> fuzzy_str_to_time("Thu, 01 Jan 1970 00:00:00 +0000")
+    0
+    """
+    try:
+        return str_to_time(str_time)
+    except ValueError:
+        pass
     from datetime import datetime
     from dateutil.parser import parse
 
     return (parse(str_time, fuzzy=True) -
             datetime.utcfromtimestamp(0)).total_seconds()
 
+_RFC_2822_MONTHS = dict(
+    [(month, i+1) for i,month in enumerate(
+            ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+             'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])])
+
+def _fast_str_to_time(str_time):
+    """Parse the format written by :py:func:`time_to_str` (with any
+    numeric zone) without :py:func:`time.strptime`.
+
+    Return `None` for anything else, so the caller can fall back to
+    the general parser.
+    """
+    fields = str_time.split(' ')
+    if len(fields) != 6 or not fields[0].endswith(','):
+        return None
+    weekday,day,month,year,clock,zone = fields
+    month = _RFC_2822_MONTHS.get(month, None)
+    clock = clock.split(':')
+    if (month == None or len(clock) != 3 or len(zone) != 5
+        or zone[0] not in '+-'):
+        return None
+    try:
+        day = int(day)
+        year = int(year)
+        hour,minute,second = [int(x) for x in clock]
+        zone_hour = int(zone[1:3])
+        zone_minute = int(zone[3:5])
+    except ValueError:
+        return None
+    if not (0 <= hour <= 23 and 0 <= minute <= 59
+            and 0 <= second <= 61 and zone_minute <= 59):
+        return None
+    if not 1 <= day <= calendar.monthrange(year, month)[1]:
+        return None
+    time_val = calendar.timegm((year, month, day, hour, minute, second))
+    timezone = zone_hour*3600 + zone_minute*60
+    if zone[0] == '+': # time_val ahead of GMT
+        timezone = -timezone
+    return time_val + timezone
+
 
 def str_to_time(str_time):
     """Convert an RFC 2822-fomatted string into a time value.
@@ -160,11 +212,24 @@ def str_to_time(str_time):
     True
     >>> str_to_time("Thu, 01 Jan 1970 00:00:00 -1000")
     36000
+    >>> str_to_time("Thu, 01 Jan 1970 10:30:00 +1030")
+    0
+    >>> str_to_time("Thu, 32 Jan 1970 00:00:00 +0000")
+    Traceback (most recent call last):
+      ...
+    ValueError: time data 'Thu, 32 Jan 1970 00:00:00 +0000' does not match format '%a, %d %b %Y %H:%M:%S +0000'
+    >>> str_to_time("Thu, 31 Feb 1970 00:00:00 +0000")
+    Traceback (most recent call last):
+      ...
+    ValueError: day is out of range for month
 
     See Also
     --------
     time_to_str : inverse
     """
+    time_val = _fast_str_to_time(str_time)
+    if time_val != None:
+        return time_val
     timezone_str = str_time[-5:]
     if timezone_str != "+0000":
         str_time = str_time.replace(timezone_str, "+0000")